@@ -0,0 +1,38 @@
+#!/usr/bin/python3
+"""
+CAJOlang data file converter
+
+converts data files between the ASCII format of the CAJOlang specification
+(one 16 character binary value per line, CAJO_OPEN modes 0 and 1) and the
+compact binary format (packed little endian int16 values, CAJO_OPEN modes 2
+and 3)
+
+Usage:
+    ~ $ python3 b16conv.py to-binary input.txt output.b16
+    ~ $ python3 b16conv.py to-text input.b16 output.txt
+"""
+import sys
+import argparse
+
+from lib.fileio import FormatConverter
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Converts CAJOlang data files between the ASCII and the "
+                    "binary formats")
+    parser.add_argument("direction", choices=('to-binary', 'to-text'),
+                        help="format the file is converted to")
+    parser.add_argument("source", help="file to convert")
+    parser.add_argument("destination", help="converted file, overwritten")
+    args = parser.parse_args()
+
+    if args.direction == 'to-binary':
+        convert = FormatConverter.text_to_binary
+    else:
+        convert = FormatConverter.binary_to_text
+
+    try:
+        count = convert(args.source, args.destination)
+    except (IOError, OSError, ValueError) as err:
+        sys.exit("b16conv: %s" % err)
+    print("converted %d values" % count)
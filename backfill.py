@@ -0,0 +1,191 @@
+#!/usr/bin/python3
+"""
+CAJOlang backfill runner
+
+runs every program of a manifest (or matching a glob) once, right away,
+instead of on its minute, across a worker pool: each program is compiled
+and run by the same interpreter as the scheduled runs, its output written to
+its own file on the output directory, and a summary with the throughput and
+the failures printed at the end
+
+Usage:
+    ~ $ cat /path/to/input.txt | python3 backfill.py
+    ~ $ python3 backfill.py --manifest input.txt --minutes 0-14
+    ~ $ python3 backfill.py --glob 'programs/**/*.cl' --output-dir out
+
+Options:
+    --manifest FILE reads the source file paths from FILE instead of stdin
+    --glob PATTERN  runs the source files matching PATTERN (may be given
+                    several times), instead of reading a manifest
+    --minutes A-B   only runs the programs of the minutes A to B (or of the
+                    single minute A), regardless of the current time
+    --output-dir DIR
+                    directory the output of each program is written to,
+                    named as the --output files of main.py, defaults to
+                    backfill
+    --workers N     number of workers, defaults to the CPU count
+    --pool KIND     worker pool kind, either process (default) or thread
+    --jit, --optimize, --max-instructions N, --timeout S
+                    as for main.py
+    --failures N    failures listed on the summary, defaults to 20
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from lib.backfill import OutputDirectory, run_sources, IN_FLIGHT
+from lib.budget import Limits
+from lib.compiler import Compiler
+from lib.runner import POOL_KINDS
+
+
+def parse_minutes(minutes):
+    """
+    Parses a minute range given on the command line
+
+    # args:
+        - :minutes: range as A-B, or a single minute A
+
+    # returns:
+        - tuple of the first and the last minute
+
+    # raises:
+        - :ValueError: if the range is not within the hour
+    """
+    first, separator, last = minutes.partition('-')
+    first = int(first)
+    last = int(last) if separator else first
+    if not 0 <= first <= last < 60:
+        raise ValueError("minutes must be a range of the hour")
+    return (first, last)
+
+
+def select(paths, minutes=None):
+    """
+    Checks the source files, keeping the ones on the minute range
+
+    # args:
+        - :paths: list of the paths of the CAJOlang sources
+        - :minutes: optional (first, last) minute range
+
+    # returns:
+        - tuple of the list of paths selected, the number of paths out of
+          the minute range and the list of (path, error) of the invalid ones
+    """
+    selected = []
+    skipped = 0
+    invalid = []
+    for path in paths:
+        try:
+            Compiler.check_source_file(path)
+            minute = Compiler.read_minute(path)
+        except (IOError, OSError, ValueError) as err:
+            invalid.append((path, err))
+            continue
+        if minutes is not None and not minutes[0] <= minute <= minutes[1]:
+            skipped += 1
+        else:
+            selected.append(path)
+    return (selected, skipped, invalid)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Runs CAJOlang programs once, right away")
+    parser.add_argument("--manifest", default=None,
+                        help="file listing the programs, instead of stdin")
+    parser.add_argument("--glob", action="append", default=[],
+                        metavar="PATTERN", help="run the files matching it")
+    parser.add_argument("--minutes", default=None, metavar="A-B",
+                        help="only run the programs of these minutes")
+    parser.add_argument("--output-dir", default="backfill",
+                        help="directory the outputs are written to")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of workers, defaults to the CPU count")
+    parser.add_argument("--pool", choices=POOL_KINDS, default='process',
+                        help="worker pool kind")
+    parser.add_argument("--jit", action="store_true",
+                        help="run programs translated to Python functions")
+    parser.add_argument("--optimize", action="store_true",
+                        help="run programs rewritten by the optimizer")
+    parser.add_argument("--max-instructions", type=int, default=None,
+                        help="instructions a run may execute")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="seconds a run may take")
+    parser.add_argument("--failures", type=int, default=20,
+                        help="failures listed on the summary")
+    args = parser.parse_args()
+
+    minutes = None
+    if args.minutes is not None:
+        try:
+            minutes = parse_minutes(args.minutes)
+        except ValueError:
+            parser.error("--minutes must be A-B or A, within [0, 60)")
+
+    if args.glob:
+        paths = []
+        for pattern in args.glob:
+            paths.extend(sorted(glob.glob(pattern, recursive=True)))
+    else:
+        source = open(args.manifest, 'r') if args.manifest else sys.stdin
+        with source:
+            paths = [line.rstrip() for line in source if line.strip()]
+
+    limits = None
+    if args.max_instructions is not None or args.timeout is not None:
+        limits = Limits(args.max_instructions, args.timeout)
+
+    selected, skipped, invalid = select(paths, minutes)
+    outputs = OutputDirectory(args.output_dir)
+
+    workers = args.workers or os.cpu_count() or 1
+    if args.pool == 'process':
+        executor = ProcessPoolExecutor(workers)
+    else:
+        executor = ThreadPoolExecutor(workers)
+
+    started = time.time()
+    run_time = 0.0
+    succeeded = aborted = 0
+    failures = []
+    interrupted = False
+    try:
+        for index, result in run_sources(selected, executor,
+                                         workers * IN_FLIGHT, args.jit,
+                                         args.optimize, limits):
+            outputs.write(result.source_file, result.output)
+            run_time += result.duration
+            if result.aborted:
+                aborted += 1
+            if result.error is None:
+                succeeded += 1
+            else:
+                failures.append((index, result.source_file, result.error))
+    except KeyboardInterrupt:
+        interrupted = True
+    executor.shutdown(wait=not interrupted)
+    elapsed = time.time() - started
+
+    ran = succeeded + len(failures)
+    print("ran %d of %d programs in %.2fs (%.1f programs/s, %.2fs of runs, "
+          "%.1fx parallelism)%s" % (
+              ran, len(paths), elapsed, ran / elapsed if elapsed else 0.0,
+              run_time, run_time / elapsed if elapsed else 0.0,
+              ", interrupted" if interrupted else ""))
+    print("  succeeded: %d, failed: %d (%d aborted), invalid: %d, outside "
+          "the minutes: %d" % (succeeded, len(failures), aborted,
+                               len(invalid), skipped))
+    print("  outputs written to %s" % args.output_dir)
+
+    problems = ([(path, str(error)) for path, error in invalid] +
+                [(path, error) for index, path, error in sorted(failures)])
+    for path, error in problems[:args.failures]:
+        print("  %s: %s" % (path, error))
+    if len(problems) > args.failures:
+        print("  ... and %d more" % (len(problems) - args.failures))
+
+    sys.exit(1 if problems or interrupted else 0)
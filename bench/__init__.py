@@ -0,0 +1,10 @@
+"""
+Benchmark package
+Generates reproducible synthetic CAJOlang workloads and measures the
+interpreter and the scheduler on them, offline and with a simulated clock
+
+Usage:
+    ~ $ python3 -m bench --output before.json
+    ~ $ python3 -m bench --output after.json
+    ~ $ python3 -m bench --compare before.json after.json
+"""
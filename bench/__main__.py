@@ -0,0 +1,160 @@
+"""
+Benchmark command line
+
+Generates the workloads on a temporary directory (or on --directory, where
+they are kept), measures them and writes the report as JSON to stdout or to
+--output. Two reports are compared with --compare
+
+Usage:
+    ~ $ python3 -m bench --programs 10000 --output report.json
+    ~ $ python3 -m bench --compare base.json report.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+
+from lib.runner import TaskRunner, POOL_KINDS
+from bench.generator import WorkloadGenerator, WORKLOAD_KINDS
+from bench import suite
+
+# Report layout version, reports of different versions are not comparable
+REPORT_VERSION = 1
+
+# Sizes of the programs measured for throughput
+LOOP_ITERATIONS = 30000
+STREAM_VALUES = 4096
+JUMP_DEPTH = 200
+JUMP_ROUNDS = 500
+
+
+def run_benchmarks(args, directory):
+    """
+    Generates the workloads on a directory and measures them
+
+    # args:
+        - :args: parsed command line arguments
+        - :directory: directory the workloads are written to
+
+    # returns:
+        - dict of the results, by benchmark
+    """
+    generator = WorkloadGenerator(directory, args.seed)
+    results = {}
+
+    data = generator.data_file('stream-data', STREAM_VALUES)
+    workloads = {
+        'loop': generator.loop('loop', 0, LOOP_ITERATIONS),
+        'stream': generator.stream('stream', 0, data,
+                                   os.path.join(directory,
+                                                'stream-out.txt'),
+                                   STREAM_VALUES),
+        'jumps': generator.jumps('jumps', 0, JUMP_DEPTH, JUMP_ROUNDS)
+    }
+    results['throughput'] = dict(
+        (kind, suite.throughput(workloads[kind], args.repeat))
+        for kind in WORKLOAD_KINDS)
+    results['conversion'] = suite.conversion(seed=args.seed)
+
+    manifest, paths = generator.manifest(args.programs)
+    registry, results['startup'] = suite.startup(paths, args.optimize)
+
+    if args.hours > 0:
+        runner = TaskRunner(args.workers, args.pool, jit=args.jit)
+        try:
+            results['schedule'] = suite.schedule(
+                registry, runner, args.hours, spread=args.spread)
+        finally:
+            # Worker processes count on the peak RSS of the children once
+            # they exit
+            runner.shutdown()
+
+    results['peak_rss_kb'] = suite.peak_rss()
+    return results
+
+
+def print_comparison(base, new):
+    """
+    Prints the changes of the measurements of two reports
+    """
+    if base.get('version') != new.get('version'):
+        sys.exit("bench: reports of different versions can't be compared")
+    for key, old, value, change in suite.compare(base, new):
+        change = 'n/a' if change is None else '%+.1f%%' % (change * 100)
+        print("%-55s %14.6g %14.6g %9s" % (key, old, value, change))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the CAJOlang interpreter and scheduler on "
+                    "synthetic workloads")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the generated workloads")
+    parser.add_argument("--programs", type=int, default=10000,
+                        help="programs of the scheduled manifest")
+    parser.add_argument("--hours", type=int, default=1,
+                        help="simulated hours of scheduling, 0 to skip")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="timed runs of each throughput measurement")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of workers, defaults to the CPU count")
+    parser.add_argument("--pool", choices=POOL_KINDS, default='process',
+                        help="worker pool kind")
+    parser.add_argument("--jit", action="store_true",
+                        help="schedule programs translated by the JIT")
+    parser.add_argument("--optimize", action="store_true",
+                        help="schedule programs rewritten by the optimizer")
+    parser.add_argument("--spread", choices=('none', 'binpack'),
+                        default='none', help="order of the runs of a minute")
+    parser.add_argument("--directory", default=None,
+                        help="directory the workloads are generated on, kept")
+    parser.add_argument("--output", default=None,
+                        help="file the JSON report is written to")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"),
+                        help="compare two reports instead of benchmarking")
+    args = parser.parse_args()
+
+    if args.compare:
+        try:
+            reports = []
+            for path in args.compare:
+                with open(path, 'r') as report:
+                    reports.append(json.load(report))
+        except (IOError, OSError, ValueError) as err:
+            sys.exit("bench: %s" % err)
+        print_comparison(*reports)
+        sys.exit(0)
+
+    if args.programs < 1 or args.repeat < 1 or args.hours < 0:
+        parser.error("--programs and --repeat must be positive, --hours "
+                     "can't be negative")
+
+    logging.getLogger('scheduler').setLevel(logging.WARNING)
+    directory = args.directory or tempfile.mkdtemp(prefix='cajo-bench-')
+    try:
+        results = run_benchmarks(args, directory)
+    finally:
+        if args.directory is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    report = json.dumps({
+        'version': REPORT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'options': dict((name, getattr(args, name)) for name in (
+            'seed', 'programs', 'hours', 'repeat', 'workers', 'pool', 'jit',
+            'optimize', 'spread')),
+        'results': results
+    }, indent=2, sort_keys=True)
+
+    if args.output is None:
+        print(report)
+    else:
+        with open(args.output, 'w') as output:
+            output.write(report + '\n')
@@ -0,0 +1,219 @@
+"""
+Workload generator module file
+Writes synthetic CAJOlang programs, data files and manifests, the same seed
+always generating the same workload
+"""
+import os
+import random
+
+from lib.typeconv import Converter
+from lib.fileio import FormatConverter
+
+WORKLOAD_KINDS = ('loop', 'stream', 'jumps')
+
+# Values of each generated data file
+DATA_VALUES = 4096
+
+# Data files the streaming programs of a manifest share
+DATA_FILES = 4
+
+
+class WorkloadGenerator(object):
+    """
+    Generator of synthetic CAJOlang workloads
+
+    Three kinds of programs are generated: tight arithmetic loops, programs
+    streaming values from a data file to another one with CAJO_READ and
+    CAJO_WRITE, and deep chains of jumps visiting the program in a shuffled
+    order. Every program ends printing a value, so runs can be checked
+    against each other
+
+    # Constructor Args
+      - :directory: directory the programs and data files are written to,
+        created if it does not exist
+      - :seed: seed of the random choices
+    """
+
+    def __init__(self, directory, seed=0):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._directory = directory
+        self._random = random.Random(seed)
+
+    def _write(self, name, minute, lines):
+        """
+        Writes a program source file
+
+        # Args
+            - :name: file name, without extension
+            - :minute: execution minute
+            - :lines: list of the instructions
+
+        # Returns
+            - path of the source file
+        """
+        path = os.path.join(self._directory, name + '.cl')
+        with open(path, 'w') as source:
+            source.write('\n'.join([str(minute)] + lines) + '\n')
+        return path
+
+    def data_file(self, name, count=DATA_VALUES, binary=False):
+        """
+        Writes a data file of random values
+
+        # Args
+            - :name: file name, without extension
+            - :count: number of values
+            - :binary: if True writes the binary format instead of the ASCII
+              one
+
+        # Returns
+            - path of the data file
+        """
+        values = [self._random.randint(-32767, 32767) for i in range(count)]
+        path = os.path.join(self._directory, name + '.txt')
+        with open(path, 'w') as data:
+            data.write('\n'.join(Converter.ints_to_bins(values)) + '\n')
+        if binary:
+            text_path, path = path, os.path.join(self._directory,
+                                                 name + '.b16')
+            FormatConverter.text_to_binary(text_path, path)
+            os.remove(text_path)
+        return path
+
+    def loop(self, name, minute, iterations):
+        """
+        Writes a tight arithmetic loop, running for iterations rounds
+
+        # Args
+            - :name: file name, without extension
+            - :minute: execution minute
+            - :iterations: rounds of the loop, at most 32767
+
+        # Returns
+            - path of the source file
+        """
+        return self._write(name, minute, [
+            "CAJO_SET_MEMORY %d 0" % iterations,
+            "CAJO_SET_MEMORY 1 1",
+            "CAJO_SET_MEMORY 0 2",
+            # Alternating difference of the counter, never overflowing
+            "CAJO_COPY_FROM_MEMORY 0",
+            "CAJO_SUBTRACT 2",
+            "CAJO_COPY_TO_MEMORY 2",
+            "CAJO_COPY_FROM_MEMORY 0",
+            "CAJO_SUBTRACT 1",
+            "CAJO_COPY_TO_MEMORY 0",
+            "CAJO_JUMP_IF_POSITIVE_TO 3",
+            "CAJO_COPY_FROM_MEMORY 2",
+            "CAJO_PRINT"
+        ])
+
+    def stream(self, name, minute, source, destination, count, binary=False):
+        """
+        Writes a program copying values from a data file to another one
+
+        # Args
+            - :name: file name, without extension
+            - :minute: execution minute
+            - :source: data file read, with at least count values
+            - :destination: data file the values are appended to
+            - :count: values copied, at most 32767
+            - :binary: if True the data files are on the binary format
+
+        # Returns
+            - path of the source file
+        """
+        read_mode, write_mode = (2, 3) if binary else (0, 1)
+        return self._write(name, minute, [
+            "CAJO_SET_MEMORY %d 2" % count,
+            "CAJO_SET_MEMORY 1 1",
+            "CAJO_OPEN %s 0 %d" % (source, read_mode),
+            "CAJO_OPEN %s 1 %d" % (destination, write_mode),
+            "CAJO_READ 0",
+            "CAJO_WRITE 1",
+            "CAJO_COPY_FROM_MEMORY 2",
+            "CAJO_SUBTRACT 1",
+            "CAJO_COPY_TO_MEMORY 2",
+            "CAJO_JUMP_IF_POSITIVE_TO 4",
+            "CAJO_CLOSE 0",
+            "CAJO_CLOSE 1",
+            "CAJO_PRINT"
+        ])
+
+    def jumps(self, name, minute, depth, rounds):
+        """
+        Writes a chain of depth unconditional jumps, laid out on a random
+        order and walked rounds times
+
+        # Args
+            - :name: file name, without extension
+            - :minute: execution minute
+            - :depth: jumps of the chain
+            - :rounds: walks of the chain, at most 32767
+
+        # Returns
+            - path of the source file
+        """
+        first = 3
+        end = first + depth
+        order = list(range(first, end))
+        self._random.shuffle(order)
+
+        chain = [None] * depth
+        for slot, target in zip(order, order[1:] + [end]):
+            chain[slot - first] = "CAJO_JUMP %d" % target
+
+        return self._write(name, minute, [
+            "CAJO_SET_MEMORY %d 0" % rounds,
+            "CAJO_SET_MEMORY 1 1",
+            "CAJO_JUMP %d" % order[0]
+        ] + chain + [
+            "CAJO_COPY_FROM_MEMORY 0",
+            "CAJO_SUBTRACT 1",
+            "CAJO_COPY_TO_MEMORY 0",
+            "CAJO_JUMP_IF_POSITIVE_TO 2",
+            "CAJO_PRINT"
+        ])
+
+    def manifest(self, count, kinds=WORKLOAD_KINDS):
+        """
+        Writes count small programs of random kinds and sizes, scheduled on
+        random minutes, and a manifest listing them
+
+        # Args
+            - :count: number of programs
+            - :kinds: workload kinds the programs are drawn from
+
+        # Returns
+            - tuple of the manifest path and the list of the program paths
+        """
+        rand = self._random
+        sources = []
+        outputs = []
+        if 'stream' in kinds:
+            for index in range(DATA_FILES):
+                sources.append(self.data_file('data-%d' % index))
+                outputs.append(os.path.join(self._directory,
+                                            'out-%d.txt' % index))
+
+        paths = []
+        for index in range(count):
+            kind = rand.choice(kinds)
+            name = 'p%05d-%s' % (index, kind)
+            minute = rand.randrange(60)
+            if kind == 'loop':
+                paths.append(self.loop(name, minute, rand.randint(50, 500)))
+            elif kind == 'stream':
+                data = rand.randrange(DATA_FILES)
+                paths.append(self.stream(name, minute, sources[data],
+                                         outputs[data],
+                                         rand.randint(10, 200)))
+            else:
+                paths.append(self.jumps(name, minute, rand.randint(10, 100),
+                                        rand.randint(5, 50)))
+
+        manifest = os.path.join(self._directory, 'manifest.txt')
+        with open(manifest, 'w') as entries:
+            entries.write('\n'.join(paths) + '\n')
+        return (manifest, paths)
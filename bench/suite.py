@@ -0,0 +1,302 @@
+"""
+Benchmark suite module file
+Measures the interpreter and the scheduler on generated workloads, and
+compares the reports of two benchmark runs
+"""
+import sys
+import time
+import random
+
+from lib.cajolang import Interpreter
+from lib.registry import ProgramRegistry
+from lib.scheduler import Scheduler
+from lib.cost import CostEstimator
+from lib.metrics import RunStats
+from lib.sinks import CallbackSink
+from lib.typeconv import Converter
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import main
+
+# Interpreter modes measured, as name and Interpreter arguments
+MODES = (
+    ('interpreter', dict(jit=False, optimize=False)),
+    ('jit', dict(jit=True, optimize=False)),
+    ('optimized', dict(jit=False, optimize=True)),
+    ('optimized_jit', dict(jit=True, optimize=True))
+)
+
+# Output of the benchmarked runs, discarded
+DISCARD = CallbackSink(lambda source_file, text: None)
+
+
+def percentiles(values):
+    """
+    Summarizes a list of measurements
+
+    # Args
+        - :values: list of numbers
+
+    # Returns
+        - dict with the count, 50th, 90th and 99th percentiles and maximum of
+          the values (only the count if there are none)
+    """
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+    last = len(ordered) - 1
+    summary = {'count': len(ordered), 'max': ordered[last]}
+    for percentile in (50, 90, 99):
+        summary['p%d' % percentile] = ordered[
+            int(round(last * percentile / 100.0))]
+    return summary
+
+
+def peak_rss():
+    """
+    Returns the peak resident set size of the process and of its finished
+    children, in KB, or None where it can't be measured
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in bytes on macOS and in KB elsewhere
+    scale = 1024 if sys.platform == 'darwin' else 1
+    return {'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss //
+            scale,
+            'children': resource.getrusage(
+                resource.RUSAGE_CHILDREN).ru_maxrss // scale}
+
+
+def throughput(path, repeat=3):
+    """
+    Measures the instructions per second a program runs at on each
+    interpreter mode. Instructions are counted on the source program, so
+    the optimized modes are credited with the instructions they saved
+
+    # Args
+        - :path: CAJOlang source file
+        - :repeat: timed runs of each mode, the fastest one is kept
+
+    # Returns
+        - dict with the instructions of a run and, by mode, the seconds of
+          the fastest run and the instructions per second
+    """
+    stats = RunStats()
+    Interpreter(path, sink=DISCARD).run(stats=stats)
+    executed = stats.executed
+
+    report = {'instructions': executed}
+    for name, options in MODES:
+        interpreter = Interpreter(path, sink=DISCARD, **options)
+        # Compiles the program (and its JIT translation) untimed
+        interpreter.run()
+        best = None
+        for i in range(repeat):
+            started = time.perf_counter()
+            interpreter.run()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        report[name] = {'seconds': best,
+                        'instructions_per_second': executed / best}
+    return report
+
+
+def conversion(count=100000, seed=0):
+    """
+    Measures the values per second converted to and from the 16 bit
+    representations of the ASCII data files
+
+    # Args
+        - :count: number of values converted
+        - :seed: seed of the random values
+
+    # Returns
+        - dict of the values per second of each direction
+    """
+    rand = random.Random(seed)
+    values = [rand.randint(-32767, 32767) for i in range(count)]
+
+    started = time.perf_counter()
+    bins = Converter.ints_to_bins(values)
+    encoded = time.perf_counter() - started
+
+    started = time.perf_counter()
+    Converter.bins_to_ints(bins)
+    decoded = time.perf_counter() - started
+    return {'ints_to_bins': count / encoded, 'bins_to_ints': count / decoded}
+
+
+def startup(paths, optimize=False):
+    """
+    Measures the time to schedule the programs of a manifest, which compiles
+    and verifies them, and to load them all afterwards as their first runs
+    do
+
+    # Args
+        - :paths: list of the CAJOlang source files
+        - :optimize: if True the programs are optimized when loaded
+
+    # Returns
+        - tuple of the ProgramRegistry with the programs and a dict with the
+          programs scheduled, the seconds to schedule and to compile them
+    """
+    registry = ProgramRegistry(
+        lambda path: Interpreter(path, optimize=optimize))
+
+    started = time.perf_counter()
+    added, invalid = main.load_manifest(registry, paths)
+    loaded = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for interpreter in registry.filelist.values():
+        interpreter.program
+    compiled = time.perf_counter() - started
+
+    return (registry, {'programs': len(added), 'invalid': len(invalid),
+                       'load_seconds': loaded, 'compile_seconds': compiled})
+
+
+class SimulatedClock(object):
+    """
+    Clock that runs at the wall clock pace, except that it skips ahead over
+    the time the scheduler sleeps, so an hour of scheduling takes only as
+    long as its runs while deadlines missed because of slow runs are still
+    found late
+
+    # Constructor Args
+      - :start: initial time as seconds since epoch, defaults to now
+    """
+
+    def __init__(self, start=None):
+        self._skew = 0.0 if start is None else start - time.time()
+
+    def __call__(self):
+        return time.time() + self._skew
+
+    def sleep(self, seconds):
+        """
+        Advances the clock without waiting
+        """
+        self._skew += max(seconds, 0.0)
+
+
+class _RunRecorder(object):
+    """
+    Stands for the metrics of the scheduler, keeping the run time and
+    outcome of every run
+    """
+
+    def __init__(self):
+        self.durations = []
+        self.failed = 0
+
+    def record(self, result, scheduled=None):
+        if result.error is not None:
+            self.failed += 1
+        else:
+            self.durations.append(result.duration)
+
+    def write(self):
+        pass
+
+
+def schedule(registry, runner, hours=1, offset=0, tolerance=30,
+             spread='none'):
+    """
+    Runs the scheduler over the programs of a registry for a number of
+    simulated hours. Each due minute is executed as the scheduler would,
+    through main.execute_scheduled_tasks, and the scheduler sleeps are
+    skipped by a SimulatedClock
+
+    # Args
+        - :registry: ProgramRegistry of the programs
+        - :runner: TaskRunner the programs are executed on
+        - :hours: simulated hours
+        - :offset: second of the minute programs are started on
+        - :tolerance: seconds a minute may be late before it is missed
+        - :spread: 'binpack' starts the most expensive programs first
+
+    # Returns
+        - dict with the runs, failed runs and missed minutes, the wall clock
+          seconds taken, and the percentiles of the run times and of the
+          start lag of the minutes, both in seconds
+    """
+    clock = SimulatedClock()
+    estimator = CostEstimator()
+    recorder = _RunRecorder()
+    lags = []
+
+    def execute(minute, deadline):
+        lags.append(max(clock() - deadline, 0.0))
+        main.execute_scheduled_tasks(
+            registry.execution_schedule[minute], registry.filelist, runner,
+            estimator, spread == 'binpack', sink=DISCARD,
+            run_metrics=recorder)
+
+    scheduler = Scheduler(execute, offset, tolerance, clock)
+    for minute, tasklist in enumerate(registry.execution_schedule):
+        if tasklist:
+            scheduler.add(minute)
+
+    end = clock() + 3600 * hours
+    started = time.perf_counter()
+    # Scheduler.run, sleeping on the simulated clock
+    while True:
+        due, timeout = scheduler.pop_due()
+        for deadline, minute in due:
+            execute(minute, deadline)
+        if due:
+            continue
+        if timeout is None or clock() + timeout >= end:
+            break
+        clock.sleep(timeout)
+    elapsed = time.perf_counter() - started
+
+    return {'runs': len(recorder.durations) + recorder.failed,
+            'failed': recorder.failed,
+            'missed': scheduler.missed_runs,
+            'simulated_seconds': 3600 * hours,
+            'wall_seconds': elapsed,
+            'run_seconds': percentiles(recorder.durations),
+            'start_lag_seconds': percentiles(lags)}
+
+
+def _flatten(report, prefix=''):
+    """
+    Returns the numeric values of a report by dotted key
+    """
+    values = {}
+    for key, value in report.items():
+        name = prefix + key
+        if isinstance(value, dict):
+            values.update(_flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[name] = value
+    return values
+
+
+def compare(base, new):
+    """
+    Compares the measurements of two benchmark reports
+
+    # Args
+        - :base: report taken as reference
+        - :new: report compared with it
+
+    # Returns
+        - list of (key, base value, new value, relative change), for the
+          values both reports have, the relative change being None if the
+          base value is 0
+    """
+    base_values = _flatten(base.get('results', {}))
+    new_values = _flatten(new.get('results', {}))
+    changes = []
+    for key in sorted(set(base_values) & set(new_values)):
+        old, value = base_values[key], new_values[key]
+        change = (value - old) / float(old) if old else None
+        changes.append((key, old, value, change))
+    return changes
@@ -0,0 +1,156 @@
+"""
+Asyncio runtime module file
+Runs the programs of a schedule bucket as cooperative asyncio tasks, so that
+a single process keeps thousands of mostly I/O bound programs progressing
+"""
+import io
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.cajolang import Interpreter
+from lib.runner import TaskResult, memoized
+from lib.budget import Budget, BudgetExceeded
+from lib.metrics import RunStats
+from lib.trace import TraceBuffer, save_trace
+
+# Instructions a run executes before yielding to the other runs
+SLICE = 1000
+
+
+class AsyncRuntime(object):
+    """
+    Asyncio execution engine of CAJOlang programs
+
+    Each run is a task on the event loop that yields every slice
+    instructions, so long programs don't starve the others, and whose file
+    operations run on a thread pool while the loop goes on with the other
+    runs. At most concurrency runs are in progress at once, the rest wait
+    for a slot, which bounds the memory used by large buckets. Runs that
+    exceed their limits are aborted and counted on aborted_runs, and the
+    recorded results of a ResultCache are returned instead of running again
+
+    Exposes the same run() as TaskRunner, as a coroutine, so it can be
+    embedded in other asyncio services
+
+    # Constructor Args
+      - :slice: instructions a run executes before yielding
+      - :concurrency: maximum number of runs in progress
+      - :io_workers: threads file operations run on, defaults to 32
+      - :jit: if True runs programs translated to Python functions, which
+        can't yield and therefore run whole on the I/O threads
+      - :limits: optional Limits of each run
+      - :memo: optional ResultCache of the deterministic programs
+      - :profile: if True the runs are profiled, their RunStats returned on
+        their results
+      - :tracing: optional TraceOptions of the runs
+    """
+
+    def __init__(self, slice=SLICE, concurrency=1000, io_workers=None,
+                 jit=False, limits=None, memo=None, profile=False,
+                 tracing=None):
+        if slice < 1 or concurrency < 1:
+            raise ValueError("slice and concurrency must be positive")
+
+        self._slice = slice
+        self._concurrency = concurrency
+        self._jit = jit
+        self._limits = limits
+        self._memo = memo
+        self._profile = profile
+        self._tracing = tracing
+        self._executor = ThreadPoolExecutor(io_workers or 32)
+        # Created on first use, as it must belong to the running event loop
+        self._semaphore = None
+
+        self.aborted_runs = 0
+
+    async def run_program(self, program, deadline=None):
+        """
+        Runs a compiled program on a fresh interpreter session capturing its
+        stdout. Failures are reported on the result, only cancellation is
+        raised
+
+        # Args
+            - :program: verified Program
+            - :deadline: optional time (as seconds since epoch) the run must
+              end by
+
+        # Returns
+            - TaskResult
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+
+        async with self._semaphore:
+            output = io.StringIO()
+            stats = RunStats() if self._profile else None
+            trace = TraceBuffer.from_options(self._tracing, program)
+            started = time.time()
+            aborted = False
+            try:
+                interpreter = Interpreter.from_program(
+                    program, jit=self._jit, stdout=output)
+                await interpreter.run_async(
+                    self._slice, self._executor,
+                    Budget.from_limits(self._limits, deadline), stats, trace)
+                error = None
+            except asyncio.CancelledError:
+                raise
+            except BudgetExceeded as err:
+                error = "%s: %s" % (type(err).__name__, err)
+                aborted = True
+                self.aborted_runs += 1
+            except Exception as err:
+                error = "%s: %s" % (type(err).__name__, err)
+
+            if trace is not None and error is not None:
+                error += await asyncio.get_event_loop().run_in_executor(
+                    self._executor, save_trace, trace, self._tracing)
+            return TaskResult(program.source_file, output.getvalue(), error,
+                              time.time() - started, aborted, stats)
+
+    async def run(self, programs, costs=None, deadline=None):
+        """
+        Runs programs concurrently on the event loop
+
+        # Args
+            - :programs: list of verified Programs
+            - :costs: optional list of the estimated cost of each program,
+              programs are then started from the most to the least expensive
+            - :deadline: optional time (as seconds since epoch) every run
+              must end by
+
+        # Returns
+            - list of TaskResults, in the same order as programs
+        """
+        keys, replayed = memoized(self._memo, programs, self._limits)
+
+        order = range(len(programs))
+        if costs is not None:
+            order = sorted(order, key=lambda i: costs[i], reverse=True)
+
+        # Tasks are created in start order, as the semaphore is handed out
+        # to waiters in the order they asked for it
+        tasks = {}
+        for index in order:
+            if index not in replayed:
+                tasks[index] = asyncio.ensure_future(
+                    self.run_program(programs[index], deadline))
+
+        results = []
+        for index in range(len(programs)):
+            if index in replayed:
+                results.append(replayed[index])
+                continue
+            result = await tasks[index]
+            if keys[index] is not None:
+                self._memo.put(keys[index], result)
+            results.append(result)
+        return results
+
+    def shutdown(self):
+        """
+        Stops the I/O threads
+        """
+        self._executor.shutdown()
@@ -0,0 +1,124 @@
+"""
+Backfill module file
+Runs CAJOlang source files once, right away, on a worker pool, as the
+scheduler would run them on their minute
+"""
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from lib.cajolang import Interpreter
+from lib.runner import TaskResult, run_program
+from lib.sinks import FileSink
+
+# Runs submitted per worker ahead of the finished ones
+IN_FLIGHT = 4
+
+
+def _failed(path, err):
+    """
+    Returns the result of a run that failed before it was run
+    """
+    return TaskResult(path, '', "%s: %s" % (type(err).__name__, err), 0.0,
+                      False, None)
+
+
+def run_source(path, jit=False, optimize=False, limits=None):
+    """
+    Compiles and runs a source file. Is the entry point of the backfill
+    workers, so the programs are compiled on the workers too, and never
+    raises: failures, compilation ones included, are reported on the result
+
+    # Args
+        - :path: CAJOlang source file
+        - :jit: if True runs the program translated to a Python function
+        - :optimize: if True runs the program rewritten by the optimizer
+        - :limits: optional Limits of the run
+
+    # Returns
+        - TaskResult
+    """
+    try:
+        program = Interpreter(path, optimize=optimize).program
+    except Exception as err:
+        return _failed(path, err)
+    return run_program(program, jit, limits)
+
+
+def run_sources(paths, executor, window, jit=False, optimize=False,
+                limits=None):
+    """
+    Runs source files on an executor, with at most window runs submitted at
+    once, so only the results not collected yet are held in memory
+
+    # Args
+        - :paths: list of CAJOlang source files
+        - :executor: concurrent.futures executor the runs are submitted to
+        - :window: maximum number of runs submitted at once
+        - :jit: if True runs the programs translated to Python functions
+        - :optimize: if True runs the programs rewritten by the optimizer
+        - :limits: optional Limits of each run
+
+    # Returns
+        - generator of (index of the path, TaskResult), as the runs end
+    """
+    sources = iter(enumerate(paths))
+    submitted = {}
+    broken = None
+    while True:
+        for index, path in sources:
+            if broken is None:
+                try:
+                    submitted[executor.submit(run_source, path, jit,
+                                              optimize, limits)] = index
+                except Exception as err:
+                    # The pool broke (eg. a worker process killed), the
+                    # runs not submitted yet fail with its error
+                    broken = err
+            if broken is not None:
+                yield (index, _failed(path, broken))
+            elif len(submitted) >= window:
+                break
+        if not submitted:
+            return
+
+        done, running = wait(submitted, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = submitted.pop(future)
+            try:
+                result = future.result()
+            except Exception as err:
+                # The worker itself died (eg. a broken process pool)
+                result = _failed(paths[index], err)
+            yield (index, result)
+
+
+class OutputDirectory(object):
+    """
+    Writes the output of each program to its own file on a directory, named
+    as the files of the scheduler's --output files (see
+    lib.sinks.FileSink), so a program's output file is the same whatever
+    the order of the manifest
+
+    # Constructor Args
+      - :directory: output directory, created if it does not exist
+    """
+
+    def __init__(self, directory):
+        self._files = FileSink(directory)
+
+    def path(self, source_file):
+        """
+        Returns the path of the output file of a program
+        """
+        return self._files.path(source_file)
+
+    def write(self, source_file, output):
+        """
+        Replaces the output file of a program with its output
+
+        # Returns
+            - path of the output file
+        """
+        path = self.path(source_file)
+        with open(path, 'w') as destination:
+            destination.write(output)
+        return path
@@ -0,0 +1,88 @@
+"""
+Execution budget module file
+Limits the instructions executed and the wall time of CAJOlang runs
+"""
+import time
+from collections import namedtuple
+
+# Instructions executed between budget checks, the limits are therefore
+# enforced within this many instructions
+CHECK_INTERVAL = 1024
+
+# Limits of each run, None meaning unlimited
+#   - :instructions: maximum number of instructions executed
+#   - :seconds: maximum wall time in seconds
+Limits = namedtuple('Limits', ['instructions', 'seconds'])
+
+
+class BudgetExceeded(RuntimeError):
+    """
+    Raised on a run that exceeds its budget
+    """
+
+
+class Budget(object):
+    """
+    Instructions and wall time left to a single run
+
+    Runs charge the instructions they execute in batches of CHECK_INTERVAL,
+    and the clock is only read when a batch is charged, so enforcing a
+    budget costs a counter decrement per instruction. Closed form loops are
+    charged as a single instruction
+
+    # Constructor Args
+      - :instructions: maximum number of instructions, None if unlimited
+      - :seconds: maximum wall time from now, None if unlimited
+      - :deadline: time (as seconds since epoch) the run must end by, eg.
+        the deadline shared by the runs of a minute, None if unlimited
+      - :clock: function returning the current time as seconds since epoch
+    """
+
+    def __init__(self, instructions=None, seconds=None, deadline=None,
+                 clock=time.time):
+        if seconds is not None:
+            ends = clock() + seconds
+            deadline = ends if deadline is None else min(deadline, ends)
+
+        self._instructions = instructions
+        self._deadline = deadline
+        self._clock = clock
+        self.executed = 0
+
+    @classmethod
+    def from_limits(cls, limits=None, deadline=None):
+        """
+        Creates the budget of a run
+
+        # Args
+            - :limits: Limits of each run, None if unlimited
+            - :deadline: time the run must end by, None if unlimited
+
+        # Returns
+            - Budget, None if the run is unlimited
+        """
+        if limits is None:
+            if deadline is None:
+                return None
+            return cls(deadline=deadline)
+        return cls(limits.instructions, limits.seconds, deadline)
+
+    def charge(self, count):
+        """
+        Charges executed instructions to the budget
+
+        # Args
+            - :count: number of instructions executed since the last charge
+
+        # Raises
+            - :BudgetExceeded: if the run exceeded the instructions or went
+              past the deadline
+        """
+        self.executed += count
+        if (self._instructions is not None and
+                self.executed > self._instructions):
+            raise BudgetExceeded("executed more than %d instructions"
+                                 % self._instructions)
+        if self._deadline is not None and self._clock() > self._deadline:
+            raise BudgetExceeded("still running %.3f seconds past its deadline"
+                                 % (self._clock() - self._deadline))
@@ -0,0 +1,196 @@
+"""
+Compiled program cache module file
+Persists verified CAJOlang programs on disk in a compact binary format, so
+that restarts only compile the source files that changed
+"""
+import os
+import struct
+import hashlib
+import tempfile
+
+from lib.compiler import Compiler, Program, INSTRUCTION_SET
+from lib.verifier import Verifier
+
+MAGIC = b'CJOC'
+VERSION = 1
+
+# magic, version, source size, source mtime (ns), source sha1, minute,
+# instruction count
+HEADER = struct.Struct('<4sHqq20sHI')
+# opcode, argument count
+ENTRY = struct.Struct('<BB')
+INT_ARG = struct.Struct('<ci')
+STR_ARG = struct.Struct('<cH')
+
+OPCODES = sorted(INSTRUCTION_SET)
+OPCODE_INDEX = dict((name, index) for index, name in enumerate(OPCODES))
+# Opcode of None entries, which halt execution
+HALT = 255
+
+
+class ProgramCache(object):
+    """
+    On-disk cache of compiled programs
+
+    Each source file has a cache entry named after the hash of its absolute
+    path, holding the verified program along with the size, mtime and
+    content hash of the source it was compiled from. When size and mtime
+    match the source isn't read at all, when only the content hash matches
+    the entry is refreshed, otherwise the source is compiled again
+
+    # Constructor Args
+      - :directory: cache directory, created if it does not exist
+    """
+
+    def __init__(self, directory):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._directory = directory
+
+    def _entry_path(self, source_file):
+        """
+        Returns the path of the cache entry of a source file
+        """
+        key = hashlib.sha1(
+            os.path.abspath(source_file).encode('utf-8')).hexdigest()
+        return os.path.join(self._directory, key + '.clc')
+
+    @staticmethod
+    def encode(program, size, mtime, digest):
+        """
+        Encodes a verified program into a cache entry
+
+        # Args
+            - :program: verified Program
+            - :size: source file size
+            - :mtime: source file mtime in nanoseconds
+            - :digest: source file sha1 digest
+
+        # Returns
+            - bytes
+        """
+        chunks = [HEADER.pack(MAGIC, VERSION, size, mtime, digest,
+                              program.minute, len(program.code))]
+
+        for entry in program.code:
+            if entry is None:
+                chunks.append(ENTRY.pack(HALT, 0))
+                continue
+
+            instruction, args = entry
+            chunks.append(ENTRY.pack(OPCODE_INDEX[instruction], len(args)))
+            for arg in args:
+                if isinstance(arg, int):
+                    chunks.append(INT_ARG.pack(b'i', arg))
+                else:
+                    data = arg.encode('utf-8')
+                    chunks.append(STR_ARG.pack(b's', len(data)))
+                    chunks.append(data)
+
+        return b''.join(chunks)
+
+    @staticmethod
+    def decode(source_file, data):
+        """
+        Decodes a cache entry
+
+        # Args
+            - :source_file: filename of the CAJOlang source
+            - :data: cache entry bytes
+
+        # Returns
+            - tuple of the verified Program and the source (size, mtime,
+              digest) it was compiled from
+
+        # Raises
+            - :ValueError: if data is not a valid cache entry
+        """
+        try:
+            (magic, version, size, mtime, digest, minute,
+             count) = HEADER.unpack_from(data, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("not a version %d cache entry" % VERSION)
+
+            offset = HEADER.size
+            code = []
+            for index in range(count):
+                opcode, argc = ENTRY.unpack_from(data, offset)
+                offset += ENTRY.size
+                if opcode == HALT:
+                    code.append(None)
+                    continue
+
+                args = []
+                for arg in range(argc):
+                    if data[offset:offset + 1] == b'i':
+                        args.append(INT_ARG.unpack_from(data, offset)[1])
+                        offset += INT_ARG.size
+                    else:
+                        length = STR_ARG.unpack_from(data, offset)[1]
+                        offset += STR_ARG.size
+                        args.append(
+                            data[offset:offset + length].decode('utf-8'))
+                        offset += length
+                code.append((OPCODES[opcode], tuple(args)))
+        except (struct.error, IndexError, UnicodeDecodeError) as err:
+            raise ValueError("corrupted cache entry: %s" % err)
+
+        program = Program(source_file, minute, tuple(code), True)
+        return (program, (size, mtime, digest))
+
+    def _read(self, source_file):
+        """
+        Reads the cache entry of a source file
+
+        # Returns
+            - the decoded entry, None if missing or invalid
+        """
+        try:
+            with open(self._entry_path(source_file), 'rb') as entry:
+                return ProgramCache.decode(source_file, entry.read())
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _write(self, program, size, mtime, digest):
+        """
+        Atomically writes the cache entry of a program
+        """
+        path = self._entry_path(program.source_file)
+        descriptor, temp_path = tempfile.mkstemp(dir=self._directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as entry:
+                entry.write(ProgramCache.encode(program, size, mtime, digest))
+            os.replace(temp_path, path)
+        except (IOError, OSError):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def load(self, source_file):
+        """
+        Returns the verified program of a source file, compiling it only if
+        it changed since it was cached
+
+        # Args
+            - :source_file: filename of the CAJOlang source
+
+        # Returns
+            - verified Program
+        """
+        stat = os.stat(source_file)
+        cached = self._read(source_file)
+        if (cached is not None and
+                cached[1][:2] == (stat.st_size, stat.st_mtime_ns)):
+            return cached[0]
+
+        with open(source_file, 'rb') as source:
+            data = source.read()
+        digest = hashlib.sha1(data).digest()
+
+        if cached is not None and cached[1][2] == digest:
+            program = cached[0]
+        else:
+            program = Verifier.verify(Compiler.compile_source(
+                source_file, data.decode('utf-8').splitlines()))
+
+        self._write(program, stat.st_size, stat.st_mtime_ns, digest)
+        return program
@@ -2,16 +2,18 @@
 CAJOlang module file
 Implements tha CAJOlang according to the given specification
 """
-from lib.memspace import MemSpace
-from lib.validation import Validator
-from lib.typeconv import Converter
-
-is_int16 = Validator.int16_type_checking
-is_valid_instruction_pointer = Validator.instruction_pointer_checking
-is_valid_mem_position = Validator.mem_position_checking
+import time
+import asyncio
+import threading
 
-int2bin = Converter.int2bin
-bin2int = Converter.bin2int
+from lib.memspace import MemSpace
+from lib.compiler import Compiler
+from lib.fileio import open_file
+from lib.verifier import Verifier
+from lib.jit import Translator
+from lib.optimizer import Optimizer
+from lib.budget import CHECK_INTERVAL
+from lib.sinks import StreamSink, OutputBuffer
 
 
 class Interpreter(object):
@@ -19,13 +21,26 @@ class Interpreter(object):
     The CAJOlang interpreter
 
     Implements the language specification and instruction set, along with
-    methods for parsing and executing source code statements from a file
+    methods for executing a compiled CAJOlang program. The source file is
+    compiled once, on first use, into an array of pre-bound
+    (instruction, args) entries that the run loop dispatches over
+
+    Optionally the program may instead be translated into a native Python
+    function (see lib.jit), which produces the same output as the reference
+    run loop
 
     # Constructor Args
       - :source_file:  filename of CAJOlang source
+      - :jit: if True runs the program translated to a Python function
+      - :optimize: if True runs the program rewritten by lib.optimizer
+      - :stdout: file object CAJO_PRINT writes to, defaults to sys.stdout
+      - :cache: optional ProgramCache the compiled program is loaded from
+      - :sink: sink (see lib.sinks) the output of each run is delivered to,
+        in place of stdout
     """
 
-    def __init__(self, source_file):
+    def __init__(self, source_file, jit=False, optimize=False, stdout=None,
+                 cache=None, sink=None):
         self._instruction_set = {
             "CAJO_COPY_TO_MEMORY": self._CAJO_COPY_TO_MEMORY,
             "CAJO_COPY_FROM_MEMORY": self._CAJO_COPY_FROM_MEMORY,
@@ -40,35 +55,56 @@ class Interpreter(object):
             "CAJO_OPEN": self._CAJO_OPEN,
             "CAJO_CLOSE": self._CAJO_CLOSE,
             "CAJO_READ": self._CAJO_READ,
-            "CAJO_WRITE": self._CAJO_WRITE
+            "CAJO_WRITE": self._CAJO_WRITE,
+            "SUPER_ADD_TO_MEMORY": self._SUPER_ADD_TO_MEMORY,
+            "SUPER_SUBTRACT_FROM_MEMORY": self._SUPER_SUBTRACT_FROM_MEMORY,
+            "SUPER_SUBTRACT_WHILE_POSITIVE":
+                self._SUPER_SUBTRACT_WHILE_POSITIVE,
+            "SUPER_ADD_WHILE_NEGATIVE": self._SUPER_ADD_WHILE_NEGATIVE,
+            "SUPER_SUBTRACT_FROM_MEMORY_WHILE_POSITIVE":
+                self._SUPER_SUBTRACT_FROM_MEMORY_WHILE_POSITIVE,
+            "SUPER_ADD_TO_MEMORY_WHILE_NEGATIVE":
+                self._SUPER_ADD_TO_MEMORY_WHILE_NEGATIVE
         }
 
-        self._instruction_pointer = 0
-        self._source_file = source_file
-        self._memspace = MemSpace()
+        # Handlers that block on the file system, run on an executor by
+        # run_async so that they don't stall the event loop
+        self._blocking = frozenset([
+            self._CAJO_OPEN, self._CAJO_CLOSE, self._CAJO_READ,
+            self._CAJO_WRITE
+        ])
 
-        # Line count is initialized once the interpreter is started
-        self._source_line_count = None
+        self._source_file = source_file
+        self._jit = jit
+        self._optimize = optimize
+        self._sink = sink if sink is not None else StreamSink(stdout)
+        self._cache = cache
+
+        # Verified program, set once the source file is compiled, and
+        # program, bound code and translated function, set once it is loaded
+        self._verified = None
+        self._program = None
+        self._code = None
+        self._function = None
+        # Metered and profiled variants of the translated function, by
+        # (metered, profiled)
+        self._variants = {}
+        self.optimization_report = None
+        self._load_lock = threading.Lock()
 
     @staticmethod
-    def _instruction_call(instruction, *args):
-        """
-        Thin wrapper around an instruction call with a given list of arguments
-        """
-        instruction(*args)
-
-    def _CAJO_COPY_TO_MEMORY(self, P):
+    def _CAJO_COPY_TO_MEMORY(mem, P):
         """
         Copy the value in temp_area to the position [P] integer memory
 
         # Args
           :P: integer memory position (zero-indexed)
         """
-        if is_valid_mem_position(P, 'int'):
-            self._memspace.integer_mem[P] = self._memspace.temp_area
-            self._instruction_pointer += 1
+        mem.integer_mem[P] = mem.temp_area
+        mem.instruction_pointer += 1
 
-    def _CAJO_COPY_FROM_MEMORY(self, P):
+    @staticmethod
+    def _CAJO_COPY_FROM_MEMORY(mem, P):
         """
         Copy the value in the position [P] of the integer memory to the
         temp_area
@@ -76,11 +112,11 @@ class Interpreter(object):
         # Args
           :P: integer memory position (zero-indexed)
         """
-        if is_valid_mem_position(P, 'int'):
-            self._memspace.temp_area = self._memspace.integer_mem[P]
-            self._instruction_pointer += 1
+        mem.temp_area = mem.integer_mem[P]
+        mem.instruction_pointer += 1
 
-    def _CAJO_SET_MEMORY(self, number, P):
+    @staticmethod
+    def _CAJO_SET_MEMORY(mem, number, P):
         """
         Store [number] (an explicit integer) on integer position [P]
 
@@ -89,12 +125,11 @@ class Interpreter(object):
 
           :P: integer memory position (zero-indexed)
         """
-        if is_int16(number):
-            if is_valid_mem_position(P, 'int'):
-                self._memspace.integer_mem[P] = number
-                self._instruction_pointer += 1
+        mem.integer_mem[P] = number
+        mem.instruction_pointer += 1
 
-    def _CAJO_ADD(self, P):
+    @staticmethod
+    def _CAJO_ADD(mem, P):
         """
         Add the value in temp_area with the value in the integer position [P]
         and store the result in temp_area
@@ -102,11 +137,11 @@ class Interpreter(object):
         # Args
           :P: integer memory position (zero-indexed)
         """
-        if is_valid_mem_position(P, 'int'):
-            self._memspace.temp_area += self._memspace.integer_mem[P]
-            self._instruction_pointer += 1
+        mem.temp_area += mem.integer_mem[P]
+        mem.instruction_pointer += 1
 
-    def _CAJO_SUBTRACT(self, P):
+    @staticmethod
+    def _CAJO_SUBTRACT(mem, P):
         """
         Subtract the value in temp_area by the value in the integer memory
         position [P] and store the result in temp_area
@@ -114,18 +149,19 @@ class Interpreter(object):
         # Args
           :P: integer memory position (zero-indexed)
         """
-        if is_valid_mem_position(P, 'int'):
-            self._memspace.temp_area -= self._memspace.integer_mem[P]
-            self._instruction_pointer += 1
+        mem.temp_area -= mem.integer_mem[P]
+        mem.instruction_pointer += 1
 
-    def _CAJO_PRINT(self):
+    @staticmethod
+    def _CAJO_PRINT(mem):
         """
         Print the value of temp_area to stdout
         """
-        print(self._memspace.temp_area)
-        self._instruction_pointer += 1
+        mem.output.write(mem.temp_area)
+        mem.instruction_pointer += 1
 
-    def _CAJO_JUMP_IF_NEGATIVE_TO(self, I):
+    @staticmethod
+    def _CAJO_JUMP_IF_NEGATIVE_TO(mem, I):
         """
         Jump to instruction [I] (counted from the start of the code, starting
         at 0) if the value in temp_area is negative
@@ -133,28 +169,27 @@ class Interpreter(object):
         # Args
           :I: Instruction number (zero-indexed)
         """
-        if is_valid_instruction_pointer(I, self._source_line_count):
-            if self._memspace.temp_area < 0:
-                self._instruction_pointer = I
-            else:
-                self._instruction_pointer += 1
+        if mem.temp_area < 0:
+            mem.instruction_pointer = I
+        else:
+            mem.instruction_pointer += 1
 
-    def _CAJO_JUMP_IF_POSITIVE_TO(self, I):
+    @staticmethod
+    def _CAJO_JUMP_IF_POSITIVE_TO(mem, I):
         """
         Jump to instruction [I] (counted from the start of the code, starting
         at 0) if the value in temp_area is zero or positive
 
         # Args
-          :I: Instruction# Args
-          :I: Instruction number (zero-indexed) number (zero-indexed)
+          :I: Instruction number (zero-indexed)
         """
-        if is_valid_instruction_pointer(I, self._source_line_count):
-            if self._memspace.temp_area > 0:
-                self._instruction_pointer = I
-            else:
-                self._instruction_pointer += 1
+        if mem.temp_area > 0:
+            mem.instruction_pointer = I
+        else:
+            mem.instruction_pointer += 1
 
-    def _CAJO_JUMP_IF_ZERO_TO(self, I):
+    @staticmethod
+    def _CAJO_JUMP_IF_ZERO_TO(mem, I):
         """
         Jump to instruction [I] (counted from the start of the code, starting
         at 0) if the value in temp_area is zero
@@ -162,13 +197,13 @@ class Interpreter(object):
         # Args
           :I: Instruction number (zero-indexed)
         """
-        if is_valid_instruction_pointer(I, self._source_line_count):
-            if self._memspace.temp_area == 0:
-                self._instruction_pointer = I
-            else:
-                self._instruction_pointer += 1
+        if mem.temp_area == 0:
+            mem.instruction_pointer = I
+        else:
+            mem.instruction_pointer += 1
 
-    def _CAJO_JUMP(self, I):
+    @staticmethod
+    def _CAJO_JUMP(mem, I):
         """
         Unconditionally jump to instruction [I] (counted from the start of the
         code, starting at 0)
@@ -176,49 +211,50 @@ class Interpreter(object):
         # Args
           :I: Instruction number (zero-indexed)
         """
-        if is_valid_instruction_pointer(I, self._source_line_count):
-            self._instruction_pointer = I
+        mem.instruction_pointer = I
 
-    def _CAJO_OPEN(self, string, P, mode):
+    @staticmethod
+    def _CAJO_OPEN(mem, string, P, mode):
         """
         Open the file named [string] with mode [mode] and store the file
         descriptor in position [P]. The file name may have, at most, 15
         characters. [mode] is either 0 or 1, where 0 is READ only mode, and 1
-        is WRITE only mode
+        is WRITE only mode, or 2 and 3 for the same modes on the binary format
+        (see lib.fileio). A descriptor already in position [P] is closed
 
         # Args
           :string: filename
 
           :P: integer memory position (zero-indexed)
 
-          :mode: 0=READ ONLY, 1=WRITE ONLY
+          :mode: 0=READ ONLY, 1=WRITE ONLY, 2=BINARY READ ONLY,
+            3=BINARY WRITE ONLY
         """
-        mode_map = ['r', 'a']
-        if is_valid_mem_position(P, 'file'):
-            if not isinstance(mode, int):
-                raise TypeError("mode must be an integer")
-            elif not (mode == 1 or mode == 0):
-                raise ValueError("mode must be either 1 or 0")
-            else:
-                self._memspace.file_handles[P] = open(string, mode_map[mode])
-                self._instruction_pointer += 1
+        handle = mem.file_handles[P]
+        if handle is not None:
+            mem.file_handles[P] = None
+            handle.close()
+        mem.file_handles[P] = open_file(string, mode, stats=mem.stats)
+        mem.instruction_pointer += 1
 
-    def _CAJO_CLOSE(self, P):
+    @staticmethod
+    def _CAJO_CLOSE(mem, P):
         """
         Close the file descriptor in position [P]
 
         # Args
           :P: integer memory position (zero-indexed)
         """
-        if is_valid_mem_position(P, 'file'):
-            if not self._memspace.file_handles:
-                raise RuntimeError("File descriptor memory position %d not\
-                initialized" % P)
-            else:
-                self._memspace.file_handles[P].close()
-                self._instruction_pointer += 1
+        handle = mem.file_handles[P]
+        if handle is None:
+            raise RuntimeError("File descriptor memory position %d not "
+                               "initialized" % P)
+        mem.file_handles[P] = None
+        handle.close()
+        mem.instruction_pointer += 1
 
-    def _CAJO_READ(self, P):
+    @staticmethod
+    def _CAJO_READ(mem, P):
         """
         Read one 16 bit integer (binary) from the file descriptor on position
         [P] to temp_area
@@ -226,15 +262,11 @@ class Interpreter(object):
         # Args
           :P: integer memory position (zero-indexed)
         """
-        if is_valid_mem_position(P, 'file'):
-            if not self._memspace.file_handles[P].readable():
-                raise IOError("File is not readable")
-            else:
-                line = self._memspace.file_handles[P].readline()
-                self._memspace.temp_area = bin2int(line.rstrip())
-                self._instruction_pointer += 1
+        mem.temp_area = mem.file_handles[P].read_int()
+        mem.instruction_pointer += 1
 
-    def _CAJO_WRITE(self, P):
+    @staticmethod
+    def _CAJO_WRITE(mem, P):
         """
         Write the value in temp_area to the file on position [P] as a 16 bit
         integer (binary)
@@ -242,44 +274,218 @@ class Interpreter(object):
         # Args
           :P: integer memory position (zero-indexed)
         """
-        if is_valid_mem_position(P, 'file'):
-            if not self._memspace.file_handles[P].writable():
-                raise IOError("File is not writable")
-            else:
-                self._memspace.file_handles[P].write(
-                    int2bin(self._memspace.temp_area) + '\n')
-                self._instruction_pointer += 1
+        mem.file_handles[P].write_int(mem.temp_area)
+        mem.instruction_pointer += 1
+
+    @staticmethod
+    def _SUPER_ADD_TO_MEMORY(mem, P, Q):
+        """
+        Superinstruction for CAJO_COPY_FROM_MEMORY P; CAJO_ADD Q;
+        CAJO_COPY_TO_MEMORY P
+
+        # Args
+          :P: integer memory position (zero-indexed)
+
+          :Q: integer memory position (zero-indexed)
+        """
+        integer_mem = mem.integer_mem
+        integer_mem[P] = mem.temp_area = integer_mem[P] + integer_mem[Q]
+        mem.instruction_pointer += 1
+
+    @staticmethod
+    def _SUPER_SUBTRACT_FROM_MEMORY(mem, P, Q):
+        """
+        Superinstruction for CAJO_COPY_FROM_MEMORY P; CAJO_SUBTRACT Q;
+        CAJO_COPY_TO_MEMORY P
+
+        # Args
+          :P: integer memory position (zero-indexed)
+
+          :Q: integer memory position (zero-indexed)
+        """
+        integer_mem = mem.integer_mem
+        integer_mem[P] = mem.temp_area = integer_mem[P] - integer_mem[Q]
+        mem.instruction_pointer += 1
+
+    @staticmethod
+    def _SUPER_SUBTRACT_WHILE_POSITIVE(mem, Q):
+        """
+        Closed form of the loop CAJO_SUBTRACT Q; CAJO_JUMP_IF_POSITIVE_TO
+        (back to the subtraction). If the loop never terminates the
+        superinstruction is executed again instead of moving on
+
+        # Args
+          :Q: integer memory position (zero-indexed)
+        """
+        step = mem.integer_mem[Q]
+        value = mem.temp_area - step
+        if value > 0 and step > 0:
+            value -= (value + step - 1) // step * step
+
+        mem.temp_area = value
+        if value <= 0:
+            mem.instruction_pointer += 1
+
+    @staticmethod
+    def _SUPER_ADD_WHILE_NEGATIVE(mem, Q):
+        """
+        Closed form of the loop CAJO_ADD Q; CAJO_JUMP_IF_NEGATIVE_TO (back to
+        the addition). If the loop never terminates the superinstruction is
+        executed again instead of moving on
+
+        # Args
+          :Q: integer memory position (zero-indexed)
+        """
+        step = mem.integer_mem[Q]
+        value = mem.temp_area + step
+        if value < 0 and step > 0:
+            value += (step - value - 1) // step * step
+
+        mem.temp_area = value
+        if value >= 0:
+            mem.instruction_pointer += 1
 
-    def _parse(self, statement):
+    @staticmethod
+    def _SUPER_SUBTRACT_FROM_MEMORY_WHILE_POSITIVE(mem, P, Q):
+        """
+        Closed form of the loop SUPER_SUBTRACT_FROM_MEMORY P Q;
+        CAJO_JUMP_IF_POSITIVE_TO (back to the subtraction). If the loop never
+        terminates the superinstruction is executed again instead of moving on
+
+        # Args
+          :P: integer memory position (zero-indexed)
+
+          :Q: integer memory position (zero-indexed)
+        """
+        integer_mem = mem.integer_mem
+        step = integer_mem[Q]
+        value = integer_mem[P] - step
+        if value > 0 and step > 0:
+            value -= (value + step - 1) // step * step
+
+        integer_mem[P] = mem.temp_area = value
+        if value <= 0:
+            mem.instruction_pointer += 1
+
+    @staticmethod
+    def _SUPER_ADD_TO_MEMORY_WHILE_NEGATIVE(mem, P, Q):
         """
-        Parses a statement from a CAJOlang source code file into an
-        instruction and its arguments
+        Closed form of the loop SUPER_ADD_TO_MEMORY P Q;
+        CAJO_JUMP_IF_NEGATIVE_TO (back to the addition). If the loop never
+        terminates the superinstruction is executed again instead of moving on
 
         # Args
-          - :statement: string of CAJOlang source code statement
+          :P: integer memory position (zero-indexed)
+
+          :Q: integer memory position (zero-indexed)
+        """
+        integer_mem = mem.integer_mem
+        step = integer_mem[Q]
+        value = integer_mem[P] + step
+        if value < 0 and step > 0:
+            value += (step - value - 1) // step * step
+
+        integer_mem[P] = mem.temp_area = value
+        if value >= 0:
+            mem.instruction_pointer += 1
+
+    @property
+    def program(self):
+        """
+        The compiled Program of the interpreter source file
+        """
+        if self._program is None:
+            with self._load_lock:
+                if self._program is None:
+                    self.load()
+        return self._program
+
+    def verify(self):
+        """
+        Compiles and verifies the source file, once, without optimizing,
+        binding nor translating the program, which is left to load()
 
         # Returns
-          - tuple of instrucion and args list
+          - the verified Program
+
+        # Raises
+          - :NameError: on instructions outside the CAJOlang instruction set
+          - :TypeError: on operands of the wrong type or count
+          - :ValueError: on operands out of range
         """
+        if self._verified is None:
+            if self._cache is not None:
+                program = self._cache.load(self._source_file)
+            else:
+                program = Verifier.verify(
+                    Compiler.compile_file(self._source_file))
+            self._verified = program
+        return self._verified
 
-        tokens = statement.split(" ")
-        instruction = tokens[0]
-        args = []
+    def load(self):
+        """
+        Compiles and verifies the source file (unless verify() already did)
+        and binds each instruction of the resulting program to its
+        implementation, so that the run loop does no parsing, instruction set
+        lookups nor operand checks
 
-        if instruction == 'CAJO_OPEN':
-            args.append(tokens[1])
-            args.extend([int(arg) for arg in tokens[2:]])
-        elif instruction == 'CAJO_PRINT':
-            return (instruction, args)
-        else:
-            args.extend([int(arg) for arg in tokens[1:]])
+        # Raises
+          - :NameError: on instructions outside the CAJOlang instruction set
+          - :TypeError: on operands of the wrong type or count
+          - :ValueError: on operands out of range
+        """
+        program = self.verify()
+        if self._optimize:
+            program, self.optimization_report = Optimizer.optimize(program)
 
-        return (instruction, args)
+        self._bind(program)
+
+    def _bind(self, program):
+        """
+        Binds each instruction of a verified program to its implementation
+
+        # Args
+          - :program: verified Program
+        """
+        self._code = [None if entry is None else
+                      (self._instruction_set[entry[0]], entry[1])
+                      for entry in program.code]
+        if self._jit:
+            self._function = Translator.compile(program)
+        self._variants = {}
+        self._program = program
+
+    @classmethod
+    def from_program(cls, program, jit=False, stdout=None, sink=None):
+        """
+        Creates an interpreter session for an already compiled program, such
+        as one shipped to a worker process
+
+        # Args
+          - :program: verified (and possibly optimized) Program
+          - :jit: if True runs the program translated to a Python function
+          - :stdout: file object CAJO_PRINT writes to, defaults to sys.stdout
+          - :sink: sink the output of each run is delivered to, in place of
+            stdout
+
+        # Returns
+          - Interpreter
+        """
+        interpreter = cls(program.source_file, jit=jit, stdout=stdout,
+                          sink=sink)
+        interpreter._bind(Verifier.verify(program))
+        return interpreter
+
+    @property
+    def loaded(self):
+        """
+        True once the program is loaded, optimized and translated
+        """
+        return self._program is not None
 
     def get_execution_minute(self):
         """
-        Reads the source code file and returns the minute when the file is
-        to be executed
+        Returns the minute when the source file is to be executed
 
         # Args
           :self:  Interpreter object
@@ -287,38 +493,260 @@ class Interpreter(object):
         # Returns
           minutes int
         """
-        with open(self._source_file, 'r') as source:
-            minute = source.readline().rstrip()
-            return int(minute)
+        return self.program.minute
 
-    def run(self):
+    def _translated(self, budget, stats=None):
+        """
+        Returns the JIT function the program runs on, the metered one if the
+        run has a budget and the profiled one if it has stats, None if the
+        program is not translated
         """
-        Runs CAJOlang interpreter reading through the source code and
-        executing statements sequentially
+        key = (budget is not None, stats is not None)
+        if self._function is None or key == (False, False):
+            return self._function
+        function = self._variants.get(key)
+        if function is None:
+            function = Translator.compile(self._program, *key)
+            self._variants[key] = function
+        return function
+
+    @staticmethod
+    def _wrapped(code, blocking, wrap):
         """
-        execution_buffer = []
-        with open(self._source_file, 'r') as source:
-            line = source.readline()
+        Returns a copy of bound code where each handler is replaced by a
+        wrapper, so that profiled and traced runs go through the same run
+        loops as the others, along with the set of its handlers that block on
+        the file system
+
+        # Args
+          - :code: bound code
+          - :blocking: frozenset of the blocking handlers of the code
+          - :wrap: function returning the wrapper of a handler, given the
+            handler and its instruction number
 
-            while line:
-                line = source.readline()
-                execution_buffer.append(line.rstrip())
+        # Returns
+          - tuple of the code and the frozenset of blocking handlers
+        """
+        wrapped = []
+        wrapped_blocking = []
+        for index, entry in enumerate(code):
+            if entry is None:
+                wrapped.append(None)
+                continue
+            instruction, args = entry
+            handler = wrap(instruction, index)
+            if instruction in blocking:
+                wrapped_blocking.append(handler)
+            wrapped.append((handler, args))
+        return (wrapped, frozenset(wrapped_blocking))
 
-            # Appends empty string to execution buffer to symbolize EOF
-            execution_buffer.append("")
-            self._source_line_count = len(execution_buffer)
+    @staticmethod
+    def _counted(code, blocking, counts):
+        """
+        Wraps bound code to count the times each instruction is executed on
+        counts (see _wrapped)
+        """
+        def counter(instruction, index):
+            def counted(mem, *args):
+                counts[index] += 1
+                instruction(mem, *args)
+            return counted
 
-        statement = execution_buffer[self._instruction_pointer]
-        while statement:
-            (instruction, args) = self._parse(statement)
+        return Interpreter._wrapped(code, blocking, counter)
 
-            if instruction not in self._instruction_set:
-                raise NameError(
-                    "Illegal operation, %s not in CAJOlang instruction set"
-                    % instruction)
+    def _traced(self, code, blocking, trace):
+        """
+        Wraps bound code to record each instruction on a TraceBuffer before
+        it is executed (see _wrapped)
+        """
+        record = trace.record
+
+        def tracer(instruction, index):
+            opcode = trace.opcode(self._program.code[index][0])
+
+            def traced(mem, *args):
+                record(index, opcode, mem)
+                instruction(mem, *args)
+            return traced
+
+        return Interpreter._wrapped(code, blocking, tracer)
+
+    def _profiled(self, function, stats, counts):
+        """
+        Adds the instructions executed by a profiled run to its stats
+
+        # Args
+          - :function: JIT function the run executed on, None if it ran on
+            the bound code
+          - :stats: RunStats of the run
+          - :counts: instruction counts of the bound code, or block counts
+            of the JIT function
+        """
+        if function is not None:
+            counts = Translator.instruction_counts(self._program, counts)
+        stats.count(self._program.code, counts)
+
+    @staticmethod
+    def _run_metered(code, mem, budget):
+        """
+        Run loop charging the executed instructions to a budget every
+        CHECK_INTERVAL instructions
+
+        # Raises
+          - :BudgetExceeded: if the run exceeds the budget
+        """
+        left = CHECK_INTERVAL
+        try:
+            entry = code[mem.instruction_pointer]
+            while entry is not None:
+                instruction, args = entry
+                instruction(mem, *args)
+                entry = code[mem.instruction_pointer]
+                left -= 1
+                if not left:
+                    # Reset first, so a batch charged is not counted again
+                    # when the charge aborts the run
+                    left = CHECK_INTERVAL
+                    budget.charge(CHECK_INTERVAL)
+        finally:
+            budget.executed += CHECK_INTERVAL - left
+
+    def run(self, budget=None, stats=None, trace=None):
+        """
+        Runs CAJOlang interpreter executing the compiled program statements
+        sequentially
+
+        Each run executes on its own MemSpace, so runs don't share memory and
+        the same interpreter may run on several threads at once. File
+        descriptors the run left open are closed when it ends, even if it
+        raised or was aborted
+
+        Profiled runs count the instructions they execute, by opcode, and
+        their I/O on stats, and traced runs record the last instructions they
+        execute on a TraceBuffer. Only those go through the counting and
+        recording code, so the other runs pay nothing for it. Traced runs
+        always run on the bound code, even if the program is translated
+
+        # Args
+          - :budget: optional Budget limiting the run, checked every
+            CHECK_INTERVAL instructions (and at the backward jumps of
+            programs translated by the JIT)
+          - :stats: optional RunStats (see lib.metrics) the run is profiled
+            on
+          - :trace: optional TraceBuffer (see lib.trace) the run is traced on
+
+        # Raises
+          - :BudgetExceeded: if the run exceeds the budget
+        """
+        if self._program is None:
+            # Compiles the source file on first use
+            self.program
+        mem = MemSpace(OutputBuffer(self._sink, self._source_file), stats)
+        function = self._translated(budget, stats) if trace is None else None
+        code = self._code
+        counts = None
+        if stats is not None:
+            stats.started = time.time()
+            counts = [0] * len(code)
+            if function is None:
+                code = Interpreter._counted(code, self._blocking, counts)[0]
+        if trace is not None:
+            code = self._traced(code, self._blocking, trace)[0]
+
+        try:
+            if budget is not None:
+                # Fails right away on runs started past their deadline
+                budget.charge(0)
+
+            if function is not None:
+                function(mem, mem.output.write, budget, counts)
+            elif budget is not None:
+                Interpreter._run_metered(code, mem, budget)
             else:
-                self._instruction_call(self._instruction_set[instruction],
-                                       *args)
-                statement = execution_buffer[self._instruction_pointer]
+                entry = code[0]
+                while entry is not None:
+                    instruction, args = entry
+                    instruction(mem, *args)
+                    entry = code[mem.instruction_pointer]
+        finally:
+            try:
+                mem.close()
+            finally:
+                mem.output.flush()
+                if stats is not None:
+                    self._profiled(function, stats, counts)
+
+    async def run_async(self, slice=1000, executor=None, budget=None,
+                        stats=None, trace=None):
+        """
+        Coroutine running the program cooperatively on the asyncio event
+        loop: it yields to the other tasks every slice instructions, and file
+        operations run on the executor while the loop goes on with the other
+        runs. Programs translated by the JIT can't yield, so they run whole
+        on the executor
 
-        self._instruction_pointer = 0
+        # Args
+          - :slice: instructions executed between yields
+          - :executor: executor file operations run on, defaults to the
+            event loop default executor
+          - :budget: optional Budget limiting the run, checked on every
+            yield
+          - :stats: optional RunStats (see lib.metrics) the run is profiled
+            on
+          - :trace: optional TraceBuffer (see lib.trace) the run is traced
+            on, traced runs always run on the bound code
+
+        # Raises
+          - :BudgetExceeded: if the run exceeds the budget
+        """
+        if self._program is None:
+            # Compiles the source file on first use
+            self.program
+        loop = asyncio.get_event_loop()
+        mem = MemSpace(OutputBuffer(self._sink, self._source_file), stats)
+        function = self._translated(budget, stats) if trace is None else None
+        code = self._code
+        blocking = self._blocking
+        counts = None
+        if stats is not None:
+            stats.started = time.time()
+            counts = [0] * len(code)
+            if function is None:
+                code, blocking = Interpreter._counted(code, blocking, counts)
+        if trace is not None:
+            code, blocking = self._traced(code, blocking, trace)
+        executed = 0
+
+        try:
+            if budget is not None:
+                budget.charge(0)
+
+            if function is not None:
+                await loop.run_in_executor(executor, function, mem,
+                                           mem.output.write, budget, counts)
+                return
+
+            entry = code[0]
+            while entry is not None:
+                instruction, args = entry
+                if instruction in blocking:
+                    await loop.run_in_executor(executor, instruction, mem,
+                                               *args)
+                else:
+                    instruction(mem, *args)
+                executed += 1
+                if executed == slice:
+                    executed = 0
+                    if budget is not None:
+                        budget.charge(slice)
+                    await asyncio.sleep(0)
+                entry = code[mem.instruction_pointer]
+        finally:
+            if budget is not None:
+                budget.executed += executed
+            try:
+                mem.close()
+            finally:
+                mem.output.flush()
+                if stats is not None:
+                    self._profiled(function, stats, counts)
@@ -0,0 +1,685 @@
+"""
+Cluster module file
+Spreads the runs of the scheduler over worker nodes, on this host or on
+others, which a coordinator owning the schedule reaches over TCP
+"""
+import json
+import time
+import socket
+import logging
+import itertools
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from lib.compiler import Program
+from lib.cost import CostEstimator
+from lib.metrics import RunStats
+from lib.runner import TaskResult
+from lib.verifier import Verifier, OPERANDS
+
+logger = logging.getLogger('scheduler')
+
+# Seconds between the heartbeats of the workers, a worker missing
+# HEARTBEAT_MISSES heartbeats in a row is declared dead
+HEARTBEAT = 2.0
+HEARTBEAT_MISSES = 3
+
+# Seconds the runs of a minute wait for a worker when none is connected
+JOIN_TIMEOUT = 10.0
+
+# Seconds a worker waits before connecting again to the coordinator
+RETRY = 2.0
+
+# Seconds the coordinator waits for the results of a batch, past the
+# deadline of its runs if they have one, before the worker is declared
+# stalled and the batch started again on the others
+STALL_TIMEOUT = 300.0
+
+# Workers a run is started on before it is reported lost
+ATTEMPTS = 3
+
+# RunStats fields sent along the results of profiled runs
+_STATS_FIELDS = ('instructions', 'handles', 'bytes_read', 'bytes_written')
+
+
+class WorkerLost(Exception):
+    """
+    Raised for the runs in progress on a worker that disconnected
+    """
+    pass
+
+
+class Connection(object):
+    """
+    Message stream over a connected socket, each message being a JSON object
+    on its own line. Messages may be sent from several threads
+
+    # Constructor Args
+      - :sock: connected socket
+    """
+
+    def __init__(self, sock):
+        self._socket = sock
+        self._reader = sock.makefile('rb')
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        """
+        Sends a message
+
+        # Args
+            - :message: JSON serializable dict
+
+        # Raises
+            - :OSError: if the connection is broken
+        """
+        data = (json.dumps(message) + '\n').encode('utf-8')
+        with self._lock:
+            self._socket.sendall(data)
+
+    def receive(self):
+        """
+        Waits for the next message
+
+        # Returns
+            - dict, None once the connection is closed
+
+        # Raises
+            - :ValueError: on malformed messages
+            - :OSError: if the connection is broken
+        """
+        line = self._reader.readline()
+        if not line:
+            return None
+        message = json.loads(line.decode('utf-8'))
+        if not isinstance(message, dict):
+            raise ValueError("messages must be JSON objects")
+        return message
+
+    def close(self):
+        """
+        Closes the connection, waking up the thread waiting on receive()
+        """
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+
+
+def encode_program(program):
+    """
+    Returns the JSON serializable form of a compiled Program
+    """
+    return {'source_file': program.source_file,
+            'minute': program.minute,
+            'code': [None if entry is None else [entry[0], list(entry[1])]
+                     for entry in program.code]}
+
+
+def decode_program(data):
+    """
+    Rebuilds a Program sent by the coordinator. The Program is not verified,
+    so the worker verifies it again before running it
+
+    # Args
+        - :data: encoded Program
+
+    # Returns
+        - Program
+
+    # Raises
+        - :ValueError: if the data is not a valid Program
+    """
+    try:
+        code = []
+        for entry in data['code']:
+            if entry is None:
+                code.append(None)
+                continue
+            instruction, args = entry
+            if instruction not in OPERANDS:
+                raise ValueError("unknown instruction %s" % instruction)
+            code.append((instruction, tuple(args)))
+        return Program(data['source_file'], data['minute'], tuple(code),
+                       False)
+    except (KeyError, TypeError) as err:
+        raise ValueError("malformed program: %s" % err)
+
+
+def encode_result(result):
+    """
+    Returns the JSON serializable form of a TaskResult
+    """
+    stats = None
+    if result.stats is not None:
+        stats = dict((field, getattr(result.stats, field))
+                     for field in _STATS_FIELDS)
+    return [result.source_file, result.output, result.error,
+            result.duration, result.aborted, stats]
+
+
+def decode_result(data):
+    """
+    Rebuilds a TaskResult sent by a worker
+    """
+    source_file, output, error, duration, aborted, stats = data
+    if stats is not None:
+        values, stats = stats, RunStats()
+        for field in _STATS_FIELDS:
+            setattr(stats, field, values[field])
+    return TaskResult(source_file, output, error, duration, aborted, stats)
+
+
+def partition(costs, slots):
+    """
+    Splits runs over workers, from the most to the least expensive run, each
+    one to the worker that would end its share the soonest
+
+    # Args
+        - :costs: list of the estimated cost of each run
+        - :slots: list of the runs each worker executes concurrently
+
+    # Returns
+        - list with the sorted list of run indexes of each worker
+    """
+    loads = [0.0] * len(slots)
+    shards = [[] for count in slots]
+    for index in sorted(range(len(costs)), key=lambda i: costs[i],
+                        reverse=True):
+        worker = min(range(len(slots)),
+                     key=lambda w: (loads[w] + costs[index]) / slots[w])
+        loads[worker] += costs[index]
+        shards[worker].append(index)
+    for shard in shards:
+        shard.sort()
+    return shards
+
+
+class _RemoteWorker(object):
+    """
+    Coordinator side of the connection of a worker, with the batches of runs
+    in progress on it
+
+    # Constructor Args
+      - :connection: Connection to the worker
+      - :name: name the worker joined with
+      - :slots: runs the worker executes concurrently
+    """
+
+    def __init__(self, connection, name, slots):
+        self.connection = connection
+        self.name = name
+        self.slots = slots
+        self.last_seen = time.time()
+        self.alive = True
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, batch, programs, costs, deadline):
+        """
+        Sends a batch of runs to the worker
+
+        # Args
+            - :batch: batch id
+            - :programs: list of verified Programs
+            - :costs: list of the estimated cost of each program
+            - :deadline: optional time (as seconds since epoch) every run
+              must end by
+
+        # Returns
+            - Future of the list of TaskResults of the batch, failed with
+              WorkerLost if the worker disconnects first
+        """
+        future = Future()
+        with self._lock:
+            if not self.alive:
+                future.set_exception(WorkerLost(self.name))
+                return future
+            self._pending[batch] = future
+
+        # Sent as seconds left, so the clocks of the hosts needn't agree
+        timeout = None if deadline is None else deadline - time.time()
+        try:
+            self.connection.send({
+                'type': 'run', 'batch': batch, 'timeout': timeout,
+                'programs': [encode_program(program) for program in programs],
+                'costs': costs})
+        except OSError:
+            self.lost()
+        return future
+
+    def resolve(self, batch, results):
+        """
+        Completes a batch with the results the worker sent
+        """
+        results = [decode_result(result) for result in results]
+        with self._lock:
+            future = self._pending.pop(batch, None)
+        if future is not None:
+            future.set_result(results)
+
+    def lost(self):
+        """
+        Marks the worker dead, failing the batches in progress on it
+        """
+        with self._lock:
+            if not self.alive:
+                return
+            self.alive = False
+            pending, self._pending = self._pending, {}
+        self.connection.close()
+        for future in pending.values():
+            future.set_exception(WorkerLost(self.name))
+
+
+class Coordinator(object):
+    """
+    Runner (see lib.runner.TaskRunner) executing the runs on worker nodes
+
+    Workers connect to the coordinator, which keeps the schedule and the
+    clock, and the programs of each minute are split among the workers
+    connected by their estimated cost, measured on their previous runs, and
+    sent to them compiled, so the workers need nothing but the data files.
+    Workers send a heartbeat every heartbeat seconds, and the runs in
+    progress on a worker that disconnects or misses its heartbeats are
+    started again on the remaining ones (so runs are executed at least
+    once). So are the runs of a worker that still sends heartbeats but
+    doesn't send their results within stall_timeout seconds (past their
+    deadline if they have one), the worker being disconnected. A run is
+    started on up to ATTEMPTS workers before it is reported lost
+
+    The protocol has no authentication, workers must only be able to reach
+    the coordinator over a trusted network
+
+    # Constructor Args
+      - :host: address to listen on, defaults to the loopback
+      - :port: port to listen on, 0 for any free port
+      - :profile: if True the workers profile the runs
+      - :heartbeat: seconds between the heartbeats of the workers
+      - :stall_timeout: seconds to wait for the results of a batch past
+        the deadline of its runs (or from its submission if they have
+        none) before the worker is declared stalled
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, profile=False,
+                 heartbeat=HEARTBEAT, stall_timeout=STALL_TIMEOUT):
+        self._address = (host, port)
+        self._profile = profile
+        self._heartbeat = heartbeat
+        self._stall_timeout = stall_timeout
+        self._estimator = CostEstimator()
+        self._batches = itertools.count()
+        self._server = None
+        self._stopped = threading.Event()
+
+        self._workers = []
+        self._lock = threading.Lock()
+        self._joined = threading.Condition(self._lock)
+
+        self.aborted_runs = 0
+
+    def start(self):
+        """
+        Starts accepting workers, on a background thread
+
+        # Returns
+            - port the coordinator listens on
+        """
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(self._address)
+        self._server.listen(64)
+        for target in (self._accept, self._monitor):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+        return self._server.getsockname()[1]
+
+    @property
+    def workers(self):
+        """
+        Names of the workers connected
+        """
+        with self._lock:
+            return [worker.name for worker in self._workers]
+
+    def _accept(self):
+        """
+        Accepts the connections of the workers
+        """
+        while not self._stopped.is_set():
+            try:
+                sock, address = self._server.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            thread = threading.Thread(target=self._serve,
+                                      args=(Connection(sock), address))
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, connection, address):
+        """
+        Registers a worker and handles its messages until it disconnects
+        """
+        try:
+            hello = connection.receive()
+            if hello is None or hello.get('type') != 'hello':
+                raise ValueError("expected a hello message")
+            worker = _RemoteWorker(
+                connection, "%s (%s:%d)" % (hello.get('name'), address[0],
+                                            address[1]),
+                max(1, int(hello.get('slots', 1))))
+            connection.send({'type': 'welcome', 'profile': self._profile,
+                             'heartbeat': self._heartbeat})
+        except (OSError, ValueError, TypeError) as err:
+            logger.warning("rejected worker %s:%d: %s", address[0],
+                           address[1], err)
+            connection.close()
+            return
+
+        with self._joined:
+            self._workers.append(worker)
+            self._joined.notify_all()
+        logger.info("worker %s joined with %d slots", worker.name,
+                    worker.slots)
+
+        try:
+            while True:
+                message = connection.receive()
+                if message is None:
+                    break
+                worker.last_seen = time.time()
+                if message.get('type') == 'results':
+                    worker.resolve(message['batch'], message['results'])
+        except (OSError, ValueError, KeyError, TypeError) as err:
+            if worker.alive:
+                logger.warning("worker %s failed: %s", worker.name, err)
+
+        worker.lost()
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+        if not self._stopped.is_set():
+            logger.warning("worker %s left", worker.name)
+
+    def _monitor(self):
+        """
+        Disconnects the workers that missed their heartbeats
+        """
+        while not self._stopped.wait(self._heartbeat):
+            silent = time.time() - self._heartbeat * HEARTBEAT_MISSES
+            with self._lock:
+                missing = [worker for worker in self._workers
+                           if worker.last_seen < silent]
+            for worker in missing:
+                logger.warning("worker %s missed its heartbeats",
+                               worker.name)
+                worker.lost()
+
+    def _live_workers(self, deadline):
+        """
+        Returns the workers connected, waiting for one to join if there is
+        none, up to JOIN_TIMEOUT seconds or until the deadline
+        """
+        timeout = JOIN_TIMEOUT
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.time())
+        with self._joined:
+            if not self._workers and timeout > 0:
+                self._joined.wait_for(lambda: self._workers, timeout)
+            return [worker for worker in self._workers if worker.alive]
+
+    def run(self, programs, costs=None, deadline=None):
+        """
+        Runs programs on the workers
+
+        # Args
+            - :programs: list of verified Programs
+            - :costs: optional list of the estimated cost of each program,
+              estimated from their measured run times otherwise
+            - :deadline: optional time (as seconds since epoch) every run
+              must end by
+
+        # Returns
+            - generator of TaskResults, in the same order as programs
+        """
+        if costs is None:
+            costs = [self._estimator.estimate(program)
+                     for program in programs]
+
+        results = [None] * len(programs)
+        attempts = [0] * len(programs)
+        pending = list(range(len(programs)))
+        while pending:
+            workers = self._live_workers(deadline)
+            if not workers:
+                for index in pending:
+                    results[index] = TaskResult(
+                        programs[index].source_file, '',
+                        "WorkerLost: no worker available", 0.0, False, None)
+                break
+
+            batches = []
+            shards = partition([costs[index] for index in pending],
+                               [worker.slots for worker in workers])
+            for worker, shard in zip(workers, shards):
+                if shard:
+                    indexes = [pending[i] for i in shard]
+                    batches.append((worker, indexes, worker.submit(
+                        next(self._batches),
+                        [programs[index] for index in indexes],
+                        [costs[index] for index in indexes], deadline)))
+
+            stalled = ((time.time() if deadline is None else deadline) +
+                       self._stall_timeout)
+            pending = []
+            for worker, indexes, future in batches:
+                try:
+                    batch_results = future.result(
+                        max(0.0, stalled - time.time()))
+                except FutureTimeout:
+                    # Its connection is closed so that its late results
+                    # are dropped, and the worker joins again once done
+                    logger.warning("worker %s stalled", worker.name)
+                    worker.lost()
+                    batch_results = None
+                except WorkerLost:
+                    batch_results = None
+
+                if batch_results is None:
+                    logger.warning("%d run(s) of worker %s reassigned",
+                                   len(indexes), worker.name)
+                    for index in indexes:
+                        attempts[index] += 1
+                        if attempts[index] < ATTEMPTS:
+                            pending.append(index)
+                            continue
+                        results[index] = TaskResult(
+                            programs[index].source_file, '',
+                            "WorkerLost: lost on %d workers" % ATTEMPTS,
+                            0.0, False, None)
+                    continue
+                for index, result in zip(indexes, batch_results):
+                    results[index] = result
+                    self._estimator.record(result.source_file,
+                                           result.duration)
+                    if result.aborted:
+                        with self._lock:
+                            self.aborted_runs += 1
+            pending.sort()
+
+        for result in results:
+            yield result
+
+    def shutdown(self):
+        """
+        Stops accepting workers and disconnects the ones connected
+        """
+        self._stopped.set()
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            worker.lost()
+
+
+class Worker(object):
+    """
+    Worker node, running the batches of runs the coordinator sends on a
+    local runner and sending back their results. The worker connects again
+    whenever its connection to the coordinator is lost
+
+    # Constructor Args
+      - :address: (host, port) of the coordinator
+      - :factory: function creating the local runner (see
+        lib.runner.TaskRunner), given whether the runs are profiled
+      - :slots: runs the local runner executes concurrently
+      - :name: name the worker joins with, defaults to the host name
+    """
+
+    def __init__(self, address, factory, slots=1, name=None):
+        self._address = address
+        self._factory = factory
+        self._slots = slots
+        self._name = name or socket.gethostname()
+        self._runner = None
+        self._profile = None
+        self._connection = None
+        self._stopped = threading.Event()
+
+    def serve(self):
+        """
+        Serves the coordinator until stop() is called
+        """
+        try:
+            while not self._stopped.is_set():
+                try:
+                    sock = socket.create_connection(self._address)
+                except OSError as err:
+                    logger.warning("coordinator %s:%d unreachable: %s",
+                                   self._address[0], self._address[1], err)
+                    self._stopped.wait(RETRY)
+                    continue
+
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self._connection = Connection(sock)
+                try:
+                    self._session(self._connection)
+                except (OSError, ValueError, KeyError, TypeError) as err:
+                    if not self._stopped.is_set():
+                        logger.warning("connection to the coordinator "
+                                       "failed: %s", err)
+                self._connection.close()
+                if not self._stopped.is_set():
+                    logger.warning("disconnected from the coordinator")
+                    self._stopped.wait(RETRY)
+        finally:
+            if self._runner is not None:
+                self._runner.shutdown()
+
+    def _session(self, connection):
+        """
+        Joins the coordinator and runs the batches it sends until the
+        connection is closed
+        """
+        connection.send({'type': 'hello', 'name': self._name,
+                         'slots': self._slots})
+        welcome = connection.receive()
+        if welcome is None or welcome.get('type') != 'welcome':
+            raise ValueError("expected a welcome message")
+
+        profile = bool(welcome.get('profile'))
+        if self._runner is None or profile != self._profile:
+            if self._runner is not None:
+                self._runner.shutdown()
+            self._runner = self._factory(profile)
+            self._profile = profile
+        logger.info("joined the coordinator at %s:%d", self._address[0],
+                    self._address[1])
+
+        closed = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat,
+            args=(connection, closed, float(welcome['heartbeat'])))
+        heartbeat.daemon = True
+        heartbeat.start()
+        try:
+            while True:
+                message = connection.receive()
+                if message is None:
+                    return
+                if message.get('type') == 'run':
+                    thread = threading.Thread(target=self._run_batch,
+                                              args=(connection, message))
+                    thread.daemon = True
+                    thread.start()
+        finally:
+            closed.set()
+
+    def _heartbeat(self, connection, closed, interval):
+        """
+        Sends a heartbeat every interval seconds until the session ends
+        """
+        while not closed.wait(interval):
+            try:
+                connection.send({'type': 'heartbeat'})
+            except OSError:
+                return
+
+    def _run_batch(self, connection, message):
+        """
+        Runs a batch of runs and sends back their results
+        """
+        timeout = message.get('timeout')
+        deadline = None if timeout is None else time.time() + timeout
+
+        results = [None] * len(message['programs'])
+        programs = []
+        indexes = []
+        for index, data in enumerate(message['programs']):
+            try:
+                programs.append(Verifier.verify(decode_program(data)))
+                indexes.append(index)
+            except (ValueError, TypeError) as err:
+                source_file = (data.get('source_file', '')
+                               if isinstance(data, dict) else '')
+                results[index] = TaskResult(
+                    source_file, '', "%s: %s" % (type(err).__name__, err),
+                    0.0, False, None)
+
+        try:
+            costs = message.get('costs')
+            if costs is not None:
+                costs = [costs[index] for index in indexes]
+            for index, result in zip(indexes, self._runner.run(
+                    programs, costs, deadline)):
+                results[index] = result
+        except Exception as err:
+            # Eg. a broken runner, the runs without a result fail with its
+            # error so that the batch is still answered right away
+            for index, program in zip(indexes, programs):
+                if results[index] is None:
+                    results[index] = TaskResult(
+                        program.source_file, '',
+                        "%s: %s" % (type(err).__name__, err), 0.0, False,
+                        None)
+
+        try:
+            connection.send({'type': 'results', 'batch': message['batch'],
+                             'results': [encode_result(result)
+                                         for result in results]})
+        except OSError:
+            # The coordinator starts the batch again on another worker
+            pass
+
+    def stop(self):
+        """
+        Disconnects from the coordinator and stops serving
+        """
+        self._stopped.set()
+        if self._connection is not None:
+            self._connection.close()
@@ -0,0 +1,212 @@
+"""
+CAJOlang compiler module file
+Translates CAJOlang source files into pre-decoded programs
+"""
+import os
+from collections import namedtuple
+
+# Immutable compiled form of a CAJOlang source file
+#   - :source_file: filename of the CAJOlang source
+#   - :minute: minute of the hour on which the program is executed
+#   - :code: tuple of (instruction, args) entries indexed by instruction
+#     number, where a None entry halts execution (blank line or EOF)
+#   - :verified: True once the program has passed the Verifier checks
+Program = namedtuple('Program', ['source_file', 'minute', 'code', 'verified'])
+
+INSTRUCTION_SET = frozenset([
+    "CAJO_COPY_TO_MEMORY",
+    "CAJO_COPY_FROM_MEMORY",
+    "CAJO_SET_MEMORY",
+    "CAJO_ADD",
+    "CAJO_SUBTRACT",
+    "CAJO_PRINT",
+    "CAJO_JUMP_IF_NEGATIVE_TO",
+    "CAJO_JUMP_IF_POSITIVE_TO",
+    "CAJO_JUMP_IF_ZERO_TO",
+    "CAJO_JUMP",
+    "CAJO_OPEN",
+    "CAJO_CLOSE",
+    "CAJO_READ",
+    "CAJO_WRITE"
+])
+
+# CAJO_OPEN modes, 0=READ ONLY, 1=WRITE ONLY on the ASCII format of the
+# specification and 2=READ ONLY, 3=WRITE ONLY on the binary format
+FILE_MODES = ['r', 'a', 'rb', 'ab']
+
+# Side effects of a program, see Compiler.classify
+PURE = 'pure'
+READS_FILES = 'reads'
+WRITES_FILES = 'writes'
+
+
+class Compiler(object):
+    """
+    The CAJOlang compiler
+
+    provides static methods for parsing CAJOlang statements and compiling
+    whole source files into Program objects, so that source code is read and
+    tokenized only once instead of on every executed statement
+    """
+
+    @staticmethod
+    def parse(statement):
+        """
+        Parses a statement from a CAJOlang source code file into an
+        instruction and its arguments
+
+        # Args
+          - :statement: string of CAJOlang source code statement
+
+        # Returns
+          - tuple of instrucion and args tuple
+
+        # Raises
+          - :NameError: if the instruction is not in the CAJOlang
+            instruction set
+        """
+        tokens = statement.split(" ")
+        instruction = tokens[0]
+
+        if instruction not in INSTRUCTION_SET:
+            raise NameError(
+                "Illegal operation, %s not in CAJOlang instruction set"
+                % instruction)
+
+        if instruction == 'CAJO_OPEN':
+            args = [tokens[1]]
+            args.extend([int(arg) for arg in tokens[2:]])
+        elif instruction == 'CAJO_PRINT':
+            args = []
+        else:
+            args = [int(arg) for arg in tokens[1:]]
+
+        return (instruction, tuple(args))
+
+    @staticmethod
+    def parse_minute(header):
+        """
+        Parses the execution minute line of a CAJOlang source
+
+        # Args
+          - :header: first line of the source, stripped
+
+        # Returns
+          - minute int
+
+        # Raises
+          - :ValueError: if the line is not a minute of the hour
+        """
+        try:
+            minute = int(header)
+        except ValueError:
+            raise ValueError("%r is not an execution minute" % header)
+        if not 0 <= minute < 60:
+            raise ValueError("execution minute must be in the [0, 60) range")
+        return minute
+
+    @staticmethod
+    def compile_source(source_file, lines):
+        """
+        Compiles the lines of a CAJOlang source into a Program
+
+        # Args
+          - :source_file: filename of the CAJOlang source
+          - :lines: iterable of source lines, the first one being the
+            execution minute
+
+        # Returns
+          - Program
+
+        # Raises
+          - :ValueError: if the first line is not a minute of the hour
+        """
+        lines = iter(lines)
+        minute = Compiler.parse_minute(next(lines, '').strip())
+
+        code = []
+        for line in lines:
+            statement = line.rstrip()
+            # An empty statement halts execution, as EOF does
+            code.append(Compiler.parse(statement) if statement else None)
+
+        # Trailing entry symbolizes EOF
+        code.append(None)
+
+        return Program(source_file, minute, tuple(code), False)
+
+    @staticmethod
+    def check_source_file(path):
+        """
+        Checks that a path is an existing CAJOlang source file
+
+        # Args
+          - :path: path of the file
+
+        # Raises
+          - :IOError: if the path is not a CAJOlang source file
+        """
+        ext = os.path.splitext(path)[1]
+
+        if not os.path.exists(path):
+            raise IOError("File %s does not exist" % path)
+        if not os.path.isfile(path):
+            raise IOError("argument %s is not a file" % path)
+        if ext != '.cl':
+            raise IOError("argument %s is not a CAJOlang source file" % path)
+
+    @staticmethod
+    def read_minute(source_file):
+        """
+        Reads the execution minute of a CAJOlang source file, without
+        compiling the rest of it
+
+        # Args
+          - :source_file: filename of the CAJOlang source
+
+        # Returns
+          - minute int
+
+        # Raises
+          - :ValueError: if the first line is not a minute of the hour
+        """
+        with open(source_file, 'r') as source:
+            return Compiler.parse_minute(source.readline().strip())
+
+    @staticmethod
+    def classify(program):
+        """
+        Classifies a program by its side effects
+
+        # Args
+          - :program: Program
+
+        # Returns
+          - PURE if it uses no file instructions, so it prints the same
+            every time it runs, READS_FILES if it only opens files for
+            reading, so its output only depends on their content, and
+            WRITES_FILES otherwise
+        """
+        # CAJO_READ, CAJO_WRITE and CAJO_CLOSE only act on the descriptors
+        # opened by CAJO_OPEN, otherwise they fail the same way every run
+        purity = PURE
+        for entry in program.code:
+            if entry is not None and entry[0] == "CAJO_OPEN":
+                if FILE_MODES[entry[1][2]].startswith('a'):
+                    return WRITES_FILES
+                purity = READS_FILES
+        return purity
+
+    @staticmethod
+    def compile_file(source_file):
+        """
+        Reads and compiles a CAJOlang source file
+
+        # Args
+          - :source_file: filename of the CAJOlang source
+
+        # Returns
+          - Program
+        """
+        with open(source_file, 'r') as source:
+            return Compiler.compile_source(source_file, source)
@@ -0,0 +1,131 @@
+"""
+Cost estimation module file
+Estimates the run time of CAJOlang programs, used to spread the programs of
+a minute over time and over the workers
+"""
+import threading
+
+from lib.optimizer import JUMPS
+
+# Static cost of the instructions, in units of a plain instruction dispatch,
+# for the ones costing more than that
+INSTRUCTION_COSTS = {
+    "CAJO_OPEN": 50,
+    "CAJO_CLOSE": 20,
+    "CAJO_READ": 10,
+    "CAJO_WRITE": 10,
+    "CAJO_PRINT": 5
+}
+
+# Iterations assumed for each loop, as they are not known statically
+LOOP_ITERATIONS = 100
+
+# Approximate run time of an instruction dispatch
+SECONDS_PER_UNIT = 1e-6
+
+SPREAD_MODES = ('none', 'stagger', 'binpack')
+
+
+class CostEstimator(object):
+    """
+    Run time estimator of CAJOlang programs
+
+    Programs that never ran are estimated from their code: instruction
+    count, the bodies of loops (backward jumps) weighted by an assumed
+    iteration count, and I/O instructions weighted by their cost. Once a
+    program runs its measured run time takes over, as an exponential moving
+    average of the latest runs
+
+    # Constructor Args
+      - :smoothing: weight of the latest run on the moving average
+    """
+
+    def __init__(self, smoothing=0.3):
+        self._smoothing = smoothing
+        self._measured = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def static_cost(program):
+        """
+        Estimates the cost of a program from its code
+
+        # Args
+            - :program: verified Program
+
+        # Returns
+            - cost in units of a plain instruction dispatch
+        """
+        cost = 0
+        for index, entry in enumerate(program.code):
+            if entry is None:
+                continue
+
+            instruction, args = entry
+            cost += INSTRUCTION_COSTS.get(instruction, 1)
+
+            if instruction in JUMPS and args[0] <= index:
+                cost += (index - args[0] + 1) * LOOP_ITERATIONS
+        return cost
+
+    def record(self, source_file, duration):
+        """
+        Records the measured run time of a program
+
+        # Args
+            - :source_file: filename of the CAJOlang source
+            - :duration: run time in seconds
+        """
+        with self._lock:
+            previous = self._measured.get(source_file)
+            if previous is None:
+                self._measured[source_file] = duration
+            else:
+                self._measured[source_file] = (
+                    self._smoothing * duration +
+                    (1 - self._smoothing) * previous)
+
+    def estimate(self, program):
+        """
+        Estimates the run time of a program
+
+        # Args
+            - :program: verified Program
+
+        # Returns
+            - run time in seconds
+        """
+        measured = self._measured.get(program.source_file)
+        if measured is not None:
+            return measured
+        return CostEstimator.static_cost(program) * SECONDS_PER_UNIT
+
+
+def stagger(tasks, costs, window, slots):
+    """
+    Spreads tasks over evenly spaced start times of a window, balancing the
+    estimated cost started at each time. Tasks are placed from the most to
+    the least expensive on the least loaded start time (LPT)
+
+    # Args
+        - :tasks: list of tasks
+        - :costs: list of the estimated cost of each task
+        - :window: seconds over which start times are spread
+        - :slots: maximum number of start times
+
+    # Returns
+        - list of (delay in seconds, list of tasks), sorted by delay, where
+          tasks keep their original relative order
+    """
+    slots = max(1, min(slots, len(tasks)))
+    loads = [0.0] * slots
+    assigned = [[] for slot in range(slots)]
+
+    order = sorted(range(len(tasks)), key=lambda i: costs[i], reverse=True)
+    for index in order:
+        slot = loads.index(min(loads))
+        loads[slot] += costs[index]
+        assigned[slot].append(index)
+
+    return [(window * slot / slots, [tasks[i] for i in sorted(indexes)])
+            for slot, indexes in enumerate(assigned) if indexes]
@@ -0,0 +1,601 @@
+"""
+CAJOlang file I/O module file
+Implements the file descriptors of CAJO_OPEN, on the ASCII format of the
+specification (one 16 character binary line per value) and on a compact
+binary format (packed little endian int16 values), over a process wide pool
+of OS file descriptors shared by every run
+"""
+import os
+import sys
+import mmap
+import time
+import errno
+import struct
+import threading
+from array import array
+from collections import OrderedDict
+
+from lib.typeconv import Converter
+from lib.compiler import FILE_MODES
+
+int2bin = Converter.int2bin
+bin2int = Converter.bin2int
+
+# Value on the binary format
+INT16 = struct.Struct('<h')
+
+# Values a writer holds before writing them out
+WRITE_BUFFER = 65536
+
+# Bytes read at once by text readers
+READ_CHUNK = 65536
+
+# OS file descriptors open at once on the default pool
+MAX_OPEN_FILES = 256
+
+# Seconds CAJO_OPEN waits for a descriptor once all of them are in use
+OPEN_WAIT = 10.0
+
+
+class PooledFile(object):
+    """
+    OS file descriptor of a pooled file, shared by every run that opened the
+    file with the same access. Reads are positioned (pread) so that each run
+    keeps its own offset, and appends are serialized so that the writes of
+    concurrent runs are never interleaved
+
+    # Constructor Args
+      - :path: absolute file path
+      - :append: if True the file is opened for appending, otherwise for
+        reading
+    """
+
+    def __init__(self, path, append):
+        if append:
+            flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT
+        else:
+            flags = os.O_RDONLY
+        self.path = path
+        self.append = append
+        self.fd = os.open(path, flags | getattr(os, 'O_CLOEXEC', 0), 0o666)
+        self.identity = PooledFile.identify(os.fstat(self.fd), append)
+        self.users = 0
+        self.stale = False
+        self._lock = threading.Lock()
+        self._mapping = None
+
+    @staticmethod
+    def identify(stat, append):
+        """
+        Returns what identifies a version of a file: its inode, and for files
+        read also its size and mtime, so that files modified since they were
+        pooled are opened again
+        """
+        if append:
+            return (stat.st_dev, stat.st_ino)
+        return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def read(self, size, offset):
+        """
+        Reads up to size bytes at offset
+        """
+        return os.pread(self.fd, size, offset)
+
+    def mapping(self):
+        """
+        Returns the read only memory map of the file, mapped on first use
+        """
+        with self._lock:
+            if self._mapping is None:
+                try:
+                    self._mapping = mmap.mmap(self.fd, 0,
+                                              access=mmap.ACCESS_READ)
+                except ValueError:
+                    # Empty files can't be mapped
+                    self._mapping = b''
+            return self._mapping
+
+    def write(self, data):
+        """
+        Appends data in one piece, relative to the other runs
+        """
+        view = memoryview(data)
+        with self._lock:
+            while view:
+                view = view[os.write(self.fd, view):]
+
+    def close(self):
+        """
+        Closes the OS file descriptor
+        """
+        if isinstance(self._mapping, mmap.mmap):
+            self._mapping.close()
+        os.close(self.fd)
+
+
+class HandlePool(object):
+    """
+    Process wide pool of the OS file descriptors opened by CAJO_OPEN
+
+    Runs opening a file that is already pooled share its descriptor instead
+    of opening it again, as long as the file was not replaced (or modified,
+    for reads) since. At most max_open descriptors are open at once, the
+    ones in use by runs included: descriptors no run is using stay open for
+    the next runs until a new one is needed, the least recently used being
+    closed first, and once every descriptor is in use opening a new file
+    waits for one to be released, for up to wait seconds. So the same files
+    opened every hour by thousands of runs cost a handful of descriptors and
+    no open/close calls, and the process never runs out of descriptors
+
+    # Constructor Args
+      - :max_open: maximum number of descriptors open at once
+      - :wait: seconds opening a file waits for a descriptor to be released
+    """
+
+    def __init__(self, max_open=MAX_OPEN_FILES, wait=OPEN_WAIT):
+        self.max_open = max_open
+        self.wait = wait
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        # Pooled files by (path, append)
+        self._files = {}
+        # Keys of the pooled files no run is using, least recently used first
+        self._idle = OrderedDict()
+        # Descriptors open, including the discarded ones still in use
+        self._open = 0
+
+        self.opened = 0
+        self.reused = 0
+
+    def acquire(self, name, append):
+        """
+        Returns the pooled file of a file name, opening it if needed. Must be
+        released once the run is done with it
+
+        # Args
+            - :name: file name
+            - :append: if True the file is opened for appending, otherwise
+              for reading
+
+        # Returns
+            - PooledFile
+
+        # Raises
+            - :OSError: if the file can't be opened, or if max_open
+              descriptors stayed in use for wait seconds
+        """
+        path = os.path.abspath(name)
+        key = (path, append)
+        ends = None
+        with self._lock:
+            while True:
+                pooled = self._files.get(key)
+                if pooled is not None:
+                    try:
+                        identity = PooledFile.identify(os.stat(path), append)
+                    except OSError:
+                        identity = None
+                    if identity != pooled.identity:
+                        self._discard(key)
+                        pooled = None
+
+                if pooled is not None:
+                    self._idle.pop(key, None)
+                    self.reused += 1
+                    break
+                if self._open < self.max_open or self._evict():
+                    pooled = PooledFile(path, append)
+                    self._files[key] = pooled
+                    self._open += 1
+                    self.opened += 1
+                    break
+
+                # Every descriptor is in use, waits for a run to release one
+                if ends is None:
+                    ends = time.monotonic() + self.wait
+                left = ends - time.monotonic()
+                if left <= 0 or not self._released.wait(left):
+                    raise OSError(errno.EMFILE,
+                                  "%d data file descriptors in use"
+                                  % self.max_open, name)
+
+            pooled.users += 1
+        return pooled
+
+    def release(self, pooled):
+        """
+        Releases a pooled file acquired by a run
+
+        # Args
+            - :pooled: PooledFile
+        """
+        with self._lock:
+            pooled.users -= 1
+            if pooled.users == 0:
+                if pooled.stale:
+                    self._close(pooled)
+                else:
+                    self._idle[(pooled.path, pooled.append)] = None
+                    # Honors a max_open lowered since the file was opened
+                    while self._open > self.max_open and self._evict():
+                        pass
+                    self._released.notify()
+
+    def _close(self, pooled):
+        """
+        Closes the descriptor of a file no run is using. Must hold the lock
+        """
+        self._open -= 1
+        self._released.notify()
+        pooled.close()
+
+    def _discard(self, key):
+        """
+        Removes a file from the pool, closing it once no run uses it. Must
+        hold the lock
+        """
+        pooled = self._files.pop(key)
+        self._idle.pop(key, None)
+        pooled.stale = True
+        if pooled.users == 0:
+            self._close(pooled)
+
+    def _evict(self):
+        """
+        Closes the least recently used file no run is using. Must hold the
+        lock
+
+        # Returns
+            - False if every pooled file is in use
+        """
+        if not self._idle:
+            return False
+        key = next(iter(self._idle))
+        self._discard(key)
+        return True
+
+    def clear(self):
+        """
+        Closes every pooled file, the ones in use once their runs release
+        them
+        """
+        with self._lock:
+            for key in list(self._files):
+                self._discard(key)
+
+    def __len__(self):
+        return len(self._files)
+
+
+# Pool used by CAJO_OPEN
+POOL = HandlePool()
+
+
+class TextReader(object):
+    """
+    File descriptor reading the ASCII format at its own offset of a pooled
+    file, in chunks of READ_CHUNK bytes
+
+    # Constructor Args
+      - :pooled: PooledFile opened for reading
+      - :pool: HandlePool the file is released to
+      - :stats: optional RunStats (see lib.metrics) the bytes read are
+        accounted to once the descriptor is closed
+    """
+
+    def __init__(self, pooled, pool, stats=None):
+        self._pooled = pooled
+        self._pool = pool
+        self._stats = stats
+        self._offset = 0
+        self._lines = []
+        self._next = 0
+        self._partial = ''
+
+    def _fill(self):
+        """
+        Reads the next chunk of lines, at the end of the file the last line
+        is an empty one
+        """
+        chunk = self._pooled.read(READ_CHUNK, self._offset)
+        self._offset += len(chunk)
+        if chunk:
+            lines = (self._partial + chunk.decode('latin-1')).split('\n')
+            self._partial = lines.pop()
+        else:
+            lines = [self._partial]
+            self._partial = ''
+        self._lines = lines
+        self._next = 0
+
+    def read_int(self):
+        """
+        Reads the next value
+
+        # Raises
+            - :ValueError: on a malformed value or at the end of the file
+        """
+        while self._next == len(self._lines):
+            self._fill()
+        line = self._lines[self._next]
+        self._next += 1
+        return bin2int(line.rstrip())
+
+    def write_int(self, value):
+        raise IOError("File is not writable")
+
+    def close(self):
+        """
+        Releases the pooled file
+        """
+        if self._pooled is not None:
+            if self._stats is not None:
+                self._stats.handles += 1
+                self._stats.bytes_read += self._offset
+            self._pool.release(self._pooled)
+            self._pooled = None
+
+
+class BinaryReader(object):
+    """
+    File descriptor reading the binary format at its own offset of the
+    memory map of a pooled file, so each value read is a slice of the page
+    cache
+
+    # Constructor Args
+      - :pooled: PooledFile opened for reading
+      - :pool: HandlePool the file is released to
+      - :stats: optional RunStats (see lib.metrics) the bytes read are
+        accounted to once the descriptor is closed
+    """
+
+    def __init__(self, pooled, pool, stats=None):
+        self._pooled = pooled
+        self._pool = pool
+        self._stats = stats
+        self._data = pooled.mapping()
+        self._offset = 0
+
+    def read_int(self):
+        """
+        Reads the next value
+
+        # Raises
+            - :ValueError: at the end of the file
+        """
+        offset = self._offset
+        if offset + INT16.size > len(self._data):
+            raise ValueError("end of file reached")
+        self._offset = offset + INT16.size
+        return INT16.unpack_from(self._data, offset)[0]
+
+    def write_int(self, value):
+        raise IOError("File is not writable")
+
+    def close(self):
+        """
+        Releases the pooled file
+        """
+        if self._pooled is not None:
+            if self._stats is not None:
+                self._stats.handles += 1
+                self._stats.bytes_read += self._offset
+            self._data = b''
+            self._pool.release(self._pooled)
+            self._pooled = None
+
+
+class TextWriter(object):
+    """
+    File descriptor appending to the ASCII format of a pooled file. Lines
+    are accumulated and appended in a single write when the descriptor is
+    closed, or every WRITE_BUFFER values
+
+    # Constructor Args
+      - :pooled: PooledFile opened for appending
+      - :pool: HandlePool the file is released to
+      - :stats: optional RunStats (see lib.metrics) the bytes written are
+        accounted to once the descriptor is closed
+    """
+
+    def __init__(self, pooled, pool, stats=None):
+        self._pooled = pooled
+        self._pool = pool
+        self._stats = stats
+        self._written = 0
+        self._buffer = []
+
+    def read_int(self):
+        raise IOError("File is not readable")
+
+    def write_int(self, value):
+        """
+        Appends a value
+        """
+        self._buffer.append(int2bin(value))
+        if len(self._buffer) >= WRITE_BUFFER:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the accumulated lines out
+        """
+        if self._buffer:
+            self._buffer.append('')
+            data = '\n'.join(self._buffer).encode('ascii')
+            self._pooled.write(data)
+            self._written += len(data)
+            self._buffer = []
+
+    def close(self):
+        """
+        Writes the accumulated lines out and releases the pooled file
+        """
+        if self._pooled is None:
+            return
+        try:
+            self.flush()
+        finally:
+            if self._stats is not None:
+                self._stats.handles += 1
+                self._stats.bytes_written += self._written
+            self._pool.release(self._pooled)
+            self._pooled = None
+
+
+class BinaryWriter(object):
+    """
+    File descriptor appending to the binary format of a pooled file. Values
+    are accumulated and appended in a single write when the descriptor is
+    closed, or every WRITE_BUFFER values
+
+    # Constructor Args
+      - :pooled: PooledFile opened for appending
+      - :pool: HandlePool the file is released to
+      - :stats: optional RunStats (see lib.metrics) the bytes written are
+        accounted to once the descriptor is closed
+    """
+
+    def __init__(self, pooled, pool, stats=None):
+        self._pooled = pooled
+        self._pool = pool
+        self._stats = stats
+        self._written = 0
+        self._buffer = array('h')
+
+    def read_int(self):
+        raise IOError("File is not readable")
+
+    def write_int(self, value):
+        """
+        Appends a value
+
+        # Raises
+            - :ValueError: if the value doesn't fit in 16 bits
+        """
+        try:
+            self._buffer.append(value)
+        except OverflowError:
+            raise ValueError("%d does not fit in 16 bits" % value)
+        if len(self._buffer) >= WRITE_BUFFER:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the accumulated values out
+        """
+        if self._buffer:
+            if sys.byteorder != 'little':
+                self._buffer.byteswap()
+            data = self._buffer.tobytes()
+            self._pooled.write(data)
+            self._written += len(data)
+            self._buffer = array('h')
+
+    def close(self):
+        """
+        Writes the accumulated values out and releases the pooled file
+        """
+        if self._pooled is None:
+            return
+        try:
+            self.flush()
+        finally:
+            if self._stats is not None:
+                self._stats.handles += 1
+                self._stats.bytes_written += self._written
+            self._pool.release(self._pooled)
+            self._pooled = None
+
+
+# File descriptor class and whether it appends, by CAJO_OPEN file mode
+_DESCRIPTORS = {
+    'r': (TextReader, False),
+    'a': (TextWriter, True),
+    'rb': (BinaryReader, False),
+    'ab': (BinaryWriter, True)
+}
+
+
+def open_file(name, mode, pool=None, stats=None):
+    """
+    Opens the file descriptor of a CAJO_OPEN instruction
+
+    # Args
+        - :name: file name
+        - :mode: index of FILE_MODES, 0 and 1 on the ASCII format, 2 and 3
+          on the binary format
+        - :pool: HandlePool the file is opened on, defaults to POOL
+        - :stats: optional RunStats the I/O of the descriptor is accounted to
+
+    # Returns
+        - file descriptor
+    """
+    descriptor, append = _DESCRIPTORS[FILE_MODES[mode]]
+    if pool is None:
+        pool = POOL
+    pooled = pool.acquire(name, append)
+    try:
+        return descriptor(pooled, pool, stats)
+    except Exception:
+        pool.release(pooled)
+        raise
+
+
+class FormatConverter(object):
+    """
+    Converts data files between the ASCII format and the binary format
+    """
+
+    @staticmethod
+    def text_to_binary(source, destination):
+        """
+        Converts an ASCII data file into a binary one
+
+        # Args
+            - :source: path of the ASCII file
+            - :destination: path of the binary file, overwritten
+
+        # Returns
+            - number of values converted
+
+        # Raises
+            - :ValueError: on malformed values
+        """
+        with open(source, 'r') as lines:
+            values = array('h', Converter.bins_to_ints(lines.read()))
+
+        if sys.byteorder != 'little':
+            values.byteswap()
+        with open(destination, 'wb') as output:
+            output.write(values.tobytes())
+        return len(values)
+
+    @staticmethod
+    def binary_to_text(source, destination):
+        """
+        Converts a binary data file into an ASCII one
+
+        # Args
+            - :source: path of the binary file
+            - :destination: path of the ASCII file, overwritten
+
+        # Returns
+            - number of values converted
+
+        # Raises
+            - :ValueError: if the binary file has an odd size
+        """
+        values = array('h')
+        with open(source, 'rb') as data:
+            content = data.read()
+        if len(content) % INT16.size:
+            raise ValueError("%s is not a binary data file" % source)
+        values.frombytes(content)
+        if sys.byteorder != 'little':
+            values.byteswap()
+
+        with open(destination, 'w') as output:
+            output.writelines(line + '\n' for line in
+                              Converter.ints_to_bins(values))
+        return len(values)
@@ -0,0 +1,389 @@
+"""
+CAJOlang JIT module file
+Translates compiled CAJOlang programs into native Python functions
+"""
+import threading
+from collections import OrderedDict
+
+from lib.fileio import open_file
+from lib.budget import CHECK_INTERVAL
+
+# Translated functions kept, the least recently used are dropped beyond it
+# so the functions of programs no longer run (eg. removed from the
+# manifest) don't pile up on long running schedulers
+FUNCTION_CACHE_SIZE = 4096
+
+# Translated functions cached by source file, metering and profiling, along
+# with the program code they were translated from, least recently used
+# first
+_function_cache = OrderedDict()
+_function_cache_lock = threading.Lock()
+
+# Condition under which each conditional jump is taken
+_JUMP_CONDITIONS = {
+    "CAJO_JUMP_IF_NEGATIVE_TO": "t < 0",
+    "CAJO_JUMP_IF_POSITIVE_TO": "t > 0",
+    "CAJO_JUMP_IF_ZERO_TO": "t == 0",
+}
+
+# Closed form loop superinstructions (see lib.optimizer), as the arithmetic
+# operator, the loop condition and whether the counter is in memory
+_LOOPS = {
+    "SUPER_SUBTRACT_WHILE_POSITIVE": ("-", "t > 0", False),
+    "SUPER_ADD_WHILE_NEGATIVE": ("+", "t < 0", False),
+    "SUPER_SUBTRACT_FROM_MEMORY_WHILE_POSITIVE": ("-", "t > 0", True),
+    "SUPER_ADD_TO_MEMORY_WHILE_NEGATIVE": ("+", "t < 0", True)
+}
+
+
+class Translator(object):
+    """
+    The CAJOlang to Python translator
+
+    Translates a verified Program into the source of a single Python function
+    where temp_area and the integer memory cells are local variables and the
+    program basic blocks are laid out as a state machine over the instruction
+    pointer, and compiles it with compile(). Blocks are dispatched through a
+    binary search over their first instruction, so entering a block takes a
+    number of tests logarithmic in the number of blocks
+
+    The generated function takes the MemSpace of the run
+    (and the function CAJO_PRINT prints with), loads it into locals on
+    entry and stores it back on exit, so it leaves the memory space in the
+    same state as the reference interpreter does
+
+    Metered functions also take a Budget: each basic block adds its length
+    to an instruction counter, which is charged to the budget on the
+    backward jumps once it reaches CHECK_INTERVAL. Every endless run goes
+    through a backward jump, so this is enough to abort it
+
+    Profiled functions also take a list where each basic block counts the
+    times it was entered, from which instruction_counts() derives how many
+    times each instruction was executed
+    """
+
+    @staticmethod
+    def _leaders(code):
+        """
+        Finds the instruction numbers where each basic block of the program
+        begins: the first instruction, jump targets, closed form loops and
+        the instructions following a jump or loop
+
+        # Args
+            - :code: Program code
+
+        # Returns
+            - sorted list of instruction numbers
+        """
+        leaders = set([0])
+        for index, entry in enumerate(code):
+            if entry is None:
+                leaders.add(index)
+            elif entry[0] == "CAJO_JUMP" or entry[0] in _JUMP_CONDITIONS:
+                leaders.add(entry[1][0])
+                leaders.add(index + 1)
+            elif entry[0] in _LOOPS:
+                leaders.add(index)
+                leaders.add(index + 1)
+        return sorted(leader for leader in leaders if leader < len(code))
+
+    @staticmethod
+    def _statement(instruction, args):
+        """
+        Translates a non branching instruction into Python statements
+
+        # Args
+            - :instruction: CAJOlang instruction
+            - :args: instruction args
+
+        # Returns
+            - list of Python source lines
+        """
+        if instruction == "CAJO_COPY_TO_MEMORY":
+            return ["m%d = t" % args[0]]
+        elif instruction == "CAJO_COPY_FROM_MEMORY":
+            return ["t = m%d" % args[0]]
+        elif instruction == "CAJO_SET_MEMORY":
+            return ["m%d = %d" % (args[1], args[0])]
+        elif instruction == "CAJO_ADD":
+            return ["t += m%d" % args[0]]
+        elif instruction == "CAJO_SUBTRACT":
+            return ["t -= m%d" % args[0]]
+        elif instruction == "SUPER_ADD_TO_MEMORY":
+            return ["t = m%d = m%d + m%d" % (args[0], args[0], args[1])]
+        elif instruction == "SUPER_SUBTRACT_FROM_MEMORY":
+            return ["t = m%d = m%d - m%d" % (args[0], args[0], args[1])]
+        elif instruction == "CAJO_PRINT":
+            return ["out(t)"]
+        elif instruction == "CAJO_OPEN":
+            return ["f = fh[%d]" % args[1],
+                    "if f is not None:",
+                    "    fh[%d] = None" % args[1],
+                    "    f.close()",
+                    "fh[%d] = open_file(%r, %d, stats=mem.stats)"
+                    % (args[1], args[0], args[2])]
+        elif instruction == "CAJO_CLOSE":
+            return ["f = fh[%d]" % args[0],
+                    "if f is None:",
+                    "    raise RuntimeError('File descriptor memory position "
+                    "%d not initialized')" % args[0],
+                    "fh[%d] = None" % args[0],
+                    "f.close()"]
+        elif instruction == "CAJO_READ":
+            return ["t = fh[%d].read_int()" % args[0]]
+        elif instruction == "CAJO_WRITE":
+            return ["fh[%d].write_int(t)" % args[0]]
+        else:
+            raise NameError("Translation of %s is not supported" % instruction)
+
+    @staticmethod
+    def _loop(index, instruction, args):
+        """
+        Translates a closed form loop superinstruction, which is executed
+        again while the loop never terminates
+
+        # Args
+            - :index: instruction number
+            - :instruction: loop superinstruction
+            - :args: instruction args
+
+        # Returns
+            - list of Python source lines
+        """
+        operator, condition, in_memory = _LOOPS[instruction]
+        if in_memory:
+            lines = ["d = m%d" % args[1],
+                     "t = m%d %s d" % (args[0], operator)]
+        else:
+            lines = ["d = m%d" % args[0],
+                     "t %s= d" % operator]
+
+        if operator == "-":
+            lines.extend(["if t > 0 and d > 0:",
+                          "    t -= (t + d - 1) // d * d"])
+        else:
+            lines.extend(["if t < 0 and d > 0:",
+                          "    t += (d - t - 1) // d * d"])
+        if in_memory:
+            lines.append("m%d = t" % args[0])
+
+        lines.extend(["if %s:" % condition,
+                      "    continue",
+                      "pc = %d" % (index + 1)])
+        return lines
+
+    @staticmethod
+    def _block(code, start, end):
+        """
+        Translates the basic block of instructions [start, end) into the
+        body of its state machine branch
+
+        # Args
+            - :code: Program code
+            - :start: first instruction of the block
+            - :end: first instruction of the next block
+
+        # Returns
+            - list of Python source lines
+        """
+        lines = []
+        for index in range(start, end):
+            entry = code[index]
+            if entry is None:
+                lines.append("break")
+                return lines
+
+            instruction, args = entry
+            if instruction == "CAJO_JUMP":
+                lines.append("pc = %d" % args[0])
+                # Backward jumps are where the budget is charged
+                if args[0] <= index:
+                    lines.append("continue")
+                return lines
+            elif instruction in _JUMP_CONDITIONS:
+                condition = _JUMP_CONDITIONS[instruction]
+                if args[0] <= index:
+                    lines.extend(["if %s:" % condition,
+                                  "    pc = %d" % args[0],
+                                  "    continue",
+                                  "pc = %d" % (index + 1)])
+                else:
+                    lines.append("pc = %d if %s else %d"
+                                 % (args[0], condition, index + 1))
+                return lines
+            elif instruction in _LOOPS:
+                lines.extend(Translator._loop(index, instruction, args))
+                return lines
+            else:
+                lines.extend(Translator._statement(instruction, args))
+
+        lines.append("pc = %d" % end)
+        return lines
+
+    @staticmethod
+    def _meter(lines, length):
+        """
+        Adds the budget accounting to the body of a basic block
+
+        # Args
+            - :lines: Python source lines of the block
+            - :length: number of instructions of the block
+
+        # Returns
+            - list of Python source lines
+        """
+        metered = ["n += %d" % length]
+        for line in lines:
+            if line.strip() == "continue":
+                indent = line[:len(line) - len(line.lstrip())]
+                # The counter is reset before it is charged, so it is not
+                # counted again when the charge aborts the run
+                metered.extend([indent + "if n >= %d:" % CHECK_INTERVAL,
+                                indent + "    c = n",
+                                indent + "    n = 0",
+                                indent + "    budget.charge(c)"])
+            metered.append(line)
+        return metered
+
+    @staticmethod
+    def _dispatch(blocks):
+        """
+        Lays the bodies of the basic blocks out as a binary search over the
+        instruction pointer
+
+        # Args
+            - :blocks: list of (first instruction, Python source lines) of
+              each block, sorted by first instruction
+
+        # Returns
+            - list of Python source lines
+        """
+        if len(blocks) == 1:
+            return blocks[0][1]
+        middle = len(blocks) // 2
+        return (["if pc < %d:" % blocks[middle][0]] +
+                ["    " + line for line in Translator._dispatch(
+                    blocks[:middle])] +
+                ["else:"] +
+                ["    " + line for line in Translator._dispatch(
+                    blocks[middle:])])
+
+    @staticmethod
+    def instruction_counts(program, blocks):
+        """
+        Derives the number of times each instruction was executed from the
+        block counts of a profiled function
+
+        # Args
+            - :program: verified Program
+            - :blocks: list of the times each basic block was entered,
+              indexed by the first instruction of the block
+
+        # Returns
+            - list of the times each instruction was executed
+        """
+        code = program.code
+        leaders = Translator._leaders(code)
+        counts = [0] * len(code)
+        for start, end in zip(leaders, leaders[1:] + [len(code)]):
+            entered = blocks[start]
+            if not entered:
+                continue
+            for index in range(start, end):
+                if code[index] is None:
+                    break
+                counts[index] = entered
+        return counts
+
+    @staticmethod
+    def translate(program, metered=False, profiled=False):
+        """
+        Translates a program into the source of a Python function named
+        cajo_program
+
+        # Args
+            - :program: verified Program
+            - :metered: if True the function charges a budget
+            - :profiled: if True the function counts the blocks entered
+
+        # Returns
+            - string of Python source code
+        """
+        code = program.code
+        leaders = Translator._leaders(code)
+
+        blocks = []
+        for start, end in zip(leaders, leaders[1:] + [len(code)]):
+            lines = Translator._block(code, start, end)
+            if metered:
+                # Halting entries are not instructions
+                length = next((index for index in range(start, end)
+                               if code[index] is None), end) - start
+                lines = Translator._meter(lines, length)
+            if profiled:
+                lines.insert(0, "blocks[%d] += 1" % start)
+            blocks.append((start, lines))
+        body = Translator._dispatch(blocks)
+
+        source = ["def cajo_program(mem, out=print, budget=None, "
+                  "blocks=None):",
+                  "    t = mem.temp_area",
+                  "    m0, m1, m2 = mem.integer_mem",
+                  "    fh = mem.file_handles",
+                  "    pc = 0"]
+        if metered:
+            source.append("    n = 0")
+        source.extend(["    try:",
+                       "        while True:"])
+        source.extend("            " + line for line in body)
+        source.extend(["    finally:",
+                       "        mem.temp_area = t",
+                       "        mem.integer_mem[:] = [m0, m1, m2]"])
+        if metered:
+            source.append("        budget.executed += n")
+        source.append("")
+        return "\n".join(source)
+
+    @staticmethod
+    def compile(program, metered=False, profiled=False):
+        """
+        Translates and compiles a program into a Python function, which is
+        cached per source file for as long as the program code is unchanged,
+        up to FUNCTION_CACHE_SIZE functions
+
+        # Args
+            - :program: verified Program
+            - :metered: if True the function charges a budget
+            - :profiled: if True the function counts the blocks entered
+
+        # Returns
+            - function that runs the program on a given MemSpace, printing
+              with a given function (eg. OutputBuffer.write), charging a
+              given Budget if metered and counting the blocks entered on a
+              given list, as long as the code, if profiled
+        """
+        key = (program.source_file, metered, profiled)
+        with _function_cache_lock:
+            cached = _function_cache.get(key)
+            if cached is not None and cached[0] == program.code:
+                _function_cache.move_to_end(key)
+                return cached[1]
+
+        if not program.verified:
+            raise ValueError("%s must be verified before it is translated"
+                             % program.source_file)
+
+        namespace = {
+            "open_file": open_file,
+        }
+        exec(compile(Translator.translate(program, metered, profiled),
+                     "<cajolang %s>" % program.source_file, "exec"),
+             namespace)
+        function = namespace["cajo_program"]
+
+        with _function_cache_lock:
+            _function_cache[key] = (program.code, function)
+            _function_cache.move_to_end(key)
+            while len(_function_cache) > FUNCTION_CACHE_SIZE:
+                _function_cache.popitem(last=False)
+        return function
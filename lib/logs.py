@@ -0,0 +1,185 @@
+"""
+Logging module file
+Moves the log I/O off the scheduler and executor threads: records are put on
+a queue and formatted and written, in batches, by a background thread to a
+log file per day
+"""
+import os
+import json
+import time
+import atexit
+import logging
+from queue import Queue
+from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMATS = ('text', 'json')
+
+# Name of the log file of each day, as a strftime pattern
+LOG_PATTERN = '%Y-%m-%d_log.txt'
+
+TEXT_FORMAT = '%(asctime)s -> %(message)s'
+CONSOLE_FORMAT = '%(asctime)s %(levelname)s:%(name)s:%(message)s'
+DATE_FORMAT = '%y/%m/%d %H:%M:%S'
+
+# Fields of the structured records (passed as extra) kept by the JSON format
+RECORD_FIELDS = ('program', 'outcome', 'duration', 'error')
+
+
+class DailyFileHandler(logging.FileHandler):
+    """
+    Appends the records to a file per day, named after the date, moving to
+    the next day's file on the first record past midnight (local time)
+
+    Records are written to the buffer of the file and only flushed by
+    flush(), which the listener calls once the records queued are written,
+    so a burst of records takes a single write
+
+    # Constructor Args
+      - :directory: log directory, created if it does not exist
+      - :pattern: strftime pattern of the file names
+    """
+
+    def __init__(self, directory, pattern=LOG_PATTERN):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._directory = directory
+        self._pattern = pattern
+        now = time.time()
+        logging.FileHandler.__init__(self, self._path(now), delay=True)
+        self._rollover_at = self._midnight(now)
+
+    def _path(self, now):
+        """
+        Returns the path of the log file of the day of a time
+        """
+        return os.path.join(self._directory,
+                            datetime.fromtimestamp(now).strftime(
+                                self._pattern))
+
+    @staticmethod
+    def _midnight(now):
+        """
+        Returns the first midnight after a time, as seconds since epoch
+        """
+        tomorrow = datetime.fromtimestamp(now).date() + timedelta(days=1)
+        return time.mktime(tomorrow.timetuple())
+
+    def emit(self, record):
+        try:
+            if record.created >= self._rollover_at:
+                if self.stream is not None:
+                    self.stream.close()
+                    self.stream = None
+                self.baseFilename = os.path.abspath(
+                    self._path(record.created))
+                self._rollover_at = self._midnight(record.created)
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats each record as a compact JSON object on a line of its own, with
+    its time, level and message, and the RECORD_FIELDS of the structured
+    records
+    """
+
+    def format(self, record):
+        entry = {'time': '%s.%03d' % (self.formatTime(record,
+                                                      '%Y-%m-%dT%H:%M:%S'),
+                                      record.msecs),
+                 'level': record.levelname,
+                 'message': record.getMessage()}
+        for field in RECORD_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(',', ':'))
+
+
+class _LazyQueueHandler(QueueHandler):
+    """
+    Queues the records as they are, so even their message is formatted on
+    the listener thread. Records never leave the process, and the arguments
+    logged are never modified afterwards
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class _BatchingQueueListener(QueueListener):
+    """
+    Queue listener flushing its handlers whenever it runs out of records
+    """
+
+    def dequeue(self, block):
+        if block and self.queue.empty():
+            self.flush()
+        return self.queue.get(block)
+
+    def flush(self):
+        """
+        Writes out the records buffered by the handlers
+        """
+        for handler in self.handlers:
+            handler.flush()
+
+    def stop(self):
+        """
+        Writes out the records still queued and stops the background thread,
+        does nothing if it was already stopped
+        """
+        if self._thread is not None:
+            QueueListener.stop(self)
+            self.flush()
+
+
+def start_logging(directory, format='text', level=logging.INFO,
+                  console=True):
+    """
+    Sends every record to the log file of the day on a directory, and to
+    stderr, through a queue: logging calls only put the record on the queue,
+    and a background thread formats and writes them. The records still
+    queued are written out when the process exits
+
+    # Args
+        - :directory: log directory
+        - :format: one of LOG_FORMATS, json writing a JSON object per record
+        - :level: lowest level logged
+        - :console: if True the records are written to stderr too
+
+    # Returns
+        - the running QueueListener
+    """
+    if format not in LOG_FORMATS:
+        raise ValueError("format must be one of %s" % ', '.join(LOG_FORMATS))
+
+    handler = DailyFileHandler(directory)
+    if format == 'json':
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT, DATE_FORMAT))
+    handlers = [handler]
+    if console:
+        stream = logging.StreamHandler()
+        stream.setFormatter(logging.Formatter(CONSOLE_FORMAT, DATE_FORMAT))
+        handlers.append(stream)
+
+    queue = Queue()
+    listener = _BatchingQueueListener(queue, *handlers)
+    root = logging.getLogger()
+    for previous in list(root.handlers):
+        root.removeHandler(previous)
+    root.addHandler(_LazyQueueHandler(queue))
+    root.setLevel(level)
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,245 @@
+"""
+Result memoization module file
+Replays the recorded output of programs whose output can't change between
+runs, instead of running them again
+"""
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+from lib.compiler import Compiler, PURE, READS_FILES
+from lib.runner import TaskResult
+
+logger = logging.getLogger('scheduler')
+
+# Default size of the recorded outputs
+MAX_BYTES = 64 * 1024 * 1024
+
+# Bookkeeping bytes accounted to each recorded result
+ENTRY_OVERHEAD = 64
+
+# Errors raised by the program itself, which runs of the same code on the
+# same inputs raise again. The others (eg. OSError) may come from the
+# environment of the run, so they are not recorded
+DETERMINISTIC_ERRORS = frozenset(['RuntimeError', 'ValueError', 'TypeError',
+                                  'NameError', 'AttributeError'])
+
+
+class ResultCache(object):
+    """
+    Size bounded cache of the results of deterministic programs
+
+    Pure programs (see Compiler.classify) print the same every run, so
+    their result is recorded on their first run, keyed by the hash of their
+    code, and replayed afterwards. Optionally programs that only read files
+    are memoized too, keyed by their code and the content hash of the files
+    they open. Results are recorded per limits of the runs, runs aborted for
+    exceeding their budget or failed on errors other than
+    DETERMINISTIC_ERRORS are not recorded, and the least recently used
+    results are dropped beyond max_bytes
+
+    Given a directory, results are also stored there, one file per result,
+    and loaded back on restarts
+
+    # Constructor Args
+      - :max_bytes: maximum size of the recorded outputs
+      - :directory: optional directory where results are persisted
+      - :inputs: if True also memoizes the programs that only read files
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES, directory=None, inputs=False):
+        self._max_bytes = max_bytes
+        self._directory = directory
+        self._inputs = inputs
+        self._lock = threading.Lock()
+
+        # Results as (output, error), least recently used first
+        self._results = OrderedDict()
+        self._size = 0
+        # Content hash of the input files, by path, along with the
+        # (size, mtime, inode) they were computed for
+        self._digests = {}
+
+        self.hits = 0
+        self.misses = 0
+
+        if directory is not None:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._load()
+
+    @staticmethod
+    def _cost(result):
+        """
+        Returns the bytes accounted to a result
+        """
+        output, error = result
+        return len(output) + len(error or '') + ENTRY_OVERHEAD
+
+    def _entry_path(self, key):
+        """
+        Returns the path of the file of a persisted result
+        """
+        return os.path.join(self._directory, key + '.json')
+
+    def _load(self):
+        """
+        Loads the persisted results, from the oldest to the newest
+        """
+        entries = []
+        for name in os.listdir(self._directory):
+            if name.endswith('.json'):
+                path = os.path.join(self._directory, name)
+                try:
+                    entries.append((os.path.getmtime(path), name[:-5], path))
+                except OSError:
+                    continue
+
+        for mtime, key, path in sorted(entries):
+            try:
+                with open(path, 'r') as entry:
+                    record = json.load(entry)
+                result = (record['output'], record['error'])
+            except (IOError, OSError, ValueError, KeyError, TypeError):
+                continue
+            self._results[key] = result
+            self._size += ResultCache._cost(result)
+        self._evict()
+
+    def _persist(self, key, result):
+        """
+        Atomically writes a result to the directory
+        """
+        descriptor, temp_path = tempfile.mkstemp(dir=self._directory)
+        try:
+            with os.fdopen(descriptor, 'w') as entry:
+                json.dump({'output': result[0], 'error': result[1]}, entry)
+            os.replace(temp_path, self._entry_path(key))
+        except (IOError, OSError):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _evict(self):
+        """
+        Drops the least recently used results beyond max_bytes
+        """
+        while self._size > self._max_bytes and self._results:
+            key, result = self._results.popitem(last=False)
+            self._size -= ResultCache._cost(result)
+            if self._directory is not None:
+                try:
+                    os.remove(self._entry_path(key))
+                except OSError:
+                    pass
+
+    def _digest(self, name):
+        """
+        Returns the content hash of an input file, None if it can't be read
+        """
+        path = os.path.abspath(name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        identity = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+        with self._lock:
+            cached = self._digests.get(path)
+        if cached is not None and cached[0] == identity:
+            return cached[1]
+
+        digest = hashlib.sha1()
+        try:
+            with open(path, 'rb') as data:
+                for chunk in iter(lambda: data.read(65536), b''):
+                    digest.update(chunk)
+        except (IOError, OSError):
+            return None
+
+        with self._lock:
+            self._digests[path] = (identity, digest.hexdigest())
+        return digest.hexdigest()
+
+    def key(self, program, limits=None):
+        """
+        Returns the key the result of a program is recorded with. Results
+        are recorded per Limits, so a result recorded under generous limits
+        is never replayed for a run they would abort
+
+        # Args
+            - :program: verified Program
+            - :limits: optional Limits of the run
+
+        # Returns
+            - string key, None if the program is not memoized
+        """
+        purity = Compiler.classify(program)
+        if purity != PURE and not (purity == READS_FILES and self._inputs):
+            return None
+
+        parts = [repr(program.code)]
+        if limits is not None:
+            parts.append(repr(tuple(limits)))
+        for entry in program.code:
+            if entry is not None and entry[0] == "CAJO_OPEN":
+                digest = self._digest(entry[1][0])
+                if digest is None:
+                    return None
+                parts.append(digest)
+
+        return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key, source_file):
+        """
+        Returns the recorded result of a program
+
+        # Args
+            - :key: key of the program
+            - :source_file: filename of the CAJOlang source
+
+        # Returns
+            - TaskResult, None if no result was recorded for the key
+        """
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._results.move_to_end(key)
+            self.hits += 1
+        return TaskResult(source_file, result[0], result[1], 0.0, False,
+                          None)
+
+    def put(self, key, result):
+        """
+        Records the result of a run
+
+        # Args
+            - :key: key of the program
+            - :result: TaskResult of the run
+        """
+        if result.aborted:
+            return
+        if (result.error is not None and
+                result.error.partition(':')[0] not in DETERMINISTIC_ERRORS):
+            return
+
+        record = (result.output, result.error)
+        with self._lock:
+            previous = self._results.pop(key, None)
+            if previous is not None:
+                self._size -= ResultCache._cost(previous)
+            self._results[key] = record
+            self._size += ResultCache._cost(record)
+            self._evict()
+            stored = key in self._results
+
+        if stored and self._directory is not None:
+            self._persist(key, record)
+
+    def __len__(self):
+        return len(self._results)
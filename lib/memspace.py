@@ -8,8 +8,39 @@ class MemSpace(object):
       - 2 position in memory for file descriptors (indexed 0 to 1), that can
         hold one file descriptor each
       - A temporary area, called temp_area​, that can hold one integer
+
+    A MemSpace is the execution context of a single run: it also holds the
+    instruction pointer and the OutputBuffer CAJO_PRINT writes to, so that
+    the same compiled program can run many times, concurrently, each run on
+    its own MemSpace. Slots keep each context down to a few hundred bytes
+
+    # Constructor Args
+      - :output: OutputBuffer CAJO_PRINT writes to
+      - :stats: RunStats (see lib.metrics) of profiled runs, None otherwise
     """
-    def __init__(self):
+    __slots__ = ('integer_mem', 'file_handles', 'temp_area',
+                 'instruction_pointer', 'output', 'stats')
+
+    def __init__(self, output=None, stats=None):
         self.integer_mem = [None, None, None]
         self.file_handles = [None, None]
         self.temp_area = None
+        self.instruction_pointer = 0
+        self.output = output
+        self.stats = stats
+
+    def close(self):
+        """
+        Closes every file descriptor left open by the run, all of them even
+        if closing one fails (the first failure is raised afterwards)
+        """
+        error = None
+        for position, handle in enumerate(self.file_handles):
+            if handle is not None:
+                self.file_handles[position] = None
+                try:
+                    handle.close()
+                except Exception as err:
+                    error = error or err
+        if error is not None:
+            raise error
@@ -0,0 +1,304 @@
+"""
+Metrics module file
+Aggregates the measurements of profiled CAJOlang runs into counters and
+histograms, exported on the Prometheus text format to a file or over HTTP
+"""
+import os
+import tempfile
+import threading
+from bisect import bisect_left
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+# Upper bounds of the histogram buckets
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60)
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+INSTRUCTION_BUCKETS = (10, 100, 1000, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7,
+                       10 ** 8)
+BYTE_BUCKETS = (0, 1024, 16384, 262144, 4194304, 67108864)
+
+# Per program counters, as name, help and RunStats field (None for the
+# run duration)
+_PROGRAM_COUNTERS = (
+    ('cajo_program_run_seconds_total', 'Run time of each program', None),
+    ('cajo_program_instructions_total',
+     'Instructions executed by each program', 'executed'),
+    ('cajo_program_read_bytes_total', 'Data file bytes read by each program',
+     'bytes_read'),
+    ('cajo_program_written_bytes_total',
+     'Data file bytes written by each program', 'bytes_written'),
+    ('cajo_program_handles_total',
+     'Data file descriptors opened by each program', 'handles')
+)
+
+
+class RunStats(object):
+    """
+    Measurements of a single profiled run, filled in by the interpreter and
+    the data file descriptors of the run
+
+    # Fields
+      - :started: time (as seconds since epoch) the run started
+      - :instructions: dict of the instructions executed, by opcode
+      - :handles: number of data file descriptors opened
+      - :bytes_read: bytes read from data files
+      - :bytes_written: bytes written to data files
+    """
+    __slots__ = ('started', 'instructions', 'handles', 'bytes_read',
+                 'bytes_written')
+
+    def __init__(self):
+        self.started = None
+        self.instructions = {}
+        self.handles = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    @property
+    def executed(self):
+        """
+        Total number of instructions executed
+        """
+        return sum(self.instructions.values())
+
+    def count(self, code, counts):
+        """
+        Adds the instructions executed by a run to the opcode counts
+
+        # Args
+            - :code: Program code
+            - :counts: list of the number of times each instruction of the
+              code was executed
+        """
+        instructions = self.instructions
+        for entry, executed in zip(code, counts):
+            if executed:
+                instructions[entry[0]] = (instructions.get(entry[0], 0) +
+                                          executed)
+
+
+class Histogram(object):
+    """
+    Cumulative histogram with fixed bucket bounds
+
+    # Constructor Args
+      - :bounds: sorted upper bounds of the buckets
+    """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        """
+        Records a value
+        """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, help):
+        """
+        Returns the lines of the histogram on the Prometheus text format
+        """
+        lines = ["# HELP %s %s" % (name, help),
+                 "# TYPE %s histogram" % name]
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append('%s_bucket{le="%s"} %d' % (name, bound, cumulative))
+        lines.extend(['%s_bucket{le="+Inf"} %d' % (name, self.count),
+                      "%s_sum %s" % (name, self.sum),
+                      "%s_count %d" % (name, self.count)])
+        return lines
+
+
+def _label(value):
+    """
+    Escapes a label value of the Prometheus text format
+    """
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _counter(name, help, label, values):
+    """
+    Returns the lines of a labeled counter on the Prometheus text format
+    """
+    lines = ["# HELP %s %s" % (name, help),
+             "# TYPE %s counter" % name]
+    for key in sorted(values):
+        lines.append('%s{%s="%s"} %s' % (name, label, _label(key),
+                                         values[key]))
+    return lines
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """
+    Serves the metrics of the server at /metrics
+    """
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type',
+                         'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _MetricsServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class Metrics(object):
+    """
+    Aggregated measurements of the runs of the scheduler
+
+    Every run is counted by outcome, and the runs that were profiled (see
+    RunStats) also add their instructions by opcode, their I/O and their
+    start lag, the time between when they were scheduled to start and when
+    they started, to per program counters and histograms. Replayed results
+    and runs lost with their worker carry no measurements
+
+    The metrics are rendered on the Prometheus text format, and may be
+    written to a file after every bucket and served over HTTP
+
+    # Constructor Args
+      - :path: optional file the metrics are written to by write()
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._lock = threading.Lock()
+        self._server = None
+
+        self._runs = {}
+        self._opcodes = {}
+        self._programs = dict((name, {}) for name, help, field
+                              in _PROGRAM_COUNTERS)
+        self._program_runs = {}
+        self._duration = Histogram(DURATION_BUCKETS)
+        self._lag = Histogram(LAG_BUCKETS)
+        self._instructions = Histogram(INSTRUCTION_BUCKETS)
+        self._io = Histogram(BYTE_BUCKETS)
+
+    def record(self, result, scheduled=None):
+        """
+        Records a finished run
+
+        # Args
+            - :result: TaskResult of the run
+            - :scheduled: optional time (as seconds since epoch) the run was
+              scheduled to start at
+        """
+        if result.aborted:
+            outcome = 'aborted'
+        elif result.error is not None:
+            outcome = 'failed'
+        else:
+            outcome = 'succeeded'
+        stats = result.stats
+        program = result.source_file
+
+        with self._lock:
+            self._runs[outcome] = self._runs.get(outcome, 0) + 1
+            self._program_runs[program] = (
+                self._program_runs.get(program, 0) + 1)
+            if stats is None:
+                return
+
+            for opcode, executed in stats.instructions.items():
+                self._opcodes[opcode] = self._opcodes.get(opcode, 0) + executed
+            for name, help, field in _PROGRAM_COUNTERS:
+                value = (result.duration if field is None
+                         else getattr(stats, field))
+                counter = self._programs[name]
+                counter[program] = counter.get(program, 0) + value
+
+            self._duration.observe(result.duration)
+            self._instructions.observe(stats.executed)
+            self._io.observe(stats.bytes_read + stats.bytes_written)
+            if scheduled is not None and stats.started is not None:
+                self._lag.observe(max(stats.started - scheduled, 0.0))
+
+    def render(self):
+        """
+        Returns the metrics on the Prometheus text format
+        """
+        with self._lock:
+            lines = _counter('cajo_runs_total', 'Runs by outcome', 'outcome',
+                             self._runs)
+            lines += _counter('cajo_instructions_total',
+                              'Instructions executed by opcode', 'opcode',
+                              self._opcodes)
+            lines += self._duration.render('cajo_run_duration_seconds',
+                                           'Run time of the profiled runs')
+            lines += self._lag.render(
+                'cajo_start_lag_seconds',
+                'Delay between the scheduled and the actual run start')
+            lines += self._instructions.render(
+                'cajo_run_instructions', 'Instructions executed per run')
+            lines += self._io.render('cajo_run_io_bytes',
+                                     'Data file bytes read and written per '
+                                     'run')
+            lines += _counter('cajo_program_runs_total',
+                              'Runs of each program', 'program',
+                              self._program_runs)
+            for name, help, field in _PROGRAM_COUNTERS:
+                lines += _counter(name, help, 'program', self._programs[name])
+        return '\n'.join(lines) + '\n'
+
+    def write(self):
+        """
+        Atomically replaces the metrics file with the current metrics, if
+        the metrics have a file
+        """
+        if self._path is None:
+            return
+        directory = os.path.dirname(os.path.abspath(self._path))
+        descriptor, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(descriptor, 'w') as output:
+                output.write(self.render())
+            os.replace(temp_path, self._path)
+        except (IOError, OSError):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def serve(self, port, host='127.0.0.1'):
+        """
+        Serves the metrics over HTTP at /metrics, on a background thread
+
+        # Args
+            - :port: port to listen on, 0 for any free port
+            - :host: address to listen on, defaults to the loopback
+
+        # Returns
+            - port the server listens on
+        """
+        self._server = _MetricsServer((host, port), _MetricsHandler)
+        self._server.metrics = self
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self._server.server_address[1]
+
+    def shutdown(self):
+        """
+        Stops the HTTP server
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
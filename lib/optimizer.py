@@ -0,0 +1,273 @@
+"""
+CAJOlang optimizer module file
+Peephole optimizations and superinstructions for compiled CAJOlang programs
+"""
+
+JUMPS = frozenset([
+    "CAJO_JUMP_IF_NEGATIVE_TO",
+    "CAJO_JUMP_IF_POSITIVE_TO",
+    "CAJO_JUMP_IF_ZERO_TO",
+    "CAJO_JUMP"
+])
+
+# Superinstructions replacing the idiom
+#   CAJO_COPY_FROM_MEMORY P; CAJO_ADD/CAJO_SUBTRACT Q; CAJO_COPY_TO_MEMORY P
+_FUSED = {
+    "CAJO_ADD": "SUPER_ADD_TO_MEMORY",
+    "CAJO_SUBTRACT": "SUPER_SUBTRACT_FROM_MEMORY"
+}
+
+# Superinstructions replacing counted loops made of an arithmetic
+# instruction followed by a conditional jump back to it, computed in closed
+# form by the interpreter
+_LOOPS = {
+    ("CAJO_SUBTRACT", "CAJO_JUMP_IF_POSITIVE_TO"):
+        "SUPER_SUBTRACT_WHILE_POSITIVE",
+    ("CAJO_ADD", "CAJO_JUMP_IF_NEGATIVE_TO"):
+        "SUPER_ADD_WHILE_NEGATIVE",
+    ("SUPER_SUBTRACT_FROM_MEMORY", "CAJO_JUMP_IF_POSITIVE_TO"):
+        "SUPER_SUBTRACT_FROM_MEMORY_WHILE_POSITIVE",
+    ("SUPER_ADD_TO_MEMORY", "CAJO_JUMP_IF_NEGATIVE_TO"):
+        "SUPER_ADD_TO_MEMORY_WHILE_NEGATIVE"
+}
+
+# Integer memory positions read by each instruction, as indexes of its args
+_READS = {
+    "CAJO_COPY_FROM_MEMORY": (0,),
+    "CAJO_ADD": (0,),
+    "CAJO_SUBTRACT": (0,),
+    "SUPER_ADD_TO_MEMORY": (0, 1),
+    "SUPER_SUBTRACT_FROM_MEMORY": (0, 1),
+    "SUPER_SUBTRACT_WHILE_POSITIVE": (0,),
+    "SUPER_ADD_WHILE_NEGATIVE": (0,),
+    "SUPER_SUBTRACT_FROM_MEMORY_WHILE_POSITIVE": (0, 1),
+    "SUPER_ADD_TO_MEMORY_WHILE_NEGATIVE": (0, 1)
+}
+
+# Instructions that only store to the integer memory position of the given
+# arg index, and may be dropped when the value is overwritten before read
+_STORES = {
+    "CAJO_COPY_TO_MEMORY": 0,
+    "CAJO_SET_MEMORY": 1
+}
+
+
+class OptimizationReport(object):
+    """
+    Summary of the changes made by the Optimizer to a program
+
+    # Constructor Args
+      - :source_file: filename of the CAJOlang source
+      - :instructions_before: instruction count of the original program
+    """
+
+    def __init__(self, source_file, instructions_before):
+        self.source_file = source_file
+        self.instructions_before = instructions_before
+        self.instructions_after = instructions_before
+        self.threaded_jumps = 0
+        self.superinstructions = 0
+        self.closed_form_loops = 0
+        self.dead_stores = 0
+
+    @property
+    def changed(self):
+        """
+        True if the optimizer changed the program
+        """
+        return bool(self.threaded_jumps or self.superinstructions or
+                    self.closed_form_loops or self.dead_stores)
+
+    def __str__(self):
+        return ("%s: %d -> %d instructions (%d jumps threaded, "
+                "%d superinstructions, %d closed form loops, "
+                "%d dead stores removed)"
+                % (self.source_file, self.instructions_before,
+                   self.instructions_after, self.threaded_jumps,
+                   self.superinstructions, self.closed_form_loops,
+                   self.dead_stores))
+
+
+class Optimizer(object):
+    """
+    The CAJOlang optimizer
+
+    provides static methods for peephole optimization of verified programs:
+    jump threading, fusion of common idioms into superinstructions, closed
+    form counted loops and dead store elimination. Instructions removed by a
+    pass have every jump target remapped, so jumps stay correct
+    """
+
+    @staticmethod
+    def _jump_targets(code):
+        """
+        Returns the set of instruction numbers targeted by jumps
+        """
+        return set(entry[1][0] for entry in code
+                   if entry is not None and entry[0] in JUMPS)
+
+    @staticmethod
+    def _compact(code, keep):
+        """
+        Removes the instructions not flagged on keep and remaps the jump
+        targets, so that a jump to a removed instruction lands on the next
+        kept one
+
+        # Args
+            - :code: list of program code entries
+            - :keep: list of booleans, one per code entry
+
+        # Returns
+            - list of program code entries
+        """
+        mapping = []
+        position = 0
+        for flag in keep:
+            mapping.append(position)
+            if flag:
+                position += 1
+
+        compacted = []
+        for entry, flag in zip(code, keep):
+            if not flag:
+                continue
+            if entry is not None and entry[0] in JUMPS:
+                entry = (entry[0], (mapping[entry[1][0]],))
+            compacted.append(entry)
+        return compacted
+
+    @staticmethod
+    def _thread_jumps(code, report):
+        """
+        Retargets jumps whose target is an unconditional jump to the final
+        target of the jump chain
+        """
+        for index, entry in enumerate(code):
+            if entry is None or entry[0] not in JUMPS:
+                continue
+
+            target = entry[1][0]
+            visited = set([index])
+            while (code[target] is not None and
+                   code[target][0] == "CAJO_JUMP" and
+                   target not in visited):
+                visited.add(target)
+                target = code[target][1][0]
+
+            if target != entry[1][0]:
+                code[index] = (entry[0], (target,))
+                report.threaded_jumps += 1
+        return code
+
+    @staticmethod
+    def _fuse(code, report):
+        """
+        Fuses CAJO_COPY_FROM_MEMORY P; CAJO_ADD/CAJO_SUBTRACT Q;
+        CAJO_COPY_TO_MEMORY P into a single superinstruction
+        """
+        targets = Optimizer._jump_targets(code)
+        keep = [True] * len(code)
+
+        index = 0
+        while index + 2 < len(code):
+            first, second, third = code[index:index + 3]
+            if (first is not None and second is not None and
+                    third is not None and
+                    first[0] == "CAJO_COPY_FROM_MEMORY" and
+                    second[0] in _FUSED and
+                    third[0] == "CAJO_COPY_TO_MEMORY" and
+                    first[1] == third[1] and
+                    index + 1 not in targets and index + 2 not in targets):
+                code[index] = (_FUSED[second[0]], first[1] + second[1])
+                keep[index + 1] = keep[index + 2] = False
+                report.superinstructions += 1
+                index += 3
+            else:
+                index += 1
+
+        return Optimizer._compact(code, keep)
+
+    @staticmethod
+    def _close_loops(code, report):
+        """
+        Replaces counted loops made of a single arithmetic instruction and a
+        conditional jump back to it by a closed form superinstruction
+        """
+        targets = Optimizer._jump_targets(code)
+        keep = [True] * len(code)
+
+        for index in range(len(code) - 1):
+            body, jump = code[index], code[index + 1]
+            if (body is None or jump is None or not keep[index] or
+                    (body[0], jump[0]) not in _LOOPS or
+                    jump[1][0] != index or index + 1 in targets):
+                continue
+
+            # A counter that is also the decrement changes on every
+            # iteration, so it can't be computed in closed form
+            if len(body[1]) == 2 and body[1][0] == body[1][1]:
+                continue
+
+            code[index] = (_LOOPS[(body[0], jump[0])], body[1])
+            keep[index + 1] = False
+            report.closed_form_loops += 1
+
+        return Optimizer._compact(code, keep)
+
+    @staticmethod
+    def _eliminate_dead_stores(code, report):
+        """
+        Removes stores to the integer memory that are overwritten later in
+        the same basic block without being read in between
+        """
+        targets = Optimizer._jump_targets(code)
+        keep = [True] * len(code)
+
+        # Pending stores of the current basic block, by memory position
+        pending = {}
+        for index, entry in enumerate(code):
+            if index in targets:
+                pending = {}
+
+            if entry is None or entry[0] in JUMPS:
+                pending = {}
+                continue
+
+            instruction, args = entry
+            for arg in _READS.get(instruction, ()):
+                pending.pop(args[arg], None)
+
+            if instruction in _STORES:
+                position = args[_STORES[instruction]]
+                if position in pending:
+                    keep[pending[position]] = False
+                    report.dead_stores += 1
+                pending[position] = index
+
+        return Optimizer._compact(code, keep)
+
+    @staticmethod
+    def optimize(program):
+        """
+        Optimizes a verified program
+
+        # Args
+            - :program: verified Program
+
+        # Returns
+            - tuple of the optimized Program and its OptimizationReport
+        """
+        if not program.verified:
+            raise ValueError("%s must be verified before it is optimized"
+                             % program.source_file)
+
+        code = list(program.code)
+        report = OptimizationReport(program.source_file, len(code) - 1)
+
+        code = Optimizer._thread_jumps(code, report)
+        code = Optimizer._fuse(code, report)
+        code = Optimizer._close_loops(code, report)
+        code = Optimizer._eliminate_dead_stores(code, report)
+
+        report.instructions_after = len(code) - 1
+        return (program._replace(code=tuple(code)), report)
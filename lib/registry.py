@@ -0,0 +1,166 @@
+"""
+Program registry module file
+Keeps the programs scheduled for execution, indexed by path and by minute
+"""
+import os
+import logging
+import threading
+
+logger = logging.getLogger('scheduler')
+
+
+class ProgramRegistry(object):
+    """
+    Programs scheduled for execution
+
+    Holds the filelist (interpreter session of each program, by absolute
+    path) and the execution_schedule (list of the programs to be executed
+    each minute, indexed by minutes) used by the scheduler, and updates them
+    as programs are added, reloaded or removed while the scheduler runs
+
+    Programs are prepared (and compiled and verified) before the
+    registry is touched, and the buckets of the execution_schedule are
+    replaced instead of modified, so a bucket that is being executed is never
+    changed under its runs and a program that fails to compile keeps its
+    previous version scheduled
+
+    # Constructor Args
+      - :factory: function creating the interpreter session of a path
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+
+        self.filelist = {}
+        self.execution_schedule = [[] for i in range(60)]
+
+        # Minute of each program, by name
+        self._minutes = {}
+
+        # Called with a minute whenever it gets its first program
+        self.on_schedule = None
+
+    @staticmethod
+    def name(path):
+        """
+        Returns the name a program is registered with, its absolute path, so
+        that files with the same name on different directories are
+        different programs
+        """
+        return os.path.abspath(path)
+
+    def paths(self):
+        """
+        Returns the set of absolute paths of the registered programs
+        """
+        with self._lock:
+            return set(self.filelist)
+
+    def _unschedule(self, name):
+        """
+        Removes a program from its bucket, must hold the lock
+        """
+        minute = self._minutes.pop(name, None)
+        if minute is not None:
+            self.execution_schedule[minute] = [
+                item for item in self.execution_schedule[minute]
+                if item != name]
+
+    def prepare(self, path, lazy=False):
+        """
+        Creates the interpreter session of a program, compiles and verifies
+        it and reads its execution minute, without touching the registry, so
+        programs may be prepared concurrently. Broken files are rejected
+        before they are scheduled
+
+        # Args
+            - :path: path of the CAJOlang source
+            - :lazy: if True the program is only compiled and verified, its
+              optimization and translation are left to its first run
+
+        # Returns
+            - tuple of the interpreter session and execution minute
+
+        # Raises
+            - :NameError: on instructions outside the CAJOlang instruction
+              set
+            - :TypeError: on operands of the wrong type or count
+            - :ValueError: on operands out of range, or if the execution
+              minute is not a minute of the hour
+        """
+        interpreter = self._factory(path)
+        if lazy:
+            minute = interpreter.verify().minute
+        else:
+            minute = interpreter.get_execution_minute()
+        return (interpreter, minute)
+
+    def add(self, path, prepared=None):
+        """
+        Schedules a program, replacing the program previously registered
+        with the same path
+
+        # Args
+            - :path: path of the CAJOlang source
+            - :prepared: (interpreter, minute) returned by prepare(), by
+              default the program is prepared (and compiled) here
+
+        # Returns
+            - tuple of the program name and execution minute
+        """
+        name = ProgramRegistry.name(path)
+        if prepared is None:
+            prepared = self.prepare(path)
+        interpreter, minute = prepared
+
+        with self._lock:
+            self.filelist[name] = interpreter
+
+            first = not self.execution_schedule[minute]
+            if self._minutes.get(name) != minute:
+                self._unschedule(name)
+                self.execution_schedule[minute] = (
+                    self.execution_schedule[minute] + [name])
+                self._minutes[name] = minute
+
+        if first and self.on_schedule is not None:
+            self.on_schedule(minute)
+        return (name, minute)
+
+    def remove(self, path):
+        """
+        Stops scheduling a program
+
+        # Args
+            - :path: path of the CAJOlang source
+        """
+        name = ProgramRegistry.name(path)
+        with self._lock:
+            if name not in self.filelist:
+                return
+            self._unschedule(name)
+            del self.filelist[name]
+        logger.info("removed file %s from scheduler", name)
+
+    def reload(self, path):
+        """
+        Reloads a program whose source changed, removing it if the source
+        was deleted. If the new source fails to compile the previous version
+        stays scheduled
+
+        # Args
+            - :path: path of the CAJOlang source
+        """
+        if not os.path.isfile(path):
+            self.remove(path)
+            return
+
+        try:
+            name, minute = self.add(path)
+        except (IOError, OSError, NameError, TypeError, ValueError) as err:
+            logger.error("reloading %s failed, keeping the previous version: "
+                         "%s", path, err)
+        else:
+            logger.info("reloaded file %s to be executed every minute %d",
+                        name, minute)
@@ -0,0 +1,229 @@
+"""
+CAJOlang runner module file
+Runs the programs of a schedule bucket concurrently on a worker pool
+"""
+import io
+import os
+import time
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from lib.cajolang import Interpreter
+from lib.budget import Budget, BudgetExceeded
+from lib.metrics import RunStats
+from lib.trace import TraceBuffer, save_trace
+
+# Outcome of a single program run
+#   - :source_file: filename of the CAJOlang source
+#   - :output: everything the program printed to stdout
+#   - :error: description of the exception raised by the run, None if the
+#     run succeeded
+#   - :duration: run wall time in seconds
+#   - :aborted: True if the run was aborted for exceeding its budget
+#   - :stats: RunStats of the run if it was profiled, None otherwise
+TaskResult = namedtuple('TaskResult',
+                        ['source_file', 'output', 'error', 'duration',
+                         'aborted', 'stats'])
+
+POOL_KINDS = ('process', 'thread')
+
+
+def run_program(program, jit=False, limits=None, deadline=None,
+                profile=False, tracing=None):
+    """
+    Runs a compiled program on a fresh interpreter session capturing its
+    stdout. Is the entry point of worker processes and threads, so it never
+    raises: failures are reported on the result
+
+    # Args
+        - :program: verified Program
+        - :jit: if True runs the program translated to a Python function
+        - :limits: optional Limits of the run
+        - :deadline: optional time (as seconds since epoch) the run must end
+          by
+        - :profile: if True the run is profiled (see lib.metrics)
+        - :tracing: optional TraceOptions, traced runs that fail have their
+          trace written out (see lib.trace)
+
+    # Returns
+        - TaskResult
+    """
+    output = io.StringIO()
+    stats = RunStats() if profile else None
+    trace = TraceBuffer.from_options(tracing, program)
+    started = time.time()
+    aborted = False
+    try:
+        Interpreter.from_program(program, jit=jit, stdout=output).run(
+            Budget.from_limits(limits, deadline), stats, trace)
+        error = None
+    except BudgetExceeded as err:
+        error = "%s: %s" % (type(err).__name__, err)
+        aborted = True
+    except Exception as err:
+        error = "%s: %s" % (type(err).__name__, err)
+
+    if trace is not None and error is not None:
+        error += save_trace(trace, tracing)
+
+    return TaskResult(program.source_file, output.getvalue(), error,
+                      time.time() - started, aborted, stats)
+
+
+def memoized(memo, programs, limits=None):
+    """
+    Looks the recorded results of programs up
+
+    # Args
+        - :memo: ResultCache, None if results are not memoized
+        - :programs: list of verified Programs
+        - :limits: optional Limits of the runs
+
+    # Returns
+        - tuple of the list of the memoization key of each program (None if
+          not memoized) and the dict of the recorded TaskResults by index
+    """
+    keys = [None] * len(programs)
+    replayed = {}
+    if memo is None:
+        return (keys, replayed)
+
+    for index, program in enumerate(programs):
+        keys[index] = memo.key(program, limits)
+        if keys[index] is not None:
+            result = memo.get(keys[index], program.source_file)
+            if result is not None:
+                replayed[index] = result
+    return (keys, replayed)
+
+
+class TaskRunner(object):
+    """
+    Worker pool executing the programs of a schedule bucket concurrently
+
+    Programs are compiled once by the scheduler and shipped to the workers,
+    results are returned in submission order regardless of the order in which
+    runs complete, and a failing run does not affect the rest of the bucket
+
+    Runs that exceed their limits are aborted, so an endless program only
+    holds its worker until its budget runs out, and counted on aborted_runs.
+    Given a ResultCache, programs whose result was recorded are not run
+    again, their recorded result is returned instead
+
+    # Constructor Args
+      - :workers: number of workers, defaults to the CPU count
+      - :kind: either 'process' or 'thread'
+      - :jit: if True runs programs translated to Python functions
+      - :limits: optional Limits of each run
+      - :memo: optional ResultCache of the deterministic programs
+      - :profile: if True the runs are profiled, their RunStats returned on
+        their results
+      - :tracing: optional TraceOptions of the runs
+    """
+
+    def __init__(self, workers=None, kind='process', jit=False, limits=None,
+                 memo=None, profile=False, tracing=None):
+        if kind not in POOL_KINDS:
+            raise ValueError("kind must be one of %s" % ', '.join(POOL_KINDS))
+
+        self._workers = workers or os.cpu_count() or 1
+        self._kind = kind
+        self._jit = jit
+        self._limits = limits
+        self._memo = memo
+        self._profile = profile
+        self._tracing = tracing
+        self._executor = None
+        self._lock = threading.Lock()
+
+        self.aborted_runs = 0
+
+    def _get_executor(self):
+        """
+        Returns the worker pool, starting it on first use
+        """
+        if self._executor is None:
+            if self._kind == 'process':
+                self._executor = ProcessPoolExecutor(self._workers)
+            else:
+                self._executor = ThreadPoolExecutor(self._workers)
+        return self._executor
+
+    def _discard(self, executor):
+        """
+        Replaces a broken worker pool, so that the following buckets still
+        run, stopping its remaining workers without waiting on them
+        """
+        if self._executor is executor:
+            self._executor = None
+            executor.shutdown(wait=False)
+
+    def run(self, programs, costs=None, deadline=None):
+        """
+        Runs programs concurrently on the worker pool
+
+        # Args
+            - :programs: list of verified Programs
+            - :costs: optional list of the estimated cost of each program,
+              programs are then submitted from the most to the least
+              expensive so that the long runs don't end up last on a worker
+            - :deadline: optional time (as seconds since epoch) every run
+              must end by
+
+        # Returns
+            - generator of TaskResults, in the same order as programs
+        """
+        executor = self._get_executor()
+        keys, replayed = memoized(self._memo, programs, self._limits)
+
+        order = range(len(programs))
+        if costs is not None:
+            order = sorted(order, key=lambda i: costs[i], reverse=True)
+
+        submitted = {}
+        broken = None
+        for index in order:
+            if index in replayed:
+                continue
+            try:
+                submitted[index] = executor.submit(
+                    run_program, programs[index], self._jit, self._limits,
+                    deadline, self._profile, self._tracing)
+            except Exception as err:
+                # The pool broke while idle (eg. a worker process killed),
+                # the runs not submitted fail with its error
+                self._discard(executor)
+                broken = err
+                break
+
+        for index, program in enumerate(programs):
+            if index in replayed:
+                yield replayed[index]
+                continue
+
+            try:
+                if index not in submitted:
+                    raise broken
+                result = submitted[index].result()
+                if keys[index] is not None:
+                    self._memo.put(keys[index], result)
+            except Exception as err:
+                # The worker itself died (eg. a broken process pool)
+                self._discard(executor)
+                result = TaskResult(program.source_file, '',
+                                    "%s: %s" % (type(err).__name__, err),
+                                    0.0, False, None)
+
+            if result.aborted:
+                with self._lock:
+                    self.aborted_runs += 1
+            yield result
+
+    def shutdown(self):
+        """
+        Stops the worker pool
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -0,0 +1,180 @@
+"""
+Scheduler module file
+Implements an hourly scheduler based on a priority queue of deadlines
+"""
+import time
+import heapq
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger('scheduler')
+
+
+class Scheduler(object):
+    """
+    Hourly scheduler of the execution minutes
+
+    Keeps a heap of the absolute deadlines of the minutes that have programs
+    scheduled and sleeps exactly until the next one is due, so nothing wakes
+    up the process when no program is due. Each minute fires at a fixed
+    second (offset) regardless of when the scheduler was started, and a
+    deadline that is found late by more than the tolerance (eg. after the
+    process was stalled or suspended) is reported as missed and skipped to
+    its next hour
+
+    # Constructor Args
+      - :callback: function called with the minute and the time (as
+        seconds since epoch) of each due deadline
+      - :offset: second of the minute on which programs are started
+      - :tolerance: seconds a deadline may be late before it is missed
+      - :clock: function returning the current time as seconds since epoch
+    """
+
+    def __init__(self, callback, offset=0, tolerance=30, clock=time.time):
+        if not 0 <= offset < 60:
+            raise ValueError("offset must be in the [0, 60) range")
+
+        self._callback = callback
+        self._offset = offset
+        self._tolerance = tolerance
+        self._clock = clock
+
+        # Heap of (deadline, minute) and the set of minutes in it
+        self._heap = []
+        self._minutes = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+
+        self.missed_runs = 0
+
+    def next_deadline(self, minute, now):
+        """
+        Returns the first deadline of a minute not earlier than now
+
+        # Args
+            - :minute: minute of the hour
+            - :now: time as seconds since epoch
+
+        # Returns
+            - deadline as seconds since epoch
+        """
+        start = datetime.fromtimestamp(now).replace(
+            minute=minute, second=self._offset, microsecond=0)
+        deadline = time.mktime(start.timetuple())
+        if deadline < now:
+            deadline = time.mktime((start + timedelta(hours=1)).timetuple())
+        return deadline
+
+    def add(self, minute):
+        """
+        Schedules a minute to be fired every hour, minutes already scheduled
+        are ignored
+
+        # Args
+            - :minute: minute of the hour
+        """
+        if not 0 <= minute < 60:
+            raise ValueError("minute must be in the [0, 60) range")
+
+        with self._lock:
+            if minute in self._minutes:
+                return
+            self._minutes.add(minute)
+            heapq.heappush(self._heap,
+                           (self.next_deadline(minute, self._clock()), minute))
+        # Wakes the run loop up in case the new deadline is the earliest
+        self._wakeup.set()
+
+    def remove(self, minute):
+        """
+        Stops firing a minute
+
+        # Args
+            - :minute: minute of the hour
+        """
+        with self._lock:
+            if minute not in self._minutes:
+                return
+            self._minutes.discard(minute)
+            self._heap = [item for item in self._heap if item[1] != minute]
+            heapq.heapify(self._heap)
+
+    def pop_due(self):
+        """
+        Pops the deadlines that are due, rescheduling each one to the next
+        hour, and reports the ones missed
+
+        # Returns
+            - tuple of the list of (deadline, minute) due and the number of
+              seconds until the next deadline (None if nothing is scheduled)
+        """
+        due = []
+        with self._lock:
+            now = self._clock()
+            while self._heap and self._heap[0][0] <= now:
+                deadline, minute = heapq.heappop(self._heap)
+
+                # Latest hourly occurrence of the deadline that is due
+                skipped = int((now - deadline) // 3600)
+                deadline += 3600 * skipped
+                if now - deadline > self._tolerance:
+                    skipped += 1
+                else:
+                    due.append((deadline, minute))
+
+                if skipped:
+                    self.missed_runs += skipped
+                    logger.warning(
+                        "missed %d run(s) of minute %d as of %s", skipped,
+                        minute, datetime.fromtimestamp(now))
+
+                next_deadline = deadline + 3600
+                heapq.heappush(self._heap, (next_deadline, minute))
+
+            timeout = self._heap[0][0] - now if self._heap else None
+        return (due, timeout)
+
+    def run(self):
+        """
+        Runs the scheduling loop until stop() is called
+        """
+        while not self._stopped:
+            due, timeout = self.pop_due()
+            for deadline, minute in due:
+                self._callback(minute, deadline)
+
+            if due:
+                continue
+
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    async def run_async(self):
+        """
+        Coroutine running the scheduling loop on the asyncio event loop until
+        stop() is called. The callback is called on the event loop, so it may
+        schedule tasks on it
+        """
+        loop = asyncio.get_event_loop()
+        while not self._stopped:
+            due, timeout = self.pop_due()
+            for deadline, minute in due:
+                self._callback(minute, deadline)
+
+            if due:
+                continue
+
+            # add() and stop() may be called from other threads (eg. by the
+            # file watcher), so the wait for them is done on the executor
+            await loop.run_in_executor(None, self._wakeup.wait, timeout)
+            self._wakeup.clear()
+
+    def stop(self):
+        """
+        Stops the scheduling loop
+        """
+        self._stopped = True
+        self._wakeup.set()
@@ -0,0 +1,197 @@
+"""
+Output sinks module file
+Collects what CAJOlang runs print and delivers it in as few writes as
+possible, to stdout, to a file per program, to a shared log or to a callback
+"""
+import os
+import sys
+import threading
+from datetime import datetime
+from urllib.parse import quote
+
+# Values a run prints before its output is delivered to the sink
+FLUSH_THRESHOLD = 4096
+
+SINK_KINDS = ('stdout', 'files', 'log')
+
+
+class StreamSink(object):
+    """
+    Writes the output of the runs to a stream, a whole chunk at a time so
+    the output of concurrent runs is never interleaved within a chunk
+
+    # Constructor Args
+      - :stream: file object, defaults to the sys.stdout of the time of
+        each write
+    """
+
+    def __init__(self, stream=None):
+        self._stream = stream
+        self._lock = threading.Lock()
+
+    def write(self, source_file, text):
+        """
+        Delivers output of a run
+
+        # Args
+            - :source_file: filename of the CAJOlang source
+            - :text: output text
+        """
+        stream = self._stream if self._stream is not None else sys.stdout
+        with self._lock:
+            stream.write(text)
+            stream.flush()
+
+
+class FileSink(object):
+    """
+    Appends the output of each program to its own file on a directory, named
+    after the path of the program relative to the working directory, with
+    its separators percent encoded (eg. progs%2Fa.cl.out for progs/a.cl), so
+    programs with the same file name on different directories get their own
+    file, and the same one across restarts
+
+    # Constructor Args
+      - :directory: output directory, created if it does not exist
+    """
+
+    def __init__(self, directory):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._directory = directory
+        self._base = os.getcwd()
+        # Output file names by source file
+        self._names = {}
+
+    def path(self, source_file):
+        """
+        Returns the path of the output file of a program
+        """
+        name = self._names.get(source_file)
+        if name is None:
+            relative = os.path.relpath(os.path.abspath(source_file),
+                                       self._base)
+            name = quote(relative, safe='') + '.out'
+            self._names[source_file] = name
+        return os.path.join(self._directory, name)
+
+    def write(self, source_file, text):
+        """
+        Delivers output of a run
+
+        # Args
+            - :source_file: filename of the CAJOlang source
+            - :text: output text
+        """
+        with open(self.path(source_file), 'a') as output:
+            output.write(text)
+
+
+class LogSink(object):
+    """
+    Appends the output of every program to a shared log, each chunk framed
+    by a header with the program and the time it was delivered
+
+    # Constructor Args
+      - :path: log file path
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+
+    def write(self, source_file, text):
+        """
+        Delivers output of a run
+
+        # Args
+            - :source_file: filename of the CAJOlang source
+            - :text: output text
+        """
+        header = "--- %s %s ---\n" % (
+            datetime.now().strftime('%y/%m/%d %H:%M:%S'), source_file)
+        with self._lock:
+            with open(self._path, 'a') as log:
+                log.write(header + text)
+
+
+class CallbackSink(object):
+    """
+    Hands the output of the runs to a function
+
+    # Constructor Args
+      - :callback: function called with the source file and output text
+    """
+
+    def __init__(self, callback):
+        self._callback = callback
+
+    def write(self, source_file, text):
+        """
+        Delivers output of a run
+
+        # Args
+            - :source_file: filename of the CAJOlang source
+            - :text: output text
+        """
+        self._callback(source_file, text)
+
+
+class OutputBuffer(object):
+    """
+    Output of a single run: CAJO_PRINT appends the values to a list, which
+    is formatted and delivered to the sink in one piece when the run ends,
+    or every threshold values
+
+    # Constructor Args
+      - :sink: sink the output is delivered to
+      - :source_file: filename of the CAJOlang source
+      - :threshold: values held before they are delivered
+    """
+    __slots__ = ('_sink', '_source_file', '_threshold', '_values')
+
+    def __init__(self, sink, source_file, threshold=FLUSH_THRESHOLD):
+        self._sink = sink
+        self._source_file = source_file
+        self._threshold = threshold
+        self._values = []
+
+    def write(self, value):
+        """
+        Prints a value
+        """
+        values = self._values
+        values.append(value)
+        if len(values) >= self._threshold:
+            self.flush()
+
+    def flush(self):
+        """
+        Delivers the values printed so far
+        """
+        if self._values:
+            text = '\n'.join(map(str, self._values)) + '\n'
+            self._values = []
+            self._sink.write(self._source_file, text)
+
+
+def create_sink(kind, path=None):
+    """
+    Creates a sink from its command line name
+
+    # Args
+        - :kind: one of SINK_KINDS
+        - :path: output directory of 'files', log file path of 'log'
+
+    # Returns
+        - sink
+    """
+    if kind == 'stdout':
+        return StreamSink()
+    if path is None:
+        raise ValueError("the %s output needs a path" % kind)
+    if kind == 'files':
+        return FileSink(path)
+    elif kind == 'log':
+        return LogSink(path)
+    raise ValueError("output must be one of %s" % ', '.join(SINK_KINDS))
@@ -0,0 +1,275 @@
+"""
+Execution trace module file
+Records the last instructions executed by a run on a fixed size ring buffer,
+which is written to disk when the run fails so it can be inspected afterwards
+"""
+import os
+import json
+import struct
+import tempfile
+from collections import namedtuple
+
+MAGIC = b'CJOT'
+VERSION = 1
+
+# magic, version, instructions recorded, records kept, metadata size
+HEADER = struct.Struct('<4sHQII')
+# instruction number, opcode, temp_area, integer memory
+RECORD = struct.Struct('<IBqqqq')
+
+# Values recorded in place of uninitialized cells and of values out of the
+# int64 range
+NONE = -2 ** 63
+OVERFLOW = -2 ** 63 + 1
+
+# Records kept by default, about 600KB per traced run
+CAPACITY = 16384
+
+# Programs traced, as a set of absolute paths (None to trace every program),
+# directory the traces of failed runs are written to and records kept
+TraceOptions = namedtuple('TraceOptions', ['programs', 'directory',
+                                           'capacity'])
+
+# Instruction executed by a traced run, with the state it found
+#   - :step: number of instructions executed before it
+#   - :index: instruction number
+#   - :opcode: instruction name
+#   - :temp_area: temp_area value, None if uninitialized
+#   - :integer_mem: tuple of the integer memory cells
+TraceRecord = namedtuple('TraceRecord', ['step', 'index', 'opcode',
+                                         'temp_area', 'integer_mem'])
+
+# Decoded trace file
+#   - :source_file: filename of the CAJOlang source
+#   - :code: listing of the program, one string per instruction
+#   - :recorded: number of instructions the run executed
+#   - :records: list of the TraceRecords kept, oldest first
+Trace = namedtuple('Trace', ['source_file', 'code', 'recorded', 'records'])
+
+
+def _encode(value):
+    """
+    Returns the int64 a value is recorded as
+    """
+    if value is None:
+        return NONE
+    if not -2 ** 63 + 2 <= value < 2 ** 63:
+        return OVERFLOW
+    return value
+
+
+def _decode(value):
+    """
+    Returns the value an int64 was recorded for
+    """
+    if value == NONE:
+        return None
+    if value == OVERFLOW:
+        return 'overflow'
+    return value
+
+
+class TraceBuffer(object):
+    """
+    Ring buffer of the last capacity instructions executed by a run
+
+    The buffer is allocated once, and each instruction is packed in place
+    over the oldest record, so tracing allocates nothing per instruction.
+    Each record holds the instruction number and opcode along with the
+    temp_area and the integer memory the instruction found, so the last
+    record of a failed run is the instruction that failed
+
+    # Constructor Args
+      - :program: verified Program the run executes
+      - :capacity: number of records kept
+    """
+
+    def __init__(self, program, capacity=CAPACITY):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self._program = program
+        self._capacity = capacity
+        self._buffer = bytearray(capacity * RECORD.size)
+        self._opcodes = []
+        self.recorded = 0
+
+    @classmethod
+    def from_options(cls, options, program):
+        """
+        Creates the trace buffer of a run
+
+        # Args
+            - :options: TraceOptions, None if nothing is traced
+            - :program: verified Program the run executes
+
+        # Returns
+            - TraceBuffer, None if the program is not traced
+        """
+        if options is None:
+            return None
+        if (options.programs is not None and
+                os.path.abspath(program.source_file) not in options.programs):
+            return None
+        return cls(program, options.capacity)
+
+    def opcode(self, instruction):
+        """
+        Returns the number an instruction name is recorded as
+        """
+        if instruction not in self._opcodes:
+            self._opcodes.append(instruction)
+        return self._opcodes.index(instruction)
+
+    def record(self, index, opcode, mem):
+        """
+        Records an instruction about to be executed
+
+        # Args
+            - :index: instruction number
+            - :opcode: number of the instruction name
+            - :mem: MemSpace of the run
+        """
+        recorded = self.recorded
+        offset = recorded % self._capacity * RECORD.size
+        temp_area = mem.temp_area
+        m0, m1, m2 = mem.integer_mem
+        try:
+            RECORD.pack_into(self._buffer, offset, index, opcode,
+                             NONE if temp_area is None else temp_area,
+                             NONE if m0 is None else m0,
+                             NONE if m1 is None else m1,
+                             NONE if m2 is None else m2)
+        except struct.error:
+            # Values out of the int64 range
+            RECORD.pack_into(self._buffer, offset, index, opcode,
+                             _encode(temp_area), _encode(m0), _encode(m1),
+                             _encode(m2))
+        self.recorded = recorded + 1
+
+    def encode(self):
+        """
+        Encodes the trace, the records kept from the oldest to the newest
+
+        # Returns
+            - bytes
+        """
+        code = []
+        for entry in self._program.code:
+            if entry is None:
+                code.append('')
+            else:
+                code.append(' '.join([entry[0]] + [str(arg)
+                                                   for arg in entry[1]]))
+        metadata = json.dumps({'source_file': self._program.source_file,
+                               'opcodes': self._opcodes,
+                               'code': code}).encode('utf-8')
+
+        count = min(self.recorded, self._capacity)
+        split = self.recorded % self._capacity * RECORD.size
+        if self.recorded >= self._capacity:
+            # Full buffer, whose oldest record is the one at the split
+            records = self._buffer[split:] + self._buffer[:split]
+        else:
+            records = self._buffer[:split]
+        return b''.join([HEADER.pack(MAGIC, VERSION, self.recorded, count,
+                                     len(metadata)),
+                         metadata, bytes(records)])
+
+    def save(self, directory):
+        """
+        Writes the trace to a new file on a directory, named after the
+        program
+
+        # Args
+            - :directory: trace directory, created if it does not exist
+
+        # Returns
+            - path of the trace file
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        descriptor, path = tempfile.mkstemp(
+            prefix=os.path.basename(self._program.source_file) + '.',
+            suffix='.trace', dir=directory)
+        with os.fdopen(descriptor, 'wb') as output:
+            output.write(self.encode())
+        return path
+
+
+def save_trace(trace, options):
+    """
+    Writes the trace of a failed run out
+
+    # Args
+        - :trace: TraceBuffer of the run
+        - :options: TraceOptions of the run
+
+    # Returns
+        - note on where the trace was written, appended to the run error
+    """
+    try:
+        return " (trace written to %s)" % trace.save(options.directory)
+    except (IOError, OSError) as err:
+        return " (trace could not be written: %s)" % err
+
+
+def load_trace(path):
+    """
+    Reads a trace file
+
+    # Args
+        - :path: trace file path
+
+    # Returns
+        - Trace
+
+    # Raises
+        - :ValueError: if the file is not a valid trace
+    """
+    with open(path, 'rb') as source:
+        data = source.read()
+
+    try:
+        magic, version, recorded, count, size = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a version %d trace" % VERSION)
+        offset = HEADER.size
+        metadata = json.loads(data[offset:offset + size].decode('utf-8'))
+        offset += size
+
+        opcodes = metadata['opcodes']
+        records = []
+        for step, values in enumerate(RECORD.iter_unpack(
+                data[offset:offset + count * RECORD.size]),
+                recorded - count):
+            records.append(TraceRecord(
+                step, values[0], opcodes[values[1]], _decode(values[2]),
+                tuple(_decode(value) for value in values[3:])))
+    except (struct.error, IndexError, KeyError, UnicodeDecodeError) as err:
+        raise ValueError("corrupted trace: %s" % err)
+
+    if len(records) != count:
+        raise ValueError("truncated trace")
+    return Trace(metadata['source_file'], metadata['code'], recorded,
+                 records)
+
+
+def hot_spots(trace):
+    """
+    Counts the times each instruction was executed over the records of a
+    trace
+
+    # Args
+        - :trace: Trace
+
+    # Returns
+        - list of (count, instruction number, opcode), the most executed
+          first
+    """
+    counts = {}
+    for record in trace.records:
+        key = (record.index, record.opcode)
+        counts[key] = counts.get(key, 0) + 1
+    return sorted(((count, index, opcode)
+                   for (index, opcode), count in counts.items()),
+                  key=lambda spot: (-spot[0], spot[1]))
@@ -1,6 +1,19 @@
 """
 Utilities for type conversion
 """
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Binary representation of every int16, indexed by value: non negative
+# values are at their own index and negative ones at their negative index,
+# which also makes the values up to 65535 map to their unsigned bits
+_BINS = (tuple(format(x, '016b') for x in range(32768)) +
+         tuple('1' + format(32768 + x, '015b') for x in range(-32768, 0)))
+
+# Value of every binary representation
+_INTS = dict((_BINS[x], x) for x in range(-32768, 32768))
 
 
 class Converter(object):
@@ -8,7 +21,8 @@ class Converter(object):
     Utilities for type conversion
 
     provides static methods for conversion between python ints and C-like
-    binary representaions
+    binary representaions. Conversions are looked up on tables of the whole
+    int16 range, and the bulk conversions use NumPy when it is installed
     """
 
     @staticmethod
@@ -24,7 +38,9 @@ class Converter(object):
         # Returns
             - a string containig the 16bit representation of the integer
         """
-        if x >= 0:
+        if -32768 <= x <= 65535:
+            return _BINS[x]
+        elif x >= 0:
             return format(x, '016b')
         else:
             return '1' + format(32768 + x, '015b')
@@ -41,15 +57,84 @@ class Converter(object):
         # Returns
             - the python int corresponding to the binary input
         """
+        value = _INTS.get(x)
+        if value is not None:
+            return value
+
         if len(x) != 16:
             raise ValueError("binary value must be 16 bits long")
         else:
-            for bit in x:
-                if bit not in ['0', '1']:
-                    raise ValueError("binary string must contain only ones and\
+            raise ValueError("binary string must contain only ones and\
                      zeroes")
 
-        if x[0] == '1':
-            return -32768 + int(x[1:], 2)
-        else:
-            return int(x, 2)
+    @staticmethod
+    def ints_to_bins(values):
+        """
+        Converts a sequence of python ints to their 16bit representations
+
+        # Args
+            - :values: iterable of python ints (or a NumPy integer array)
+
+        # Returns
+            - list of the 16bit representation strings
+        """
+        if numpy is not None and isinstance(values, numpy.ndarray):
+            values = values.tolist()
+        int2bin = Converter.int2bin
+        return [int2bin(x) for x in values]
+
+    @staticmethod
+    def bins_to_ints(bins):
+        """
+        Converts 16bit representations to python ints at once. Is the inverse
+        of ints_to_bins
+
+        # Args
+            - :bins: list of 16bit representation strings, or a string with
+              one representation per line
+
+        # Returns
+            - list of python ints
+
+        # Raises
+            - :ValueError: on malformed representations
+        """
+        if isinstance(bins, str):
+            bins = bins.split()
+        if numpy is not None and len(bins) > 64:
+            values = Converter._bins_to_ints_numpy(bins)
+            if values is not None:
+                return values
+
+        try:
+            return [_INTS[x] for x in bins]
+        except KeyError:
+            # Converts them again for the error of the malformed one
+            bin2int = Converter.bin2int
+            return [bin2int(x) for x in bins]
+
+    @staticmethod
+    def _bins_to_ints_numpy(bins):
+        """
+        Vectorized bins_to_ints, parsing the representations as the rows of a
+        byte matrix
+
+        # Returns
+            - list of python ints, None if any representation is malformed
+        """
+        try:
+            data = ('\n'.join(bins) + '\n').encode('ascii')
+        except UnicodeEncodeError:
+            return None
+        if len(data) != 17 * len(bins):
+            return None
+
+        rows = numpy.frombuffer(data, dtype=numpy.uint8).reshape(-1, 17)
+        bits = rows[:, :16] - ord('0')
+        if (rows[:, 16] != ord('\n')).any() or (bits > 1).any():
+            return None
+
+        weights = 1 << numpy.arange(15, -1, -1, dtype=numpy.int64)
+        values = bits.astype(numpy.int64).dot(weights)
+        values[values >= 32768] -= 65536
+        return values.tolist()
@@ -88,3 +88,27 @@ class Validator(object):
                              mem_size[mem_type])
         else:
             return True
+
+    @staticmethod
+    def file_mode_checking(mode):
+        """
+        Helper method, type and value checking for the mode argument of the
+        CAJO_OPEN instruction
+
+        # Args
+            - :mode: 0=READ ONLY, 1=WRITE ONLY, 2=BINARY READ ONLY,
+              3=BINARY WRITE ONLY
+
+        # Returns
+            - True if arg passes checks
+
+        # Raises
+            - :TypeError: if mode is not int
+            - :ValueError: if mode outside of [0, 3] interval
+        """
+        if not isinstance(mode, int):
+            raise TypeError("mode must be an integer")
+        elif mode < 0 or mode > 3:
+            raise ValueError("mode must be in the range of values of 0 to 3")
+        else:
+            return True
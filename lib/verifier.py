@@ -0,0 +1,103 @@
+"""
+CAJOlang verifier module file
+Statically checks compiled CAJOlang programs before they are executed
+"""
+from lib.validation import Validator
+
+# Operand kinds expected by each instruction of the CAJOlang instruction set
+OPERANDS = {
+    "CAJO_COPY_TO_MEMORY": ('int',),
+    "CAJO_COPY_FROM_MEMORY": ('int',),
+    "CAJO_SET_MEMORY": ('int16', 'int'),
+    "CAJO_ADD": ('int',),
+    "CAJO_SUBTRACT": ('int',),
+    "CAJO_PRINT": (),
+    "CAJO_JUMP_IF_NEGATIVE_TO": ('instruction',),
+    "CAJO_JUMP_IF_POSITIVE_TO": ('instruction',),
+    "CAJO_JUMP_IF_ZERO_TO": ('instruction',),
+    "CAJO_JUMP": ('instruction',),
+    "CAJO_OPEN": ('filename', 'file', 'mode'),
+    "CAJO_CLOSE": ('file',),
+    "CAJO_READ": ('file',),
+    "CAJO_WRITE": ('file',),
+    # Superinstructions introduced by the Optimizer
+    "SUPER_ADD_TO_MEMORY": ('int', 'int'),
+    "SUPER_SUBTRACT_FROM_MEMORY": ('int', 'int'),
+    "SUPER_SUBTRACT_WHILE_POSITIVE": ('int',),
+    "SUPER_ADD_WHILE_NEGATIVE": ('int',),
+    "SUPER_SUBTRACT_FROM_MEMORY_WHILE_POSITIVE": ('int', 'int'),
+    "SUPER_ADD_TO_MEMORY_WHILE_NEGATIVE": ('int', 'int')
+}
+
+
+class Verifier(object):
+    """
+    The CAJOlang verifier
+
+    Since memory positions, jump targets, literals and file modes are all
+    constants of the source code, they are checked once for the whole program
+    at load time, which lets the interpreter execute a verified program
+    without any runtime operand checks
+    """
+
+    @staticmethod
+    def _check_operand(kind, arg, line_count):
+        """
+        Checks a single instruction operand against its expected kind
+
+        # Args
+            - :kind: operand kind, as listed on OPERANDS
+            - :arg: operand value
+            - :line_count: index of the last valid jump target
+        """
+        if kind == 'int' or kind == 'file':
+            Validator.mem_position_checking(arg, kind)
+        elif kind == 'int16':
+            Validator.int16_type_checking(arg)
+        elif kind == 'instruction':
+            Validator.instruction_pointer_checking(arg, line_count)
+        elif kind == 'mode':
+            Validator.file_mode_checking(arg)
+        elif not isinstance(arg, str):
+            raise TypeError("filename must be a string")
+
+    @staticmethod
+    def verify(program):
+        """
+        Checks the operands of every instruction of a program
+
+        # Args
+            - :program: compiled Program
+
+        # Returns
+            - the Program marked as verified
+
+        # Raises
+            - :TypeError: on operands of the wrong type or count
+            - :ValueError: on operands out of range
+        """
+        if program.verified:
+            return program
+
+        # The last valid jump target is the EOF entry
+        line_count = len(program.code) - 1
+
+        for index, entry in enumerate(program.code):
+            if entry is None:
+                continue
+
+            instruction, args = entry
+            kinds = OPERANDS[instruction]
+            try:
+                if len(args) != len(kinds):
+                    raise TypeError("%s takes %d arguments (%d given)"
+                                    % (instruction, len(kinds), len(args)))
+
+                for kind, arg in zip(kinds, args):
+                    Verifier._check_operand(kind, arg, line_count)
+            except (TypeError, ValueError) as err:
+                # Source line numbers are offset by the execution minute line
+                raise type(err)("%s, line %d: %s"
+                                % (program.source_file, index + 2, err))
+
+        return program._replace(verified=True)
@@ -0,0 +1,219 @@
+"""
+File watcher module file
+Notifies changes to a set of files, through inotify where available and
+through mtime polling otherwise
+"""
+import os
+import select
+import struct
+import logging
+import threading
+import ctypes
+import ctypes.util
+
+logger = logging.getLogger('scheduler')
+
+# inotify event masks, see inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+              IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+# wd, mask, cookie, name length
+EVENT = struct.Struct('iIII')
+
+
+def _load_inotify():
+    """
+    Returns the C library if it provides inotify, None otherwise
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class FileWatcher(object):
+    """
+    Watches a set of files and calls back with the path of each one that is
+    modified, created or removed
+
+    Uses inotify on the parent directory of the watched files where
+    available, so that editors replacing files by renames are noticed, and
+    falls back to polling the size and mtime of each file every interval
+
+    # Constructor Args
+      - :callback: function called with the path of each changed file
+      - :interval: seconds between polls (and inotify reads timeout)
+      - :use_inotify: if False always polls
+    """
+
+    def __init__(self, callback, interval=2.0, use_inotify=True):
+        self._callback = callback
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        # Watched paths with their last seen (size, mtime), None if missing
+        self._paths = {}
+
+        self._libc = _load_inotify() if use_inotify else None
+        self._inotify = None
+        # Watch descriptors by directory and directories by descriptor
+        self._watches = {}
+        self._directories = {}
+
+        if self._libc is not None:
+            descriptor = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if descriptor < 0:
+                self._libc = None
+            else:
+                self._inotify = descriptor
+
+    @property
+    def backend(self):
+        """
+        Either 'inotify' or 'polling'
+        """
+        return 'inotify' if self._inotify is not None else 'polling'
+
+    @staticmethod
+    def _stat(path):
+        """
+        Returns the (size, mtime) of a file, None if it does not exist
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def watch(self, path):
+        """
+        Starts watching a file
+
+        # Args
+            - :path: file path
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            self._paths[path] = FileWatcher._stat(path)
+            directory = os.path.dirname(path)
+
+            if self._inotify is not None and directory not in self._watches:
+                descriptor = self._libc.inotify_add_watch(
+                    self._inotify, directory.encode('utf-8'), WATCH_MASK)
+                if descriptor < 0:
+                    logger.warning("inotify watch on %s failed, errno %d",
+                                   directory, ctypes.get_errno())
+                else:
+                    self._watches[directory] = descriptor
+                    self._directories[descriptor] = directory
+
+    def unwatch(self, path):
+        """
+        Stops watching a file
+
+        # Args
+            - :path: file path
+        """
+        with self._lock:
+            self._paths.pop(os.path.abspath(path), None)
+
+    def _changed(self, paths):
+        """
+        Compares the paths against their last seen (size, mtime)
+
+        # Returns
+            - list of the paths that changed
+        """
+        changed = []
+        with self._lock:
+            for path in paths:
+                if path not in self._paths:
+                    continue
+                stat = FileWatcher._stat(path)
+                if stat != self._paths[path]:
+                    self._paths[path] = stat
+                    changed.append(path)
+        return changed
+
+    def _read_events(self):
+        """
+        Waits up to an interval for inotify events
+
+        # Returns
+            - set of the paths of the events
+        """
+        readable = select.select([self._inotify], [], [], self._interval)[0]
+        if not readable:
+            return set()
+
+        try:
+            data = os.read(self._inotify, 65536)
+        except BlockingIOError:
+            return set()
+
+        paths = set()
+        offset = 0
+        while offset + EVENT.size <= len(data):
+            descriptor, mask, cookie, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            directory = self._directories.get(descriptor)
+            if directory is not None and name:
+                paths.add(os.path.join(directory, name.decode('utf-8')))
+        return paths
+
+    def _run(self):
+        """
+        Watch loop, runs until stop() is called
+        """
+        while not self._stopped.is_set():
+            if self._inotify is not None:
+                paths = self._read_events()
+            else:
+                self._stopped.wait(self._interval)
+                with self._lock:
+                    paths = list(self._paths)
+
+            for path in self._changed(paths):
+                try:
+                    self._callback(path)
+                except Exception:
+                    logger.exception("handling the change of %s failed",
+                                     path)
+
+    def start(self):
+        """
+        Starts the watch loop on a background thread
+        """
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the watch loop
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._inotify is not None:
+            os.close(self._inotify)
+            self._inotify = None
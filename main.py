@@ -17,122 +17,729 @@ Usage:
     /path/to/file2.cl
     ...
     EOF(ctrl + d)
+
+Options:
+    --jit           runs the programs translated to native Python functions
+    --optimize      runs the programs rewritten by the peephole optimizer
+    --workers N     number of workers running each minute's programs
+                    concurrently, defaults to the CPU count
+    --pool KIND     worker pool kind, either process (default) or thread
+    --offset S      second of the minute on which programs are started
+    --tolerance S   seconds a run may start late before it is reported as
+                    missed and skipped to the next hour
+    --spread MODE   none (default), stagger to spread each minute's programs
+                    over its first seconds balancing their estimated cost,
+                    or binpack to start the most expensive ones first
+    --window S      seconds of the minute programs are staggered over
+    --asyncio       runs the programs as cooperative tasks of an asyncio
+                    event loop instead of on a worker pool, --workers
+                    being the number of threads file operations run on
+    --slice N       instructions an asyncio run executes before yielding
+                    to the others
+    --concurrency N maximum number of asyncio runs in progress at once
+    --max-instructions N
+                    aborts the runs that execute more than N instructions
+    --timeout S     aborts the runs that take longer than S seconds
+    --bucket-timeout S
+                    aborts the runs still going S seconds after the start
+                    of their minute
+    --max-open-files N
+                    data file descriptors open at once, per process, the
+                    ones no run is using kept open for reuse between runs.
+                    Beyond it CAJO_OPEN waits for a run to release one
+    --memoize       replays the recorded output of pure programs (the ones
+                    using no file instructions) instead of running them
+    --memoize-inputs
+                    also replays programs that only read files, as long as
+                    the files they open are unchanged
+    --memo-size N   bytes of recorded output kept, least recently used
+                    first
+    --memo-dir DIR  directory where recorded outputs are kept across
+                    restarts
+    --output KIND   where the output of each program goes: stdout
+                    (default), files to write it to a file per program on
+                    the --output-path directory, or log to append it to the
+                    --output-path file framed by program and time
+    --output-path PATH
+                    output directory or log file of --output
+    --metrics-file FILE
+                    profiles the runs and writes their metrics (instructions
+                    by opcode, run time, start lag and I/O of each program)
+                    to FILE on the Prometheus text format after every minute
+    --metrics-port N
+                    profiles the runs and serves their metrics on
+                    http://127.0.0.1:N/metrics
+    --trace FILE    traces the runs of the program FILE (may be given several
+                    times): the last instructions each run executed are
+                    written to --trace-dir when the run fails or is
+                    aborted, to be displayed with tracedump.py
+    --trace-dir DIR directory traces are written to, defaults to traces
+    --trace-size N  instructions kept on the trace of each run
+    --cache-dir DIR directory where compiled programs are cached, so that
+                    restarts only compile the source files that changed
+    --manifest FILE reads the source file paths from FILE instead of stdin
+    --watch         reloads programs whose source file changed, and the
+                    manifest file when programs are added to or removed
+                    from it, without restarting the scheduler
+    --listen [HOST:]PORT
+                    coordinates worker nodes on HOST:PORT (the loopback by
+                    default) instead of running the programs: each minute's
+                    programs are split among the workers connected by their
+                    measured cost, and the runs of a worker that is lost are
+                    started again on the others
+    --connect HOST:PORT
+                    runs as a worker node of the coordinator at HOST:PORT,
+                    executing the programs it sends with the --workers,
+                    --pool, --jit, budget, memoization and trace options
+    --worker-name NAME
+                    name the worker node joins the coordinator with
+    --log-dir DIR   directory of the log files, one per day, defaults to
+                    logs
+    --log-format KIND
+                    text (default) or json, to log a JSON object per line,
+                    with the program, outcome, run time and error of the
+                    records of each run
 """
 import os
 import sys
 import time
+import asyncio
+import argparse
 import threading
 import logging
 from datetime import datetime
-import schedule
+from concurrent.futures import ThreadPoolExecutor
 from lib.cajolang import Interpreter
+from lib.compiler import Compiler
+from lib.runner import TaskRunner, POOL_KINDS
+from lib.aioruntime import AsyncRuntime, SLICE
+from lib.scheduler import Scheduler
+from lib.cost import CostEstimator, SPREAD_MODES, stagger
+from lib.cache import ProgramCache
+from lib.registry import ProgramRegistry
+from lib.budget import Limits
+from lib.memo import ResultCache, MAX_BYTES
+from lib.sinks import StreamSink, SINK_KINDS, create_sink
+from lib.metrics import Metrics
+from lib.trace import TraceOptions, CAPACITY
+from lib.cluster import Coordinator, Worker
+from lib.logs import start_logging, LOG_FORMATS
+from lib import fileio
+from lib.watcher import FileWatcher
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('scheduler')
 
-# disable logging from schedule module
-logging.getLogger('schedule').setLevel(logging.WARNING)
-
 timestamp = datetime.now
 
+# Sink the output of the finished programs is delivered to
+output_sink = StreamSink()
+
+# Metrics the finished runs are recorded on, None unless runs are profiled
+metrics = None
+
+# Threads manifest entries are checked and prepared on
+LOAD_WORKERS = 16
 
-def get_tasks(filelist, execution_schedule):
+
+def get_tasks(minute, filelist, execution_schedule, runner, estimator,
+              spread='none', window=0, bucket_timeout=None, scheduled=None):
     """
-    Gets the files to be executed on the current minute from the
+    Gets the files to be executed on the given minute from the
     execution_schedule arg and feeds it to the function
     execute_scheduled_tasks which runs the interpreter instance associated
     with each .cl file designated to that minute
 
     execute_scheduled_tasks is ran on a background thread so as to not block
     the main process in case one of the interpreters session takes long to
-    complete
+    complete, or as a task of the event loop when runner is an
+    AsyncRuntime. When spread is 'stagger' the programs are split into batches
+    started at different seconds of the minute, balancing the estimated cost
+    started at each second
 
-    This is the function that the scheduler schedules the execution every
-    minute
+    This is the function that the scheduler calls when a minute with
+    programs scheduled is due
 
     # args:
-        - :filelist: dict with filenames as keys and fields are the associated
-          interpreter session
+        - :minute: minute of the hour that is due
+        - :filelist: dict with program paths as keys and fields are the
+          associated interpreter session
         - :execution_schedule: list of the lists of functions to be executed
           each minute, indexed by minutes
+        - :runner: TaskRunner or AsyncRuntime the programs are executed on
+        - :estimator: CostEstimator of the programs run time
+        - :spread: one of SPREAD_MODES
+        - :window: seconds of the minute programs are staggered over
+        - :bucket_timeout: optional seconds every program of the minute must
+          end within, counted from when the minute was due
+        - :scheduled: time (as seconds since epoch) the minute was due,
+          defaults to now
     """
-    minute = timestamp().minute
     tasklist = execution_schedule[minute]
+    if scheduled is None:
+        scheduled = time.time()
+    # Counted from when the minute was due, so a late start doesn't give
+    # its runs more time
+    deadline = None
+    if bucket_timeout is not None:
+        deadline = scheduled + bucket_timeout
+    batches = [(0, tasklist)]
+
+    if spread == 'stagger' and window > 0:
+        # Programs not loaded yet are optimized by their first run, not here
+        costs = [estimator.estimate(filelist[item].verify())
+                 if item in filelist else 0 for item in tasklist]
+        batches = stagger(tasklist, costs, window, int(window))
+
+    if isinstance(runner, AsyncRuntime):
+        for delay, batch in batches:
+            asyncio.ensure_future(execute_scheduled_tasks_async(
+                batch, filelist, runner, estimator, spread == 'binpack',
+                delay, deadline, scheduled + delay))
+        return
 
     # Executes the interpreter as a background process so that it does not
     # block the scheduling loop
-    thread = threading.Thread(target=execute_scheduled_tasks,
-                              args=(tasklist, filelist))
-    thread.daemon = True
-    thread.start()
+    for delay, batch in batches:
+        thread = threading.Timer(delay, execute_scheduled_tasks,
+                                 args=(batch, filelist, runner, estimator,
+                                       spread == 'binpack', deadline,
+                                       scheduled + delay))
+        thread.daemon = True
+        thread.start()
+
+
+def scheduled_programs(tasklist, filelist):
+    """
+    Gets the compiled programs of the files specified by tasklist, skipping
+    the files removed since the minute was due. Programs loaded lazily are
+    optimized and translated on their first run, the ones that fail to load
+    are logged and skipped
+
+    # args:
+        - :tasklist: list of program paths to be executed
+        - :filelist: dict with program paths as keys and fields are the
+            associated interpreter session
+
+    # returns:
+        - tuple of the list of paths and the list of their programs
+    """
+    items = []
+    programs = []
+    for item in tasklist:
+        interpreter = filelist.get(item)
+        # Programs may have been removed since the minute was due
+        if interpreter is None:
+            continue
+
+        loaded = interpreter.loaded
+        try:
+            program = interpreter.program
+        except (IOError, OSError, NameError, TypeError, ValueError) as err:
+            logger.error("Task %s failed to load: %s", item, err)
+            continue
+        if not loaded and interpreter.optimization_report is not None:
+            logger.info("optimized %s", interpreter.optimization_report)
+
+        logger.info("Running task %s", item)
+        items.append(item)
+        programs.append(program)
+    return (items, programs)
+
+
+def report_result(item, result, estimator, scheduled=None, sink=None,
+                  run_metrics=None):
+    """
+    Records the run time of a finished program (and its metrics, if runs are
+    profiled), delivers its output to the output sink and logs its outcome,
+    as a structured record with the program, outcome, run time and error
+
+    # args:
+        - :item: path of the program
+        - :result: TaskResult of the run
+        - :estimator: CostEstimator the measured run times are recorded on
+        - :scheduled: optional time (as seconds since epoch) the run was
+          scheduled to start at
+        - :sink: sink the output is delivered to, defaults to output_sink
+        - :run_metrics: Metrics the run is recorded on, defaults to metrics
+    """
+    if sink is None:
+        sink = output_sink
+    if run_metrics is None:
+        run_metrics = metrics
+    estimator.record(result.source_file, result.duration)
+    if run_metrics is not None:
+        run_metrics.record(result, scheduled)
+    if result.output:
+        sink.write(result.source_file, result.output)
+
+    fields = {'program': item, 'duration': result.duration,
+              'error': result.error}
+    if result.aborted:
+        fields['outcome'] = 'aborted'
+        logger.warning("Task %s aborted: %s", item, result.error,
+                       extra=fields)
+    elif result.error is not None:
+        fields['outcome'] = 'failed'
+        logger.error("Task %s failed: %s", item, result.error, extra=fields)
+    else:
+        fields['outcome'] = 'succeeded'
+        logger.info("Task %s finished in %.3fs", item, result.duration,
+                    extra=fields)
 
 
-def execute_scheduled_tasks(tasklist, filelist):
+def export_metrics(run_metrics=None):
     """
-    Executes the programs specified by tasklist by running the interpreter
-    on filelist associated with each file
+    Writes the metrics out to the metrics file, if runs are profiled
+
+    # args:
+        - :run_metrics: Metrics written out, defaults to metrics
+    """
+    if run_metrics is None:
+        run_metrics = metrics
+    if run_metrics is None:
+        return
+    try:
+        run_metrics.write()
+    except (IOError, OSError) as err:
+        logger.error("Metrics could not be written: %s", err)
+
+
+def execute_scheduled_tasks(tasklist, filelist, runner, estimator,
+                            binpack=False, deadline=None, scheduled=None,
+                            sink=None, run_metrics=None):
+    """
+    Executes the programs specified by tasklist concurrently on the runner
+    worker pool, the compiled program of each file being shipped to the
+    workers. The output of each program is written to stdout in tasklist
+    order, and a failing program is logged without affecting the others
 
     is executed on a background thread
 
     # args:
-        - :tasklist: list of filenames to be executed
-        - :filelist: dict with filenames as keys and fields are the
+        - :tasklist: list of program paths to be executed
+        - :filelist: dict with program paths as keys and fields are the
             associated interpreter session
+        - :runner: TaskRunner the programs are executed on
+        - :estimator: CostEstimator the measured run times are recorded on
+        - :binpack: if True the most expensive programs are started first
+        - :deadline: optional time (as seconds since epoch) every program
+          must end by
+        - :scheduled: optional time (as seconds since epoch) the programs
+          were scheduled to start at
+        - :sink: sink the outputs are delivered to, defaults to output_sink
+        - :run_metrics: Metrics the runs are recorded on, defaults to metrics
     """
-    timestamp_str = timestamp().strftime('%y/%m/%d %H:%M:%S')
+    items, programs = scheduled_programs(tasklist, filelist)
 
-    for item in tasklist:
-        logger.info("%s -> Running task %s" % (timestamp_str, item))
-        filelist[item].run()
+    costs = None
+    if binpack:
+        costs = [estimator.estimate(program) for program in programs]
+
+    for item, result in zip(items, runner.run(programs, costs, deadline)):
+        report_result(item, result, estimator, scheduled, sink, run_metrics)
+    export_metrics(run_metrics)
+
+
+async def execute_scheduled_tasks_async(tasklist, filelist, runtime,
+                                        estimator, binpack=False, delay=0,
+                                        deadline=None, scheduled=None,
+                                        sink=None, run_metrics=None):
+    """
+    Coroutine version of execute_scheduled_tasks, executing the programs
+    specified by tasklist as tasks of the runtime event loop
+
+    # args:
+        - :tasklist: list of program paths to be executed
+        - :filelist: dict with program paths as keys and fields are the
+            associated interpreter session
+        - :runtime: AsyncRuntime the programs are executed on
+        - :estimator: CostEstimator the measured run times are recorded on
+        - :binpack: if True the most expensive programs are started first
+        - :delay: seconds to wait before starting the programs
+        - :deadline: optional time (as seconds since epoch) every program
+          must end by
+        - :scheduled: optional time (as seconds since epoch) the programs
+          were scheduled to start at
+        - :sink: sink the outputs are delivered to, defaults to output_sink
+        - :run_metrics: Metrics the runs are recorded on, defaults to metrics
+    """
+    if delay:
+        await asyncio.sleep(delay)
+
+    items, programs = scheduled_programs(tasklist, filelist)
+
+    costs = None
+    if binpack:
+        costs = [estimator.estimate(program) for program in programs]
 
+    results = await runtime.run(programs, costs, deadline)
+    for item, result in zip(items, results):
+        report_result(item, result, estimator, scheduled, sink, run_metrics)
+    export_metrics(run_metrics)
 
-def main(filelist, execution_schedule):
-    schedule.every().minute.do(get_tasks, filelist, execution_schedule)
 
-    while True:
+def load_manifest(registry, paths, workers=LOAD_WORKERS):
+    """
+    Checks and schedules the CAJOlang source files of a manifest. Entries
+    are checked, and their programs compiled and verified, concurrently on a
+    thread pool, while the programs are optimized and translated on their
+    first run. Programs are scheduled in manifest order, and the invalid
+    entries (broken programs included) are skipped and logged together once
+    every entry was checked
+
+    # args:
+        - :registry: ProgramRegistry the programs are added to
+        - :paths: list of the paths of the CAJOlang sources
+        - :workers: number of threads entries are checked on
+
+    # returns:
+        - tuple of the list of paths scheduled and the list of (path, error)
+          of the invalid entries
+    """
+    def prepare(path):
         try:
-            schedule.run_pending()
-            time.sleep(1)
-        except KeyboardInterrupt:
-            logger.info('%s: Execution stopped by KeyboardInterrupt\n'
-                        % timestamp())
-            break
+            Compiler.check_source_file(path)
+            return (registry.prepare(path, lazy=True), None)
+        except (IOError, OSError, NameError, TypeError, ValueError) as err:
+            return (None, err)
+
+    with ThreadPoolExecutor(max(1, min(workers, len(paths)))) as executor:
+        prepared = list(executor.map(prepare, paths))
+
+    added = []
+    invalid = []
+    for path, (program, error) in zip(paths, prepared):
+        if error is not None:
+            invalid.append((path, error))
+            continue
+        filename, exec_minute = registry.add(path, program)
+        added.append(path)
+        logger.info("added file %s to scheduler to be execute every minute %d",
+                    filename, exec_minute)
+
+    if invalid:
+        logger.error("%d manifest entr%s skipped:\n%s", len(invalid),
+                     'y' if len(invalid) == 1 else 'ies',
+                     '\n'.join("  %s: %s" % (path, error)
+                               for path, error in invalid))
+    return (added, invalid)
+
+
+def sync_manifest(manifest, registry, watcher):
+    """
+    Reads the manifest file again, scheduling the programs added to it and
+    removing the ones no longer listed. Invalid entries are logged and
+    skipped
+
+    # args:
+        - :manifest: path of the manifest, one CAJOlang source path per line
+        - :registry: ProgramRegistry of the scheduled programs
+        - :watcher: FileWatcher of the source files
+    """
+    with open(manifest, 'r') as entries:
+        paths = [line.rstrip() for line in entries if line.strip()]
+
+    listed = set(os.path.abspath(path) for path in paths)
+    for path in registry.paths() - listed:
+        registry.remove(path)
+        watcher.unwatch(path)
+
+    registered = registry.paths()
+    added, invalid = load_manifest(
+        registry, [path for path in paths
+                   if os.path.abspath(path) not in registered])
+    for path in added:
+        watcher.watch(path)
+
+
+def watch_programs(registry, manifest=None, interval=2.0):
+    """
+    Starts watching the scheduled source files, and the manifest if given,
+    reloading the programs that change
+
+    # args:
+        - :registry: ProgramRegistry of the scheduled programs
+        - :manifest: optional path of the manifest file
+        - :interval: seconds between polls when inotify is not available
+
+    # returns:
+        - the running FileWatcher
+    """
+    manifest_path = os.path.abspath(manifest) if manifest else None
+
+    def reload_changed(path):
+        if path == manifest_path:
+            sync_manifest(manifest, registry, watcher)
+        else:
+            registry.reload(path)
+
+    watcher = FileWatcher(reload_changed, interval)
+    for path in registry.paths():
+        watcher.watch(path)
+    if manifest_path is not None:
+        watcher.watch(manifest_path)
+
+    logger.info("watching source files for changes (%s)", watcher.backend)
+    watcher.start()
+    return watcher
+
+
+def parse_address(address, host='127.0.0.1'):
+    """
+    Parses a network address given on the command line
+
+    # args:
+        - :address: address as [HOST:]PORT
+        - :host: host of the addresses given as a bare port
+
+    # returns:
+        - tuple of the host and the port
+
+    # raises:
+        - :ValueError: if the port is not a number
+    """
+    given, separator, port = address.rpartition(':')
+    return (given or host, int(port))
+
+
+def run_worker(address, factory, slots, name=None):
+    """
+    Runs as a worker node of a coordinator until interrupted
+
+    # args:
+        - :address: (host, port) of the coordinator
+        - :factory: function creating the TaskRunner the runs are executed
+          on, given whether they are profiled
+        - :slots: runs executed concurrently
+        - :name: optional name the worker joins with
+    """
+    worker = Worker(address, factory, slots, name)
+    try:
+        worker.serve()
+    except KeyboardInterrupt:
+        logger.info("Worker stopped by KeyboardInterrupt")
+        worker.stop()
+
+
+def main(registry, runner, offset=0, tolerance=30, spread='none', window=0,
+         watcher=None, bucket_timeout=None):
+    filelist = registry.filelist
+    estimator = CostEstimator()
+    # Staggered programs must still start within their minute
+    window = min(window, 59 - offset)
+
+    # The execution_schedule buckets are looked up when each minute is due,
+    # as they are replaced when programs are reloaded
+    scheduler = Scheduler(
+        lambda minute, scheduled: get_tasks(
+            minute, filelist, registry.execution_schedule, runner, estimator,
+            spread, window, bucket_timeout, scheduled),
+        offset, tolerance)
+
+    for minute, tasklist in enumerate(registry.execution_schedule):
+        if tasklist:
+            scheduler.add(minute)
+    registry.on_schedule = scheduler.add
+
+    try:
+        if isinstance(runner, AsyncRuntime):
+            # The event loop drives both the scheduler and the runs
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(scheduler.run_async())
+        else:
+            scheduler.run()
+    except KeyboardInterrupt:
+        logger.info("Execution stopped by KeyboardInterrupt")
+        scheduler.stop()
+
+    if watcher is not None:
+        watcher.stop()
+    if runner.aborted_runs:
+        logger.info("%d run(s) aborted for exceeding their budget",
+                    runner.aborted_runs)
+    runner.shutdown()
+    if metrics is not None:
+        metrics.shutdown()
 
 if __name__ == "__main__":
-    if not os.path.exists("logs"):
-        os.mkdir("logs")
-
-    handler = logging.FileHandler(
-        "logs/%s_log.txt" % timestamp().strftime("%Y-%m-%d"))
-    logger.addHandler(handler)
-    logger.info("Scheduler Started at %s" % str(timestamp()))
-
-    filelist = {}
-    # Execution schedule is modeled as a list indexed by the execution minute
-    # containing a list with the programs to be executed for each minute
-    execution_schedule = [[] for i in range(60)]
-
-    # Reading from stdin until EOF
-    for line in sys.stdin:
-        path = line.rstrip()
-        filename = os.path.split(path)[1]
-        ext = os.path.splitext(filename)[1]
-
-        if not os.path.exists(path):
-            raise IOError("File %s does not exist" % path)
-        if not os.path.isfile(path):
-            raise IOError("argument %s is not a file" % path)
-        if ext != '.cl':
-            raise IOError("argument %s is not a CAJOlang source file" % path)
-
-        # Launches an Intrpreter instance for each argument source file this
-        # is done because the way the project was implemented, all the
-        # interaction with the source code is done by the Interpreter class
-        filelist[filename] = Interpreter(path)
-        exec_minute = filelist[filename].get_execution_minute()
-        logger.info("added file %s to scheduler to be execute every minute %d"
-                    % (filename, exec_minute))
-        execution_schedule[exec_minute].append(filename)
+    parser = argparse.ArgumentParser(
+        description="Runs CAJOlang programs read from stdin every hour")
+    parser.add_argument("--jit", action="store_true",
+                        help="run programs translated to Python functions")
+    parser.add_argument("--optimize", action="store_true",
+                        help="run programs rewritten by the optimizer")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of workers, defaults to the CPU count")
+    parser.add_argument("--pool", choices=POOL_KINDS, default='process',
+                        help="worker pool kind")
+    parser.add_argument("--offset", type=int, default=0,
+                        help="second of the minute programs are started on")
+    parser.add_argument("--tolerance", type=float, default=30,
+                        help="seconds a run may be late before it is missed")
+    parser.add_argument("--spread", choices=SPREAD_MODES, default='none',
+                        help="how the programs of a minute are spread")
+    parser.add_argument("--window", type=int, default=30,
+                        help="seconds programs are staggered over")
+    parser.add_argument("--asyncio", action="store_true",
+                        help="run programs as tasks of an asyncio event loop")
+    parser.add_argument("--slice", type=int, default=SLICE,
+                        help="instructions a run executes before yielding")
+    parser.add_argument("--concurrency", type=int, default=1000,
+                        help="maximum number of asyncio runs in progress")
+    parser.add_argument("--max-instructions", type=int, default=None,
+                        help="instructions a run may execute")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="seconds a run may take")
+    parser.add_argument("--bucket-timeout", type=float, default=None,
+                        help="seconds all the runs of a minute may take")
+    parser.add_argument("--max-open-files", type=int,
+                        default=fileio.MAX_OPEN_FILES,
+                        help="data file descriptors open at once")
+    parser.add_argument("--memoize", action="store_true",
+                        help="replay the output of pure programs")
+    parser.add_argument("--memoize-inputs", action="store_true",
+                        help="also replay programs that only read files")
+    parser.add_argument("--memo-size", type=int, default=MAX_BYTES,
+                        help="bytes of recorded output kept")
+    parser.add_argument("--memo-dir", default=None,
+                        help="directory where recorded outputs persist")
+    parser.add_argument("--output", choices=SINK_KINDS, default='stdout',
+                        help="where the output of the programs goes")
+    parser.add_argument("--output-path", default=None,
+                        help="output directory (files) or log file (log)")
+    parser.add_argument("--metrics-file", default=None,
+                        help="file the run metrics are written to")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="port the run metrics are served on")
+    parser.add_argument("--trace", action="append", default=[],
+                        metavar="FILE", help="trace the runs of a program")
+    parser.add_argument("--trace-dir", default="traces",
+                        help="directory traces of failed runs are written to")
+    parser.add_argument("--trace-size", type=int, default=CAPACITY,
+                        help="instructions kept on each trace")
+    parser.add_argument("--cache-dir", default=None,
+                        help="directory where compiled programs are cached")
+    parser.add_argument("--manifest", default=None,
+                        help="file listing the programs, instead of stdin")
+    parser.add_argument("--watch", action="store_true",
+                        help="reload programs (and manifest) as they change")
+    parser.add_argument("--watch-interval", type=float, default=2.0,
+                        help="seconds between polls without inotify")
+    parser.add_argument("--listen", default=None, metavar="[HOST:]PORT",
+                        help="coordinate workers instead of running programs")
+    parser.add_argument("--connect", default=None, metavar="HOST:PORT",
+                        help="run as a worker of the coordinator at HOST:PORT")
+    parser.add_argument("--worker-name", default=None,
+                        help="name the worker joins with")
+    parser.add_argument("--log-dir", default="logs",
+                        help="directory of the daily log files")
+    parser.add_argument("--log-format", choices=LOG_FORMATS, default='text',
+                        help="format of the log records")
+    args = parser.parse_args()
+
+    try:
+        listen = connect = None
+        if args.listen is not None:
+            listen = parse_address(args.listen)
+        if args.connect is not None:
+            connect = parse_address(args.connect)
+    except ValueError:
+        parser.error("addresses must be given as [HOST:]PORT")
+    if listen is not None and (connect is not None or args.asyncio):
+        parser.error("--listen can't be combined with --connect or --asyncio")
+
+    # Records are written by a background thread, so logging never blocks
+    # the scheduler or the runs on disk writes
+    try:
+        start_logging(args.log_dir, args.log_format)
+    except OSError as err:
+        parser.error("can't write logs to %s: %s" % (args.log_dir, err))
+    logger.info("Scheduler Started at %s", timestamp())
+
+    try:
+        output_sink = create_sink(args.output, args.output_path)
+    except ValueError as err:
+        parser.error(str(err))
+
+    cache = ProgramCache(args.cache_dir) if args.cache_dir else None
+    # Set before the worker processes are started, so they inherit it
+    fileio.POOL.max_open = args.max_open_files
+
+    limits = None
+    if args.max_instructions is not None or args.timeout is not None:
+        limits = Limits(args.max_instructions, args.timeout)
+
+    memo = None
+    if args.memoize or args.memoize_inputs:
+        memo = ResultCache(args.memo_size, args.memo_dir,
+                           inputs=args.memoize_inputs)
+
+    tracing = None
+    if args.trace:
+        if args.trace_size < 1:
+            parser.error("--trace-size must be positive")
+        tracing = TraceOptions(
+            frozenset(os.path.abspath(path) for path in args.trace),
+            args.trace_dir, args.trace_size)
+
+    if connect is not None:
+        # Runs the programs the coordinator sends, on the local worker pool
+        run_worker(connect,
+                   lambda profile: TaskRunner(
+                       args.workers, args.pool, jit=args.jit, limits=limits,
+                       memo=memo, profile=profile, tracing=tracing),
+                   args.workers or os.cpu_count() or 1, args.worker_name)
+        sys.exit(0)
+
+    # The registry holds the filelist, with the interpreter session of each
+    # program, and the execution schedule, modeled as a list indexed by the
+    # execution minute containing a list with the programs to be executed
+    # for each minute. Launches an Intrpreter instance for each argument
+    # source file this is done because the way the project was implemented,
+    # all the interaction with the source code is done by the Interpreter
+    # class
+    registry = ProgramRegistry(
+        lambda path: Interpreter(path, optimize=args.optimize, cache=cache))
+
+    # Reading from the manifest or from stdin until EOF
+    source = open(args.manifest, 'r') if args.manifest else sys.stdin
+    with source:
+        paths = [line.rstrip() for line in source if line.strip()]
+    load_manifest(registry, paths)
+
+    watcher = None
+    if args.watch:
+        watcher = watch_programs(registry, args.manifest, args.watch_interval)
+
+    profile = args.metrics_file is not None or args.metrics_port is not None
+    if profile:
+        metrics = Metrics(args.metrics_file)
+        if args.metrics_port is not None:
+            try:
+                metrics.serve(args.metrics_port)
+            except OSError as err:
+                parser.error("can't serve metrics on port %d: %s"
+                             % (args.metrics_port, err))
+
+    # Programs are translated by the JIT on the workers that run them
+    if listen is not None:
+        runner = Coordinator(listen[0], listen[1], profile=profile)
+        try:
+            port = runner.start()
+        except OSError as err:
+            parser.error("can't listen on %s: %s" % (args.listen, err))
+        logger.info("coordinating workers on %s:%d", listen[0], port)
+    elif args.asyncio:
+        runner = AsyncRuntime(args.slice, args.concurrency, args.workers,
+                              jit=args.jit, limits=limits, memo=memo,
+                              profile=profile, tracing=tracing)
+    else:
+        runner = TaskRunner(args.workers, args.pool, jit=args.jit,
+                            limits=limits, memo=memo, profile=profile,
+                            tracing=tracing)
 
     # Start execution loop
-    main(filelist, execution_schedule)
+    main(registry, runner, args.offset, args.tolerance, args.spread,
+         args.window, watcher, args.bucket_timeout)
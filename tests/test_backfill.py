@@ -0,0 +1,88 @@
+"""
+Tests of the backfill runs
+Checks that every source is run and reported once, failures included, that
+a broken pool fails the runs left instead of raising, and the names of the
+output files
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.backfill import OutputDirectory, run_sources
+
+
+class RunSourcesTest(unittest.TestCase):
+    """
+    Checks the results run_sources reports
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.paths = []
+        for value in range(5):
+            self.paths.append(self._source("p%d.cl" % value, [
+                "0", "CAJO_SET_MEMORY %d 0" % value,
+                "CAJO_COPY_FROM_MEMORY 0", "CAJO_PRINT"]))
+        self.paths.append(self._source("bad.cl", ["0", "CAJO_NOPE"]))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _source(self, name, lines):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as source:
+            source.write('\n'.join(lines) + '\n')
+        return path
+
+    def test_runs_every_source(self):
+        with ThreadPoolExecutor(2) as executor:
+            results = dict(run_sources(self.paths, executor, 1))
+        self.assertEqual(sorted(results), list(range(6)))
+        for value in range(5):
+            self.assertEqual(results[value].output, "%d\n" % value)
+            self.assertIsNone(results[value].error)
+        self.assertTrue(results[5].error.startswith("NameError"))
+
+    def test_broken_pool(self):
+        executor = ThreadPoolExecutor(2)
+        executor.shutdown()
+        results = dict(run_sources(self.paths, executor, 2))
+        self.assertEqual(sorted(results), list(range(6)))
+        for index, result in results.items():
+            self.assertEqual(result.source_file, self.paths[index])
+            self.assertTrue(result.error.startswith("RuntimeError"))
+
+
+class OutputDirectoryTest(unittest.TestCase):
+    """
+    Checks that output files are named after the program path, whatever
+    the order programs are written in
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def test_names(self):
+        names = {}
+        for order in (("a/p.cl", "b/p.cl"), ("b/p.cl", "a/p.cl")):
+            outputs = OutputDirectory("out")
+            for path in order:
+                names.setdefault(path, set()).add(
+                    os.path.basename(outputs.write(path, path)))
+
+        self.assertEqual(names, {"a/p.cl": set(["a%2Fp.cl.out"]),
+                                 "b/p.cl": set(["b%2Fp.cl.out"])})
+        with open(os.path.join("out", "b%2Fp.cl.out")) as output:
+            self.assertEqual(output.read(), "b/p.cl")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+Tests of the execution budgets
+Checks the instructions charged to the budget of runs that end and of runs
+aborted for exceeding it, on every run loop
+"""
+import asyncio
+import unittest
+
+from lib.budget import Budget, BudgetExceeded, CHECK_INTERVAL
+from lib.cajolang import Interpreter
+from lib.compiler import Compiler
+from lib.sinks import CallbackSink
+from lib.verifier import Verifier
+
+# Endless loop of 2 instructions
+ENDLESS = ["0", "CAJO_SET_MEMORY 1 0", "CAJO_JUMP 0"]
+
+# Loop of 3 instructions run 1000 times, 3003 instructions in total
+COUNTED = ["0", "CAJO_SET_MEMORY 1000 0", "CAJO_SET_MEMORY 1 1",
+           "CAJO_COPY_FROM_MEMORY 0", "CAJO_SUBTRACT 1",
+           "CAJO_COPY_TO_MEMORY 0", "CAJO_JUMP_IF_POSITIVE_TO 3"]
+
+
+class BudgetTest(unittest.TestCase):
+    """
+    Checks that budget.executed counts the instructions each run loop
+    dispatched, without counting twice the batch whose charge aborts the run
+    """
+
+    @staticmethod
+    def _interpreter(source, jit=False):
+        program = Verifier.verify(Compiler.compile_source("budget.cl",
+                                                          source))
+        return Interpreter.from_program(
+            program, jit=jit,
+            sink=CallbackSink(lambda source_file, text: None))
+
+    def _check_abort(self, run, limit, executed):
+        budget = Budget(instructions=limit)
+        with self.assertRaises(BudgetExceeded):
+            run(budget)
+        self.assertEqual(budget.executed, executed)
+
+    def test_interpreter(self):
+        interpreter = self._interpreter(ENDLESS)
+        # Aborted on the charge of the first batch going past the limit
+        self._check_abort(interpreter.run, 5000, 5 * CHECK_INTERVAL)
+        self._check_abort(interpreter.run, CHECK_INTERVAL, 2 * CHECK_INTERVAL)
+
+        budget = Budget(instructions=5000)
+        self._interpreter(COUNTED).run(budget)
+        self.assertEqual(budget.executed, 3003)
+
+    def test_jit(self):
+        interpreter = self._interpreter(ENDLESS, jit=True)
+        # Charged on the backward jumps, every 512 iterations of the loop
+        self._check_abort(interpreter.run, 5000, 5 * CHECK_INTERVAL)
+
+        budget = Budget(instructions=5000)
+        self._interpreter(COUNTED, jit=True).run(budget)
+        self.assertEqual(budget.executed, 3003)
+
+    def test_async(self):
+        interpreter = self._interpreter(ENDLESS)
+        loop = asyncio.new_event_loop()
+        try:
+            # Charged on every yield, every slice instructions
+            self._check_abort(
+                lambda budget: loop.run_until_complete(
+                    interpreter.run_async(slice=1000, budget=budget)),
+                5000, 6000)
+
+            budget = Budget(instructions=5000)
+            loop.run_until_complete(self._interpreter(COUNTED).run_async(
+                slice=1000, budget=budget))
+            self.assertEqual(budget.executed, 3003)
+        finally:
+            loop.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+Tests of the compiled program cache
+Checks the round trip of programs through their cache entries, that entries
+are invalidated by source changes, and that sources the compiler rejects
+never reach the cache
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from lib.cache import ProgramCache
+from lib.compiler import Compiler
+from lib.verifier import Verifier
+
+SOURCE = ["7", "CAJO_SET_MEMORY 3 0", "CAJO_COPY_FROM_MEMORY 0",
+          "CAJO_OPEN data.txt 1 0", "CAJO_READ 1", "CAJO_PRINT", "",
+          "CAJO_JUMP 1"]
+
+
+class ProgramCacheTest(unittest.TestCase):
+    """
+    Checks the entries of a ProgramCache
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ProgramCache(os.path.join(self.directory, 'cache'))
+        self.source = os.path.join(self.directory, 'program.cl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, lines, mtime=None):
+        with open(self.source, 'w') as source:
+            source.write('\n'.join(lines) + '\n')
+        if mtime is not None:
+            os.utime(self.source, ns=(mtime, mtime))
+
+    def _entry(self):
+        return self.cache._read(self.source)
+
+    def test_round_trip(self):
+        program = Verifier.verify(Compiler.compile_source(self.source,
+                                                          SOURCE))
+        data = ProgramCache.encode(program, 10, 20, b'd' * 20)
+        self.assertEqual(ProgramCache.decode(self.source, data),
+                         (program, (10, 20, b'd' * 20)))
+        with self.assertRaises(ValueError):
+            ProgramCache.decode(self.source, data[:-3])
+
+    def test_invalidation(self):
+        self._write(SOURCE, 10 ** 18)
+        program = self.cache.load(self.source)
+        self.assertEqual(program.minute, 7)
+        self.assertEqual(self._entry()[0], program)
+
+        # Same content on a newer mtime, the entry is refreshed
+        self._write(SOURCE, 2 * 10 ** 18)
+        self.assertEqual(self.cache.load(self.source), program)
+        self.assertEqual(self._entry()[1][1], 2 * 10 ** 18)
+
+        # Changed content, compiled again
+        self._write(["8"] + SOURCE[1:], 3 * 10 ** 18)
+        self.assertEqual(self.cache.load(self.source).minute, 8)
+        self.assertEqual(self._entry()[0].minute, 8)
+
+    def test_minute_out_of_range(self):
+        for header in ("-5", "60", "70000"):
+            self._write([header] + SOURCE[1:])
+            with self.assertRaises(ValueError):
+                self.cache.load(self.source)
+            self.assertIsNone(self._entry())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+"""
+Tests of the coordinator and the workers
+Runs a coordinator with workers on the loopback, and checks that the runs of
+a stalled worker fail over to the others, and that workers answer every
+batch, even when its programs or their runner fail
+"""
+import time
+import socket
+import logging
+import threading
+import unittest
+
+from lib.cluster import (Coordinator, Worker, Connection, encode_program,
+                         decode_program)
+from lib.compiler import Compiler, Program
+from lib.runner import TaskRunner
+from lib.verifier import Verifier
+
+# Seconds the tests wait for the workers to join
+JOIN_WAIT = 5.0
+
+
+class BrokenRunner(object):
+    """
+    Runner failing every run it is given
+    """
+
+    aborted_runs = 0
+
+    def run(self, programs, costs=None, deadline=None):
+        raise RuntimeError("broken runner")
+
+    def shutdown(self):
+        pass
+
+
+class ClusterTest(unittest.TestCase):
+    """
+    Checks the runs of a Coordinator over its workers
+    """
+
+    def setUp(self):
+        logging.getLogger('scheduler').disabled = True
+        self.coordinator = Coordinator(heartbeat=0.2, stall_timeout=1.0)
+        self.port = self.coordinator.start()
+        self.workers = []
+        self.program = Verifier.verify(Compiler.compile_source(
+            "print.cl", ["0", "CAJO_SET_MEMORY 7 0",
+                         "CAJO_COPY_FROM_MEMORY 0", "CAJO_PRINT"]))
+
+    def tearDown(self):
+        for worker in self.workers:
+            worker.stop()
+        self.coordinator.shutdown()
+        logging.getLogger('scheduler').disabled = False
+
+    def _join(self, count):
+        started = time.time()
+        while (len(self.coordinator.workers) < count and
+               time.time() - started < JOIN_WAIT):
+            time.sleep(0.02)
+        self.assertEqual(len(self.coordinator.workers), count)
+
+    def _worker(self, name, factory=None, slots=1):
+        worker = Worker(('127.0.0.1', self.port),
+                        factory or (lambda profile: TaskRunner(
+                            1, 'thread', profile=profile)),
+                        slots, name)
+        thread = threading.Thread(target=worker.serve)
+        thread.daemon = True
+        thread.start()
+        self.workers.append(worker)
+
+    def _stalled_worker(self, slots):
+        """
+        Joins a worker that sends its heartbeats but never any result
+        """
+        sock = socket.create_connection(('127.0.0.1', self.port))
+        connection = Connection(sock)
+        connection.send({'type': 'hello', 'name': 'stalled',
+                         'slots': slots})
+        connection.receive()
+
+        def serve():
+            while True:
+                try:
+                    connection.send({'type': 'heartbeat'})
+                    time.sleep(0.05)
+                except OSError:
+                    return
+
+        thread = threading.Thread(target=serve)
+        thread.daemon = True
+        thread.start()
+
+    def test_program_round_trip(self):
+        program = decode_program(encode_program(self.program))
+        self.assertIsInstance(program.code, tuple)
+        self.assertEqual(hash(program), hash(self.program._replace(
+            verified=False)))
+
+    def test_runs(self):
+        self._worker('a')
+        self._worker('b')
+        self._join(2)
+        results = list(self.coordinator.run([self.program] * 4,
+                                            [1, 1, 1, 1]))
+        self.assertEqual([(result.output, result.error)
+                          for result in results], [("7\n", None)] * 4)
+
+    def test_stalled_worker(self):
+        # Gets every run, as it has the most slots
+        self._stalled_worker(8)
+        self._worker('a')
+        self._join(2)
+
+        started = time.time()
+        results = list(self.coordinator.run([self.program] * 3, [1, 1, 1]))
+        self.assertEqual([(result.output, result.error)
+                          for result in results], [("7\n", None)] * 3)
+        self.assertLess(time.time() - started, 5.0)
+        self.assertEqual(len(self.coordinator.workers), 1)
+
+    def test_batches_are_always_answered(self):
+        self._worker('broken', lambda profile: BrokenRunner())
+        self._join(1)
+
+        # Unverified program with an out of range file mode
+        invalid = Program("invalid.cl", 0,
+                          (("CAJO_OPEN", ("data.txt", 1, 9)), None), False)
+        started = time.time()
+        results = list(self.coordinator.run([self.program, invalid],
+                                            [1, 1]))
+        self.assertLess(time.time() - started, 1.0)
+        self.assertEqual(results[0].error, "RuntimeError: broken runner")
+        self.assertEqual(results[1].source_file, "invalid.cl")
+        self.assertTrue(results[1].error.startswith("ValueError"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+"""
+Tests of the data file I/O
+Checks that the pool never has more than max_open descriptors open, in use
+ones included, and closes the least recently used idle ones first, and the
+round trip of values through the descriptors of both data file formats and
+through the converter between them
+"""
+import os
+import errno
+import struct
+import shutil
+import tempfile
+import threading
+import unittest
+
+from lib.fileio import HandlePool, FormatConverter, open_file
+from lib.typeconv import Converter
+
+
+class HandlePoolTest(unittest.TestCase):
+    """
+    Checks the descriptor cap and the eviction order of a HandlePool
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pool = HandlePool(max_open=2, wait=0.1)
+
+    def tearDown(self):
+        self.pool.clear()
+        shutil.rmtree(self.directory)
+
+    def _name(self, name):
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            open(path, 'w').close()
+        return path
+
+    def test_cap_includes_files_in_use(self):
+        first = self.pool.acquire(self._name('a'), False)
+        self.pool.acquire(self._name('b'), False)
+        with self.assertRaises(OSError) as raised:
+            self.pool.acquire(self._name('c'), False)
+        self.assertEqual(raised.exception.errno, errno.EMFILE)
+
+        # Files already pooled don't need another descriptor
+        self.assertIs(self.pool.acquire(self._name('a'), False), first)
+
+        self.pool.release(first)
+        self.pool.release(first)
+        self.pool.acquire(self._name('c'), False)
+        self.assertEqual(len(self.pool), 2)
+        self.assertTrue(first.stale)
+
+    def test_evicts_least_recently_used(self):
+        a = self.pool.acquire(self._name('a'), False)
+        b = self.pool.acquire(self._name('b'), False)
+        self.pool.release(b)
+        self.pool.release(a)
+        self.pool.acquire(self._name('c'), False)
+        self.assertTrue(b.stale)
+        self.assertFalse(a.stale)
+        self.assertEqual(self.pool.opened, 3)
+
+    def test_waits_for_a_release(self):
+        self.pool.wait = 5.0
+        a = self.pool.acquire(self._name('a'), False)
+        self.pool.acquire(self._name('b'), False)
+        timer = threading.Timer(0.2, self.pool.release, (a,))
+        timer.start()
+        try:
+            self.pool.acquire(self._name('c'), False)
+        finally:
+            timer.join()
+        self.assertTrue(a.stale)
+        self.assertEqual(len(self.pool), 2)
+
+
+# Values of the data file tests, more than a READ_CHUNK of the ASCII format
+VALUES = [(value * 7919) % 65535 - 32767 for value in range(5000)]
+
+
+class DataFormatTest(unittest.TestCase):
+    """
+    Checks the descriptors of the ASCII (modes 0 and 1) and binary (modes 2
+    and 3) formats
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pool = HandlePool(max_open=4)
+
+    def tearDown(self):
+        self.pool.clear()
+        shutil.rmtree(self.directory)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _write(self, path, mode, values):
+        descriptor = open_file(path, mode, self.pool)
+        for value in values:
+            descriptor.write_int(value)
+        # Writes are buffered until the descriptor is closed
+        self.assertEqual(os.path.getsize(path), 0)
+        descriptor.close()
+
+    def _read(self, path, mode, count):
+        descriptor = open_file(path, mode, self.pool)
+        try:
+            values = [descriptor.read_int() for _ in range(count)]
+            with self.assertRaises(ValueError):
+                descriptor.read_int()
+        finally:
+            descriptor.close()
+        return values
+
+    def test_text_format(self):
+        path = self._path('data.txt')
+        self._write(path, 1, VALUES)
+        with open(path, 'r') as data:
+            self.assertEqual(data.read(), ''.join(
+                Converter.int2bin(value) + '\n' for value in VALUES))
+        self.assertEqual(self._read(path, 0, len(VALUES)), VALUES)
+
+    def test_binary_format(self):
+        path = self._path('data.b16')
+        self._write(path, 3, VALUES)
+        with open(path, 'rb') as data:
+            self.assertEqual(data.read(), b''.join(
+                struct.pack('<h', value) for value in VALUES))
+        self.assertEqual(self._read(path, 2, len(VALUES)), VALUES)
+
+    def test_readers_keep_their_offset(self):
+        path = self._path('data.b16')
+        self._write(path, 3, VALUES[:3])
+        first = open_file(path, 2, self.pool)
+        second = open_file(path, 2, self.pool)
+        try:
+            self.assertEqual(first.read_int(), VALUES[0])
+            self.assertEqual(first.read_int(), VALUES[1])
+            self.assertEqual(second.read_int(), VALUES[0])
+        finally:
+            first.close()
+            second.close()
+
+    def test_converter(self):
+        text, binary, back = (self._path(name) for name in
+                              ('data.txt', 'data.b16', 'back.txt'))
+        self._write(text, 1, VALUES)
+        self.assertEqual(FormatConverter.text_to_binary(text, binary),
+                         len(VALUES))
+        self.assertEqual(self._read(binary, 2, len(VALUES)), VALUES)
+        self.assertEqual(FormatConverter.binary_to_text(binary, back),
+                         len(VALUES))
+        with open(text, 'rb') as original, open(back, 'rb') as converted:
+            self.assertEqual(original.read(), converted.read())
+
+        with open(binary, 'ab') as data:
+            data.write(b'\x01')
+        with self.assertRaises(ValueError):
+            FormatConverter.binary_to_text(binary, back)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+Tests of the interpreter execution contexts
+Checks that the same interpreter runs many times, concurrently and after
+failed runs, each run on its own context
+"""
+import asyncio
+import threading
+import unittest
+
+from lib.cajolang import Interpreter
+from lib.compiler import Compiler
+from lib.memspace import MemSpace
+from lib.sinks import CallbackSink
+from lib.verifier import Verifier
+
+# Prints 50 down to 1
+COUNTDOWN = ["0", "CAJO_SET_MEMORY 50 0", "CAJO_SET_MEMORY 1 1",
+             "CAJO_COPY_FROM_MEMORY 0", "CAJO_PRINT", "CAJO_SUBTRACT 1",
+             "CAJO_COPY_TO_MEMORY 0", "CAJO_JUMP_IF_POSITIVE_TO 2"]
+EXPECTED = ''.join("%d\n" % value for value in range(50, 0, -1))
+
+# Prints 1 then fails closing a descriptor never opened
+FAILING = ["0", "CAJO_SET_MEMORY 1 0", "CAJO_COPY_FROM_MEMORY 0",
+           "CAJO_PRINT", "CAJO_CLOSE 1", "CAJO_PRINT"]
+
+THREADS = 8
+RUNS = 25
+
+
+class ExecutionContextTest(unittest.TestCase):
+    """
+    Checks that runs of the same interpreter don't share their state
+    """
+
+    def _interpreter(self, source, jit=False):
+        self.outputs = []
+        program = Verifier.verify(Compiler.compile_source("context.cl",
+                                                          source))
+        return Interpreter.from_program(
+            program, jit=jit,
+            sink=CallbackSink(
+                lambda source_file, text: self.outputs.append(text)))
+
+    def _concurrent(self, jit):
+        interpreter = self._interpreter(COUNTDOWN, jit)
+
+        def runs():
+            for _ in range(RUNS):
+                interpreter.run()
+
+        threads = [threading.Thread(target=runs) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.outputs, [EXPECTED] * (THREADS * RUNS))
+
+    def test_concurrent_runs(self):
+        self._concurrent(False)
+
+    def test_concurrent_jit_runs(self):
+        self._concurrent(True)
+
+    def test_interleaved_async_runs(self):
+        interpreter = self._interpreter(COUNTDOWN)
+
+        async def runs():
+            # Each run yields to the others every 7 instructions
+            await asyncio.gather(*[interpreter.run_async(slice=7)
+                                   for _ in range(RUNS)])
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(runs())
+        finally:
+            loop.close()
+        self.assertEqual(self.outputs, [EXPECTED] * RUNS)
+
+    def test_runs_after_a_failure(self):
+        for jit in (False, True):
+            interpreter = self._interpreter(FAILING, jit)
+            for _ in range(3):
+                with self.assertRaises(RuntimeError):
+                    interpreter.run()
+            # Every run starts over from the first instruction
+            self.assertEqual(self.outputs, ["1\n"] * 3)
+
+    def test_context_has_no_dict(self):
+        self.assertFalse(hasattr(MemSpace(), '__dict__'))
+
+
+if __name__ == "__main__":
+    unittest.main()
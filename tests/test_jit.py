@@ -0,0 +1,385 @@
+"""
+Differential tests of the JIT and the optimizer
+Runs generated programs on the reference dispatch loop and on the translated
+function, optimized or not, and compares what each run prints and writes
+"""
+import os
+import time
+import random
+import shutil
+import tempfile
+import unittest
+
+from lib.budget import Budget, BudgetExceeded
+from lib.cajolang import Interpreter
+from lib import jit
+from lib.compiler import Compiler
+from lib.fileio import POOL
+from lib.jit import Translator
+from lib.optimizer import Optimizer
+from lib.sinks import CallbackSink
+from lib.typeconv import Converter
+from lib.verifier import Verifier
+
+# Programs generated by the randomized test
+PROGRAMS = 400
+
+# Instructions a generated program may execute on the reference run, the
+# ones that don't end within them are skipped
+MAX_INSTRUCTIONS = 20000
+
+# Values of the data files the generated programs read
+DATA_VALUES = (7, -3, 0, 120, -32767, 32767, 5, 1)
+
+ARITHMETIC = ("CAJO_COPY_TO_MEMORY", "CAJO_COPY_FROM_MEMORY", "CAJO_ADD",
+              "CAJO_SUBTRACT")
+JUMPS = ("CAJO_JUMP_IF_NEGATIVE_TO", "CAJO_JUMP_IF_POSITIVE_TO",
+         "CAJO_JUMP_IF_ZERO_TO", "CAJO_JUMP")
+
+# Jumps of the chain and walks of it of the throughput test
+CHAIN_DEPTH = 200
+CHAIN_ROUNDS = 500
+
+# Chains of few and of many jumps, walked as many jumps in total, and the
+# times entering a block of the longest may take that of the shortest. A
+# dispatch linear in the number of blocks makes it about 15 times, the
+# binary search about 2.5 times
+SHORT_CHAIN = (25, 4000)
+LONG_CHAIN = (400, 250)
+SCALING = 6
+
+
+class ProgramGenerator(object):
+    """
+    Generates random CAJOlang sources, mixing random instructions with the
+    idioms the optimizer rewrites (fused memory arithmetic, counted loops,
+    jump chains and dead stores) and file I/O on the data files of a
+    directory
+
+    # Constructor Args
+      - :directory: directory of the data files
+      - :seed: seed of the generator
+    """
+
+    def __init__(self, directory, seed):
+        self._random = random.Random(seed)
+        self.files = dict((name, os.path.join(directory, name)) for name in
+                          ('in.txt', 'in.b16', 'out.txt', 'out.b16'))
+
+    def reset_files(self):
+        """
+        Recreates the input data files and removes the output ones, so each
+        run starts from the same files
+        """
+        for name, path in self.files.items():
+            if os.path.exists(path):
+                os.remove(path)
+        with open(self.files['in.txt'], 'w') as data:
+            data.writelines(Converter.int2bin(value) + '\n'
+                            for value in DATA_VALUES)
+        with open(self.files['in.b16'], 'wb') as data:
+            for value in DATA_VALUES:
+                data.write(value.to_bytes(2, 'little', signed=True))
+
+    def output_files(self):
+        """
+        Returns the content of the output data files, by name
+        """
+        contents = {}
+        for name in ('out.txt', 'out.b16'):
+            path = self.files[name]
+            if os.path.exists(path):
+                with open(path, 'rb') as data:
+                    contents[name] = data.read()
+        return contents
+
+    def _idiom(self, body):
+        """
+        Returns the lines of an idiom appended at the end of body
+        """
+        r = self._random
+        p, q = r.randint(0, 2), r.randint(0, 2)
+        f = r.randint(0, 1)
+        start = len(body)
+        return r.choice([
+            ["CAJO_COPY_FROM_MEMORY %d" % p,
+             "%s %d" % (r.choice(("CAJO_ADD", "CAJO_SUBTRACT")), q),
+             "CAJO_COPY_TO_MEMORY %d" % p],
+            ["CAJO_SUBTRACT %d" % q,
+             "CAJO_JUMP_IF_POSITIVE_TO %d" % start],
+            ["CAJO_ADD %d" % q,
+             "CAJO_JUMP_IF_NEGATIVE_TO %d" % start],
+            ["CAJO_COPY_FROM_MEMORY %d" % p,
+             "CAJO_SUBTRACT %d" % q,
+             "CAJO_COPY_TO_MEMORY %d" % p,
+             "CAJO_JUMP_IF_POSITIVE_TO %d" % start],
+            ["CAJO_COPY_FROM_MEMORY %d" % p,
+             "CAJO_ADD %d" % q,
+             "CAJO_COPY_TO_MEMORY %d" % p,
+             "CAJO_JUMP_IF_NEGATIVE_TO %d" % start],
+            ["CAJO_JUMP %d" % (start + 2),
+             "CAJO_JUMP %d" % (start + 3),
+             "CAJO_JUMP %d" % (start + 4)],
+            ["CAJO_SET_MEMORY %d %d" % (r.randint(-9, 9), p),
+             "CAJO_COPY_TO_MEMORY %d" % p],
+            ["CAJO_OPEN %s %d %d" % (self.files['in.txt'], f, 0),
+             "CAJO_READ %d" % f, "CAJO_PRINT"],
+            ["CAJO_OPEN %s %d %d" % (self.files['in.b16'], f, 2),
+             "CAJO_READ %d" % f, "CAJO_READ %d" % f, "CAJO_PRINT"],
+            ["CAJO_OPEN %s %d %d" % (self.files['out.txt'], f, 1),
+             "CAJO_WRITE %d" % f, "CAJO_CLOSE %d" % f],
+            ["CAJO_OPEN %s %d %d" % (self.files['out.b16'], f, 3),
+             "CAJO_WRITE %d" % f],
+            ["CAJO_READ %d" % f],
+            ["CAJO_CLOSE %d" % f],
+        ])
+
+    def source(self, length):
+        """
+        Generates the lines of a CAJOlang source
+
+        # Args
+            - :length: number of random instructions and idioms
+
+        # Returns
+            - list of source lines, the first one being the minute
+        """
+        r = self._random
+        body = ["CAJO_SET_MEMORY %d 0" % r.randint(-20, 20),
+                "CAJO_SET_MEMORY %d 1" % r.randint(-3, 3),
+                "CAJO_SET_MEMORY %d 2" % r.randint(-3, 3),
+                "CAJO_COPY_FROM_MEMORY 0"]
+        for _ in range(length):
+            if r.random() < 0.3:
+                body.extend(self._idiom(body))
+                continue
+            instruction = r.choice(ARITHMETIC + JUMPS +
+                                   ("CAJO_SET_MEMORY", "CAJO_PRINT"))
+            if instruction == "CAJO_SET_MEMORY":
+                body.append("%s %d %d" % (instruction, r.randint(-50, 50),
+                                          r.randint(0, 2)))
+            elif instruction == "CAJO_PRINT":
+                body.append(instruction)
+            elif instruction in JUMPS:
+                # Resolved once the length of the program is known
+                body.append(instruction + " %d")
+            else:
+                body.append("%s %d" % (instruction, r.randint(0, 2)))
+
+        # Jump chains target up to the instruction following them
+        body.append("CAJO_PRINT")
+        body = [line % r.randint(0, len(body)) if line.endswith("%d")
+                else line for line in body]
+        return ["0"] + body
+
+
+class DifferentialTest(unittest.TestCase):
+    """
+    Checks that the JIT and the optimizer produce the same output, data
+    files and errors as the reference dispatch loop
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        POOL.clear()
+        shutil.rmtree(self.directory)
+
+    @staticmethod
+    def _run(program, generator, jit=False, budget=None):
+        """
+        Runs a program from fresh data files
+
+        # Returns
+            - tuple of the output, the output data files and the name of the
+              exception raised, if any
+        """
+        generator.reset_files()
+        output = []
+        interpreter = Interpreter.from_program(
+            program, jit=jit,
+            sink=CallbackSink(lambda source_file, text: output.append(text)))
+        error = None
+        try:
+            interpreter.run(budget)
+        except BudgetExceeded:
+            raise
+        except Exception as err:
+            error = type(err).__name__
+        return (''.join(output), generator.output_files(), error)
+
+    def _check(self, source, generator, reports=None,
+               limit=MAX_INSTRUCTIONS):
+        """
+        Compares the runs of a source on every mode against the reference
+        one
+
+        # Args
+            - :source: list of source lines
+            - :generator: ProgramGenerator of the data files
+            - :reports: optional list the OptimizationReport is appended to
+            - :limit: instructions the reference run may execute
+
+        # Returns
+            - False if the reference run did not end within limit
+        """
+        program = Verifier.verify(Compiler.compile_source("generated.cl",
+                                                          source))
+        try:
+            self._run(program, generator, budget=Budget(limit))
+        except BudgetExceeded:
+            return False
+
+        reference = self._run(program, generator)
+        optimized, report = Optimizer.optimize(program)
+        if reports is not None:
+            reports.append(report)
+        for mode, candidate, jit in (("jit", program, True),
+                                     ("optimize", optimized, False),
+                                     ("jit optimize", optimized, True)):
+            self.assertEqual(self._run(candidate, generator, jit), reference,
+                             "%s run differs on:\n%s"
+                             % (mode, '\n'.join(source)))
+        return True
+
+    def test_generated_programs(self):
+        generator = ProgramGenerator(self.directory, 3)
+        reports = []
+        checked = 0
+        for _ in range(PROGRAMS):
+            source = generator.source(generator._random.randint(3, 16))
+            checked += self._check(source, generator, reports)
+
+        # The corpus must exercise every rewrite of the optimizer
+        self.assertGreater(checked, PROGRAMS // 2)
+        for field in ('threaded_jumps', 'superinstructions',
+                      'closed_form_loops', 'dead_stores'):
+            self.assertTrue(any(getattr(report, field) for report in reports),
+                            "no generated program had %s" % field)
+
+    def test_closed_form_loops(self):
+        generator = ProgramGenerator(self.directory, 0)
+        for start, step in ((10, 3), (9, 3), (-10, 3), (0, 1), (1, 32767),
+                            (32767, 1), (-32767, 7)):
+            # Counted loops on temp_area, leaving when it crosses zero
+            self.assertTrue(self._check(
+                ["0", "CAJO_SET_MEMORY %d 0" % start,
+                 "CAJO_SET_MEMORY %d 1" % step,
+                 "CAJO_COPY_FROM_MEMORY 0",
+                 "CAJO_SUBTRACT 1", "CAJO_JUMP_IF_POSITIVE_TO 3",
+                 "CAJO_PRINT",
+                 "CAJO_COPY_FROM_MEMORY 0",
+                 "CAJO_ADD 1", "CAJO_JUMP_IF_NEGATIVE_TO 7",
+                 "CAJO_PRINT"], generator, limit=400000))
+
+            # Counted loops on a memory position, through superinstructions
+            self.assertTrue(self._check(
+                ["0", "CAJO_SET_MEMORY %d 0" % start,
+                 "CAJO_SET_MEMORY %d 1" % step,
+                 "CAJO_COPY_FROM_MEMORY 0",
+                 "CAJO_SUBTRACT 1", "CAJO_COPY_TO_MEMORY 0",
+                 "CAJO_JUMP_IF_POSITIVE_TO 2",
+                 "CAJO_PRINT",
+                 "CAJO_SET_MEMORY %d 0" % -start,
+                 "CAJO_COPY_FROM_MEMORY 0",
+                 "CAJO_ADD 1", "CAJO_COPY_TO_MEMORY 0",
+                 "CAJO_JUMP_IF_NEGATIVE_TO 8",
+                 "CAJO_PRINT", "CAJO_COPY_FROM_MEMORY 0", "CAJO_PRINT"],
+                generator, limit=400000))
+
+
+class ThroughputTest(unittest.TestCase):
+    """
+    Checks the throughput of the JIT on programs of many basic blocks,
+    where the cost of entering a block dominates
+    """
+
+    @staticmethod
+    def _chain(depth, rounds):
+        """
+        Returns the program of a chain of depth jumps visiting it in a
+        shuffled order, walked rounds times
+        """
+        order = list(range(3, 3 + depth))
+        random.Random(0).shuffle(order)
+        chain = [None] * depth
+        for slot, target in zip(order, order[1:] + [3 + depth]):
+            chain[slot - 3] = "CAJO_JUMP %d" % target
+        return Verifier.verify(Compiler.compile_source(
+            "chain%d.cl" % depth,
+            ["0", "CAJO_SET_MEMORY %d 0" % rounds, "CAJO_SET_MEMORY 1 1",
+             "CAJO_JUMP %d" % order[0]] + chain +
+            ["CAJO_COPY_FROM_MEMORY 0", "CAJO_SUBTRACT 1",
+             "CAJO_COPY_TO_MEMORY 0", "CAJO_JUMP_IF_POSITIVE_TO 2",
+             "CAJO_PRINT"]))
+
+    @staticmethod
+    def _seconds(program, jit, repeat=7):
+        """
+        Returns the seconds of the fastest of repeat runs of a program
+        """
+        interpreter = Interpreter.from_program(
+            program, jit=jit,
+            sink=CallbackSink(lambda source_file, text: None))
+        interpreter.run()
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            interpreter.run()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def test_jump_chain(self):
+        program = self._chain(CHAIN_DEPTH, CHAIN_ROUNDS)
+        reference = self._seconds(program, False)
+        jit = self._seconds(program, True)
+        self.assertLess(jit, reference,
+                        "the JIT took %.4fs, the dispatch loop %.4fs"
+                        % (jit, reference))
+
+    def test_dispatch_scaling(self):
+        short = self._seconds(self._chain(*SHORT_CHAIN), True)
+        long = self._seconds(self._chain(*LONG_CHAIN), True)
+        self.assertLess(long, short * SCALING,
+                        "%d blocks took %.4fs, %d blocks %.4fs"
+                        % (LONG_CHAIN[0], long, SHORT_CHAIN[0], short))
+
+
+class FunctionCacheTest(unittest.TestCase):
+    """
+    Checks that translated functions are reused while their program is
+    unchanged, and that the least recently used are dropped
+    """
+
+    def setUp(self):
+        self.size = jit.FUNCTION_CACHE_SIZE
+        jit.FUNCTION_CACHE_SIZE = 2
+        jit._function_cache.clear()
+
+    def tearDown(self):
+        jit.FUNCTION_CACHE_SIZE = self.size
+        jit._function_cache.clear()
+
+    @staticmethod
+    def _program(name, value):
+        return Verifier.verify(Compiler.compile_source(name, [
+            "0", "CAJO_SET_MEMORY %d 0" % value, "CAJO_COPY_FROM_MEMORY 0",
+            "CAJO_PRINT"]))
+
+    def test_bounded(self):
+        a = Translator.compile(self._program("a.cl", 1))
+        self.assertIs(Translator.compile(self._program("a.cl", 1)), a)
+        self.assertIsNot(Translator.compile(self._program("a.cl", 2)), a)
+
+        b = Translator.compile(self._program("b.cl", 1))
+        a = Translator.compile(self._program("a.cl", 2))
+        Translator.compile(self._program("c.cl", 1))
+        self.assertEqual(len(jit._function_cache), 2)
+        self.assertIs(Translator.compile(self._program("a.cl", 2)), a)
+        self.assertIsNot(Translator.compile(self._program("b.cl", 1)), b)
+
+
+if __name__ == "__main__":
+    unittest.main()
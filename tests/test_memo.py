@@ -0,0 +1,107 @@
+"""
+Tests of the result memoization
+Checks which programs and results are recorded, and that recorded results
+are not replayed under other limits or once the files a program reads change
+"""
+import os
+import errno
+import shutil
+import tempfile
+import unittest
+
+from lib.budget import Limits
+from lib.compiler import Compiler
+from lib.memo import ResultCache
+from lib.runner import TaskResult
+from lib.verifier import Verifier
+
+
+def result(output='', error=None, aborted=False):
+    return TaskResult('program.cl', output, error, 0.1, aborted, None)
+
+
+class ResultCacheTest(unittest.TestCase):
+    """
+    Checks the keys and the records of a ResultCache
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data = os.path.join(self.directory, 'data.txt')
+        with open(self.data, 'w') as data:
+            data.write('0000000000000001\n')
+        self.pure = self._program(["0", "CAJO_SET_MEMORY 4 0",
+                                   "CAJO_COPY_FROM_MEMORY 0", "CAJO_PRINT"])
+        self.reader = self._program(["0", "CAJO_OPEN %s 1 0" % self.data,
+                                     "CAJO_READ 1", "CAJO_PRINT"])
+        self.writer = self._program(["0", "CAJO_OPEN %s 1 1" % self.data,
+                                     "CAJO_WRITE 1"])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @staticmethod
+    def _program(source):
+        return Verifier.verify(Compiler.compile_source("program.cl", source))
+
+    def test_keys(self):
+        memo = ResultCache()
+        self.assertIsNotNone(memo.key(self.pure))
+        self.assertIsNone(memo.key(self.reader))
+        self.assertIsNone(memo.key(self.writer))
+        self.assertNotEqual(memo.key(self.pure),
+                            memo.key(self.pure, Limits(100, None)))
+
+        inputs = ResultCache(inputs=True)
+        key = inputs.key(self.reader)
+        self.assertIsNotNone(key)
+        self.assertIsNone(inputs.key(self.writer))
+
+        # The key follows the content of the files read
+        with open(self.data, 'w') as data:
+            data.write('0000000000000010\n')
+        self.assertNotEqual(inputs.key(self.reader), key)
+
+    def test_recorded_results(self):
+        memo = ResultCache()
+        recorded = [('ok', result('4\n')),
+                    ('runtime', result(error="RuntimeError: File descriptor "
+                                             "memory position 1 not "
+                                             "initialized")),
+                    ('value', result(error="ValueError: end of file "
+                                           "reached"))]
+        skipped = [('aborted', result(error="BudgetExceeded: too many",
+                                      aborted=True)),
+                   ('emfile', result(error="OSError: [Errno %d] too many "
+                                           "open data files" % errno.EMFILE)),
+                   ('denied', result(error="PermissionError: [Errno 13] "
+                                           "Permission denied"))]
+        for key, run in recorded + skipped:
+            memo.put(key, run)
+
+        for key, run in recorded:
+            replayed = memo.get(key, 'program.cl')
+            self.assertEqual((replayed.output, replayed.error),
+                             (run.output, run.error))
+        for key, run in skipped:
+            self.assertIsNone(memo.get(key, 'program.cl'))
+
+    def test_persisted(self):
+        directory = os.path.join(self.directory, 'memo')
+        ResultCache(directory=directory).put('key', result('4\n'))
+        reloaded = ResultCache(directory=directory)
+        self.assertEqual(reloaded.get('key', 'program.cl').output, '4\n')
+
+    def test_evicts_least_recently_used(self):
+        memo = ResultCache(max_bytes=300)
+        memo.put('a', result('a' * 50))
+        memo.put('b', result('b' * 50))
+        memo.get('a', 'program.cl')
+        memo.put('c', result('c' * 50))
+        self.assertIsNotNone(memo.get('a', 'program.cl'))
+        self.assertIsNone(memo.get('b', 'program.cl'))
+        self.assertIsNotNone(memo.get('c', 'program.cl'))
+
+
+if __name__ == "__main__":
+    unittest.main()
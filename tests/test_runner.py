@@ -0,0 +1,56 @@
+"""
+Tests of the worker pool runner
+Checks that a process pool broken while idle fails the runs of a bucket
+instead of raising, and is replaced for the following buckets
+"""
+import os
+import time
+import signal
+import unittest
+
+from lib.compiler import Compiler
+from lib.runner import TaskRunner
+from lib.verifier import Verifier
+
+
+class TaskRunnerTest(unittest.TestCase):
+    """
+    Checks the recovery of a TaskRunner from a broken process pool
+    """
+
+    def setUp(self):
+        self.program = Verifier.verify(Compiler.compile_source(
+            "print.cl", ["0", "CAJO_SET_MEMORY 7 0",
+                         "CAJO_COPY_FROM_MEMORY 0", "CAJO_PRINT"]))
+        self.runner = TaskRunner(workers=2, kind='process')
+
+    def tearDown(self):
+        self.runner.shutdown()
+
+    def _outputs(self):
+        return [(result.output, result.error)
+                for result in self.runner.run([self.program] * 3)]
+
+    def test_pool_broken_while_idle(self):
+        self.assertEqual(self._outputs(), [("7\n", None)] * 3)
+
+        # Kills a worker between two buckets, the pool then breaks
+        executor = self.runner._executor
+        for process in list(executor._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+        started = time.time()
+        while not executor._broken and time.time() - started < 5:
+            time.sleep(0.05)
+
+        results = self._outputs()
+        self.assertEqual(len(results), 3)
+        for output, error in results:
+            self.assertEqual(output, '')
+            self.assertIn("BrokenProcessPool", error)
+        self.assertIsNone(self.runner._executor)
+
+        self.assertEqual(self._outputs(), [("7\n", None)] * 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+Tests of the scheduler
+Checks the order the deadlines of the minutes fire in on a simulated clock,
+the runs reported missed when the clock jumps past them, and the deadline
+of the runs of a minute
+"""
+import time
+import logging
+import threading
+import unittest
+from datetime import datetime
+
+import main
+from lib.cost import CostEstimator
+from lib.scheduler import Scheduler
+
+# Start of an hour away from daylight saving changes
+HOUR = time.mktime(datetime(2026, 1, 5, 10, 0, 0).timetuple())
+
+
+class SchedulerTest(unittest.TestCase):
+    """
+    Checks the heap of deadlines of a Scheduler
+    """
+
+    def setUp(self):
+        logging.getLogger('scheduler').disabled = True
+        self.now = HOUR
+        self.scheduler = Scheduler(lambda minute, scheduled: None,
+                                   tolerance=30, clock=lambda: self.now)
+
+    def tearDown(self):
+        logging.getLogger('scheduler').disabled = False
+
+    def test_deadlines_in_order(self):
+        for minute in (30, 5, 45):
+            self.scheduler.add(minute)
+
+        fired = []
+        for minute in (5, 30, 45):
+            self.now = HOUR + minute * 60
+            due, timeout = self.scheduler.pop_due()
+            fired.extend(due)
+        self.assertEqual(fired, [(HOUR + 300, 5), (HOUR + 1800, 30),
+                                 (HOUR + 2700, 45)])
+        # Next one is minute 5 of the following hour
+        self.assertEqual(timeout, 20 * 60)
+        self.assertEqual(self.scheduler.missed_runs, 0)
+
+    def test_offset(self):
+        scheduler = Scheduler(None, offset=10, clock=lambda: self.now)
+        self.assertEqual(scheduler.next_deadline(5, HOUR), HOUR + 310)
+        self.assertEqual(scheduler.next_deadline(5, HOUR + 311),
+                         HOUR + 3600 + 310)
+
+    def test_missed_runs(self):
+        self.scheduler.add(5)
+
+        # Late within the tolerance, started late
+        self.now = HOUR + 300 + 29
+        self.assertEqual(self.scheduler.pop_due()[0], [(HOUR + 300, 5)])
+
+        # Late past it, skipped to the next hour
+        self.now = HOUR + 3600 + 300 + 31
+        due, timeout = self.scheduler.pop_due()
+        self.assertEqual(due, [])
+        self.assertEqual(self.scheduler.missed_runs, 1)
+        self.assertEqual(timeout, 3600 - 31)
+
+        # Stalled for hours, only the latest occurrence may still run
+        self.now = HOUR + 4 * 3600 + 300 + 10
+        self.assertEqual(self.scheduler.pop_due()[0],
+                         [(HOUR + 4 * 3600 + 300, 5)])
+        self.assertEqual(self.scheduler.missed_runs, 3)
+
+    def test_remove(self):
+        self.scheduler.add(5)
+        self.scheduler.add(6)
+        self.scheduler.remove(5)
+        self.now = HOUR + 360
+        self.assertEqual(self.scheduler.pop_due()[0], [(HOUR + 360, 6)])
+
+
+class RecordingRunner(object):
+    """
+    Runner recording the deadline of the runs it is given
+    """
+
+    def __init__(self):
+        self.deadlines = []
+        self.ran = threading.Event()
+
+    def run(self, programs, costs=None, deadline=None):
+        self.deadlines.append(deadline)
+        self.ran.set()
+        return iter([])
+
+
+class BucketDeadlineTest(unittest.TestCase):
+    """
+    Checks that the runs of a minute started late keep the deadline of the
+    minute
+    """
+
+    def test_counted_from_the_minute(self):
+        runner = RecordingRunner()
+        scheduled = time.time() - 20
+        main.get_tasks(0, {}, [[]] * 60, runner, CostEstimator(),
+                       bucket_timeout=30, scheduled=scheduled)
+        self.assertTrue(runner.ran.wait(5))
+        self.assertEqual(runner.deadlines, [scheduled + 30])
+
+
+if __name__ == "__main__":
+    unittest.main()
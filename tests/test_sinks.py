@@ -0,0 +1,104 @@
+"""
+Tests of the output sinks
+Checks the names of the output files of each program, the framing of the
+shared log and when the output of a run is delivered
+"""
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from lib.sinks import (FileSink, LogSink, StreamSink, CallbackSink,
+                       OutputBuffer, create_sink)
+
+
+class FileSinkTest(unittest.TestCase):
+    """
+    Checks the output files of a FileSink
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def test_names(self):
+        sink = FileSink("out")
+        self.assertEqual(os.path.basename(sink.path("p.cl")), "p.cl.out")
+        self.assertEqual(os.path.basename(sink.path("a/p.cl")),
+                         "a%2Fp.cl.out")
+        self.assertEqual(os.path.basename(sink.path("b/c/p.cl")),
+                         "b%2Fc%2Fp.cl.out")
+        # Named after the path, however it is given
+        self.assertEqual(sink.path(os.path.join(self.directory, "a/p.cl")),
+                         sink.path("a/p.cl"))
+        self.assertEqual(FileSink("out").path("a/p.cl"), sink.path("a/p.cl"))
+
+    def test_appends_per_program(self):
+        sink = FileSink("out")
+        for source_file, text in (("a/p.cl", "1\n"), ("b/p.cl", "2\n"),
+                                  ("a/p.cl", "3\n")):
+            sink.write(source_file, text)
+        with open(sink.path("a/p.cl")) as output:
+            self.assertEqual(output.read(), "1\n3\n")
+        with open(sink.path("b/p.cl")) as output:
+            self.assertEqual(output.read(), "2\n")
+
+
+class SinksTest(unittest.TestCase):
+    """
+    Checks the other sinks and the output buffer of the runs
+    """
+
+    def test_log_framing(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "runs.log")
+            sink = LogSink(path)
+            sink.write("a.cl", "1\n2\n")
+            sink.write("b.cl", "3\n")
+            with open(path) as log:
+                lines = log.read().splitlines()
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[0].startswith("--- ") and
+                        lines[0].endswith(" a.cl ---"))
+        self.assertEqual(lines[1:3], ["1", "2"])
+        self.assertTrue(lines[3].endswith(" b.cl ---"))
+        self.assertEqual(lines[4], "3")
+
+    def test_stream(self):
+        stream = io.StringIO()
+        StreamSink(stream).write("a.cl", "1\n")
+        self.assertEqual(stream.getvalue(), "1\n")
+
+    def test_buffer_delivery(self):
+        delivered = []
+        output = OutputBuffer(
+            CallbackSink(lambda source_file, text: delivered.append(
+                (source_file, text))), "a.cl", threshold=3)
+        for value in range(7):
+            output.write(value)
+        # Delivered every threshold values, the rest on the final flush
+        self.assertEqual(delivered, [("a.cl", "0\n1\n2\n"),
+                                     ("a.cl", "3\n4\n5\n")])
+        output.flush()
+        output.flush()
+        self.assertEqual(delivered[2:], [("a.cl", "6\n")])
+
+    def test_create_sink(self):
+        self.assertIsInstance(create_sink('stdout'), StreamSink)
+        with self.assertRaises(ValueError):
+            create_sink('files')
+        with self.assertRaises(ValueError):
+            create_sink('socket', 'path')
+
+
+if __name__ == "__main__":
+    unittest.main()
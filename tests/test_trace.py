@@ -0,0 +1,72 @@
+"""
+Tests of the execution trace recorder
+Checks that the traces of runs that filled their ring buffer partially,
+exactly and more than once load back with the last instructions executed,
+oldest first
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from lib.cajolang import Interpreter
+from lib.compiler import Compiler
+from lib.sinks import CallbackSink
+from lib.trace import TraceBuffer, load_trace, hot_spots
+from lib.verifier import Verifier
+
+# Straight program of 5 instructions
+SOURCE = ["0", "CAJO_SET_MEMORY 3 0", "CAJO_SET_MEMORY 1 1",
+          "CAJO_COPY_FROM_MEMORY 0", "CAJO_SUBTRACT 1", "CAJO_PRINT"]
+
+
+class TraceTest(unittest.TestCase):
+    """
+    Checks the round trip of a trace through its file
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.program = Verifier.verify(Compiler.compile_source(
+            os.path.join(self.directory, "trace.cl"), SOURCE))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _trace(self, capacity):
+        """
+        Runs the program traced on a buffer of capacity records and loads
+        its trace back
+        """
+        trace = TraceBuffer(self.program, capacity)
+        Interpreter.from_program(
+            self.program,
+            sink=CallbackSink(lambda source_file, text: None)).run(
+                None, None, trace)
+        return load_trace(trace.save(self.directory))
+
+    def _check(self, capacity, steps):
+        trace = self._trace(capacity)
+        self.assertEqual(trace.recorded, 5)
+        self.assertEqual([record.step for record in trace.records], steps)
+        self.assertEqual([record.index for record in trace.records], steps)
+        self.assertEqual(trace.records[-1].opcode, "CAJO_PRINT")
+        self.assertEqual(trace.records[-1].temp_area, 2)
+        return trace
+
+    def test_partially_filled(self):
+        trace = self._check(8, [0, 1, 2, 3, 4])
+        self.assertEqual(trace.records[0].integer_mem, (None, None, None))
+        self.assertEqual(trace.code[0], "CAJO_SET_MEMORY 3 0")
+
+    def test_exactly_full(self):
+        self._check(5, [0, 1, 2, 3, 4])
+
+    def test_wrapped(self):
+        self._check(3, [2, 3, 4])
+        trace = self._check(1, [4])
+        self.assertEqual(hot_spots(trace), [(1, 4, "CAJO_PRINT")])
+
+
+if __name__ == "__main__":
+    unittest.main()
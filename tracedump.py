@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+"""
+CAJOlang trace decoder
+
+displays the trace files written for the failed runs of traced programs
+(see the --trace option of main.py): the last instructions the run executed,
+each with the temp_area and integer memory it found, and the instructions
+executed the most over the trace
+
+Usage:
+    ~ $ python3 tracedump.py traces/program.cl.x1y2z3.trace
+    ~ $ python3 tracedump.py --last 20 --hot 5 traces/program.cl.x1y2z3.trace
+"""
+import sys
+import argparse
+
+from lib.trace import load_trace, hot_spots
+
+
+def show(value):
+    """
+    Formats a recorded value
+    """
+    return '-' if value is None else str(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Displays the trace of a failed CAJOlang run")
+    parser.add_argument("trace", help="trace file")
+    parser.add_argument("--last", type=int, default=50,
+                        help="instructions displayed, 0 for all of them")
+    parser.add_argument("--hot", type=int, default=10,
+                        help="most executed instructions displayed")
+    args = parser.parse_args()
+
+    try:
+        trace = load_trace(args.trace)
+    except (IOError, OSError, ValueError) as err:
+        sys.exit("tracedump: %s" % err)
+
+    print("%s: %d instructions executed, last %d recorded"
+          % (trace.source_file, trace.recorded, len(trace.records)))
+
+    records = trace.records[-args.last:] if args.last else trace.records
+    print("\n%10s %6s  %-42s %7s %7s %7s %7s"
+          % ('step', 'number', 'instruction', 'temp', 'm0', 'm1', 'm2'))
+    for record in records:
+        print("%10d %6d  %-42s %7s %7s %7s %7s"
+              % ((record.step, record.index, trace.code[record.index],
+                  show(record.temp_area)) +
+                 tuple(show(value) for value in record.integer_mem)))
+
+    if args.hot:
+        print("\n%10s %6s  %s" % ('executed', 'number', 'instruction'))
+        for count, index, opcode in hot_spots(trace)[:args.hot]:
+            print("%10d %6d  %s" % (count, index, trace.code[index]))